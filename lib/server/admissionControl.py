@@ -0,0 +1,137 @@
+import threading
+import time
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request runs past its deadline"""
+
+
+class Deadline:
+    """
+    Point in time by which a request must be answered.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = time.perf_counter() + seconds
+
+    def remaining(self):
+        """Seconds left (negative once expired)"""
+        return self.expires - time.perf_counter()
+
+    def check(self, stage):
+        """Raises DeadlineExceeded if the deadline has passed before stage"""
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"Deadline of {self.seconds:g}s exceeded before {stage}")
+
+
+def check_deadline(deadline, stage):
+    """Checks an optional deadline"""
+    if deadline is not None:
+        deadline.check(stage)
+
+
+class AdmissionController:
+    """
+    Bounded concurrency limiter for inference requests.
+
+    At most max_concurrent requests run at once and at most max_queue wait for
+    a slot; everything beyond is rejected immediately, except callers that are
+    themselves bounded (job workers) and may wait regardless. Waiting requests
+    give up when their deadline passes. pressure() tells how full the queue is, so
+    callers can degrade their work under load.
+    """
+
+    def __init__(self, max_concurrent=4, max_queue=16):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.running = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, deadline=None, reject=True):
+        """
+        Waits for a slot.
+
+        Args:
+            deadline (Deadline): Gives up waiting once passed
+            reject (bool): False waits even while the queue is full
+
+        Returns:
+            str: "admitted", "rejected" (queue full) or "timeout" (deadline passed while waiting)
+        """
+        with self._condition:
+            if reject and self.running >= self.max_concurrent and self.waiting >= self.max_queue:
+                self.rejected += 1
+                return "rejected"
+
+            self.waiting += 1
+            try:
+                while self.running >= self.max_concurrent:
+                    timeout = None if deadline is None else deadline.remaining()
+                    if timeout is not None and timeout <= 0:
+                        self.timed_out += 1
+                        return "timeout"
+                    self._condition.wait(timeout)
+            finally:
+                self.waiting -= 1
+
+            self.running += 1
+            self.admitted += 1
+            return "admitted"
+
+    def release(self):
+        """Frees the slot of an admitted request"""
+        with self._condition:
+            self.running -= 1
+            self._condition.notify()
+
+    def pressure(self):
+        """Share of the queue that is occupied (0 while requests run without waiting)"""
+        if self.max_queue <= 0:
+            return 1.0 if self.running >= self.max_concurrent else 0.0
+        return min(self.waiting / self.max_queue, 1.0)
+
+    def stats(self):
+        """Returns occupancy and admission counts"""
+        with self._condition:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "running": self.running,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+
+class AdmissionSlot:
+    """
+    Slot of an admitted request that can outlive the request.
+
+    Work that keeps running after the response (a pipeline task given up at
+    its deadline) calls hold() and releases its hold once it has finished;
+    the controller slot is freed when the last holder releases.
+    """
+
+    def __init__(self, controller):
+        self.controller = controller
+        self._holders = 1
+        self._lock = threading.Lock()
+
+    def hold(self):
+        """Adds a holder"""
+        with self._lock:
+            self._holders += 1
+
+    def release(self):
+        """Drops a holder, freeing the controller slot after the last one"""
+        with self._lock:
+            self._holders -= 1
+            last = self._holders == 0
+        if last:
+            self.controller.release()
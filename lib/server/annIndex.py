@@ -0,0 +1,132 @@
+import threading
+
+import numpy as np
+
+
+def spherical_kmeans(matrix, num_lists, iterations=10, seed=0):
+    """
+    Clusters L2-normalized rows by cosine similarity.
+
+    Returns:
+        tuple: Normalized centroids (num_lists x dim) and the list of every row
+    """
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(len(matrix), num_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(matrix @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, matrix)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Empty lists keep their previous centroid
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+    return centroids.astype(np.float32), np.argmax(matrix @ centroids.T, axis=1).astype(np.int32)
+
+
+class IVFIndex:
+    """
+    Inverted-file index over the rows of an IngredientIndex.
+
+    Rows are clustered into lists around k-means centroids. A search only
+    scores the candidates in the lists closest to the query, so its cost
+    depends on the shortlist size rather than on the number of candidates.
+    Rows added later are assigned to their nearest list; the lists are
+    retrained once the index has grown by retrain_factor.
+    """
+
+    def __init__(self, num_lists=None, nprobe=8, retrain_factor=2.0, seed=0):
+        self.num_lists = num_lists
+        self.nprobe = nprobe
+        self.retrain_factor = retrain_factor
+        self.seed = seed
+        self.centroids = None
+        self.trained_size = 0
+        self.searches = 0
+        self.probed = 0
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._assignments)
+
+    @property
+    def trained(self):
+        """True once train has been called"""
+        return self.centroids is not None
+
+    def train(self, matrix):
+        """Clusters all rows of a normalized embedding matrix (replaces earlier assignments)"""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        num_lists = self.num_lists or int(np.sqrt(len(matrix)))
+        num_lists = max(1, min(num_lists, len(matrix)))
+        centroids, assignments = spherical_kmeans(matrix, num_lists, seed=self.seed)
+        with self._lock:
+            self.centroids, self._assignments = centroids, assignments
+            self.trained_size = len(matrix)
+
+    def update(self, matrix):
+        """
+        Assigns the rows of matrix that are not indexed yet.
+
+        Args:
+            matrix (np.ndarray): Normalized embeddings of all rows (earlier rows unchanged)
+        """
+        if not self.trained:
+            return
+        if len(matrix) >= self.retrain_factor * self.trained_size:
+            self.train(matrix)
+            return
+        with self._lock:
+            start = len(self._assignments)
+            if start >= len(matrix):
+                return
+            new = np.argmax(np.asarray(matrix[start:]) @ self.centroids.T, axis=1).astype(np.int32)
+            self._assignments = np.concatenate([self._assignments, new])
+
+    def search(self, matrix, query, rows, k, nprobe=None):
+        """
+        Returns the k candidates with the highest cosine similarity to query among the probed lists.
+
+        At least nprobe lists are probed, and more if they hold fewer than k candidates.
+
+        Args:
+            matrix (np.ndarray): Normalized embeddings of all rows
+            query (np.ndarray): Query vector (need not be normalized)
+            rows (np.ndarray): Index rows of the candidates
+            k (int): Shortlist size
+            nprobe (int): Lists to probe (defaults to self.nprobe)
+
+        Returns:
+            np.ndarray: Positions into rows, most similar first
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        with self._lock:
+            centroids, assignments = self.centroids, self._assignments
+        if k >= len(rows):
+            probed = np.arange(len(rows))
+        else:
+            # Rank of every list by similarity to the query, then the rank of each candidate's list
+            list_rank = np.empty(len(centroids), dtype=np.int64)
+            list_rank[np.argsort(-(centroids @ query))] = np.arange(len(centroids))
+            # Rows added since the last update are always scored
+            known = rows < len(assignments)
+            candidate_rank = np.zeros(len(rows), dtype=np.int64)
+            candidate_rank[known] = list_rank[assignments[rows[known]]]
+            per_rank = np.cumsum(np.bincount(candidate_rank, minlength=len(centroids)))
+            probes = max(nprobe or self.nprobe, int(np.searchsorted(per_rank, k)) + 1)
+            probed = np.flatnonzero(candidate_rank < probes)
+
+        scores = np.asarray(matrix[rows[probed]]) @ query
+        top = np.argsort(-scores, kind="stable")[:k]
+        self.searches += 1
+        self.probed += len(probed)
+        return probed[top]
+
+    def stats(self):
+        """Returns list count, indexed rows and the mean number of scored candidates per search"""
+        return {
+            "lists": 0 if self.centroids is None else len(self.centroids),
+            "rows": len(self._assignments),
+            "trained_size": self.trained_size,
+            "searches": self.searches,
+            "mean_probed": round(self.probed / self.searches, 1) if self.searches else None,
+        }
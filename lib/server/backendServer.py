@@ -1,96 +1,555 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g, send_file
 from transformers import FlaxAutoModelForSeq2SeqLM, AutoTokenizer
-from transformers import AutoModel
+from transformers import AutoModel, AutoConfig
+from huggingface_hub import snapshot_download
 import torch
+import jax
 import numpy as np
 import random
+import os
+import atexit
+import json
+import time
+import gc
+import hmac
+import logging
+import tempfile
+import uuid
+from contextlib import nullcontext
 from flask_cors import CORS
+from embeddingCache import EmbeddingCache
+from ingredientIndex import IngredientIndex, load_catalog
+from annIndex import IVFIndex
+from compatibilityMatrix import CompatibilityMatrix
+from ingredientSelection import normalize_rows, select_ingredients, select_ingredients_compat
+from tokenCache import TokenCache, PromptEncoder
+from admissionControl import AdmissionController, AdmissionSlot, Deadline, DeadlineExceeded, check_deadline
+from bucketedGenerator import BucketedGenerator
+from generationEngines import T5Engine, RecipeNLGEngine
+from inferenceScheduler import MicroBatcher
+from jobQueue import JobQueue
+from metrics import Histogram, Registry, process_memory_mb
+from recipeCache import RecipeCache
+from requestProfiler import RequestProfiler, profiling
+from streamingDecoder import StreamingDecoder
+from recipeSections import RecipeSectionParser
+from startupManager import StartupManager
+from stagePipeline import StagePipeline, Completed, parse_cpu_list, pin_current_thread
+from precision import (resident_memory_mb, torch_model_mb, flax_params_mb, quantize_linear_int8,
+                       cast_params_bf16, embedding_drift, selection_agreement)
+from sharedWeights import (save_torch_state, load_torch_model_mmap, save_flax_params,
+                           load_flax_params_mmap, has_flax_params)
+from structuredLog import configure_logging, get_logger, log_event, request_id
 
 app = Flask(__name__)
 CORS(app)
 
-# Load RecipeBERT model (for semantic ingredient combination)
+# Logs are JSON lines with the request id (LOG_JSON=0 for plain text).
+# Per-attempt details are logged at DEBUG, so the default INFO level skips them cheaply.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_JSON = os.environ.get("LOG_JSON", "1") == "1"
+configure_logging(LOG_LEVEL, LOG_JSON)
+logger = get_logger("server")
+
+# Prometheus metrics served at /metrics (METRICS_ENABLED=0 turns off the stage timers)
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+metrics = Registry(prefix="recipe_")
+stage_seconds = metrics.histogram(
+    "stage_seconds", "Latency of each pipeline stage in seconds",
+    [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30], label="stage"
+)
+request_seconds = metrics.histogram(
+    "request_seconds", "Request latency per endpoint in seconds",
+    [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60], label="endpoint"
+)
+requests_in_flight = metrics.gauge("requests_in_flight", "Requests currently being handled", label="endpoint")
+generations_in_flight = metrics.gauge("generations_in_flight", "Prompts currently waiting for T5 generate")
+responses_total = metrics.counter("responses_total", "Responses by HTTP status code", label="status")
+retry_attempts_total = metrics.counter("retry_attempts_total", "T5 generation attempts after the first one")
+validation_failures_total = metrics.counter(
+    "validation_failures_total", "Generated recipes that failed validation", label="reason"
+)
+errors_total = metrics.counter("errors_total", "Errors by exception type", label="type")
+recipe_cache_lookups_total = metrics.counter("recipe_cache_lookups_total", "Recipe cache lookups", label="result")
+early_exit_aborts_total = metrics.counter("early_exit_aborts_total", "Attempts aborted after the ingredients section")
+early_exit_tokens_saved_total = metrics.counter(
+    "early_exit_tokens_saved_total", "Estimated decode steps saved by aborting attempts early"
+)
+admission_total = metrics.counter("admission_total", "Admission decisions for inference requests", label="outcome")
+deadline_exceeded_total = metrics.counter(
+    "deadline_exceeded_total", "Requests cancelled at their deadline", label="stage"
+)
+degraded_requests_total = metrics.counter("degraded_requests_total", "Requests generated with lowered settings")
+decode_tokens = metrics.histogram(
+    "decode_tokens", "Length of complete token-by-token outputs", [64, 128, 192, 256, 320, 384, 448, 512]
+)
+
+def expected_decode_tokens():
+    """Mean length of complete token-by-token outputs (max_length until one has finished)"""
+    if not decode_tokens.count:
+        return generation_kwargs["max_length"]
+    return decode_tokens.sum / decode_tokens.count
+
+def timed_stage(name):
+    """Times a pipeline stage into recipe_stage_seconds (no-op with METRICS_ENABLED=0)"""
+    return stage_seconds.time(name) if METRICS_ENABLED else nullcontext()
+
+def record_error(error, where):
+    """Counts an exception by type and logs it"""
+    errors_total.inc(type(error).__name__)
+    log_event(logger, logging.ERROR, "Error", where=where, type=type(error).__name__, error=str(error))
+
+# RecipeBERT model (for semantic ingredient combination), loaded by load_bert_model
 bert_model_name = "alexdseo/RecipeBERT"
-bert_tokenizer = AutoTokenizer.from_pretrained(bert_model_name)
-bert_model = AutoModel.from_pretrained(bert_model_name)
-bert_model.eval()
+bert_tokenizer = None
+bert_model = None
+
+# Pooling of the RecipeBERT token embeddings: "mean" over all tokens or the "cls" token.
+# Caches and indexes hold BERT_POOLING embeddings; requests asking for the other
+# strategy ("pooling") are embedded without them and always scored exactly.
+BERT_POOLING = os.environ.get("BERT_POOLING", "mean")
 
-# Load T5 recipe generation model
+# T5 recipe generation model, loaded by load_t5_model. The model is built without
+# initializing params (_do_init=False), t5_params is passed to every call explicitly.
 MODEL_NAME_OR_PATH = "flax-community/t5-recipe-generation"
-t5_tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME_OR_PATH, use_fast=True)
-t5_model = FlaxAutoModelForSeq2SeqLM.from_pretrained(MODEL_NAME_OR_PATH)
+t5_tokenizer = None
+t5_model = None
+t5_params = None
+
+# Multi-process deployments (serve.py): weights exported once to SHARED_WEIGHTS_DIR are
+# memory-mapped by every worker instead of being loaded into private memory.
+# Reduced precision modes convert the weights and therefore give up the sharing.
+SHARED_WEIGHTS_DIR = os.environ.get("SHARED_WEIGHTS_DIR")
+BERT_WEIGHTS_FILE = os.path.join(SHARED_WEIGHTS_DIR, "recipebert.pt") if SHARED_WEIGHTS_DIR else None
+T5_PARAMS_DIR = os.path.join(SHARED_WEIGHTS_DIR, "t5_params") if SHARED_WEIGHTS_DIR else None
+
+# Both models load in parallel background threads while the HTTP port is already bound
+startup = StartupManager()
+STARTUP_RETRY_AFTER = int(os.environ.get("STARTUP_RETRY_AFTER", 10))
+
+# Reduced precision: BERT_PRECISION=int8 quantizes the linear layers of RecipeBERT,
+# T5_PRECISION=bf16 casts the T5 params. PRECISION_REPORT=1 compares both against fp32 at startup.
+BERT_PRECISION = os.environ.get("BERT_PRECISION", "fp32")
+T5_PRECISION = os.environ.get("T5_PRECISION", "fp32")
+PRECISION_REPORT = os.environ.get("PRECISION_REPORT", "0") == "1"
+PRECISION_SAMPLE_SIZE = int(os.environ.get("PRECISION_SAMPLE_SIZE", 256))
+precision_report = {}
 
 # Token mapping for T5 model output processing
-special_tokens = t5_tokenizer.all_special_tokens
+special_tokens = []
 tokens_map = {
     "<sep>": "--",
     "<section>": "\n"
 }
 
-def get_embedding(text):
-    """Computes embedding for a text with Mean Pooling over all tokens"""
-    inputs = bert_tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-    with torch.no_grad():
-        outputs = bert_model(**inputs)
+# Generation settings
+generation_kwargs = {
+    "max_length": 512,
+    "min_length": 64,
+    "do_sample": True,
+    "top_k": 60,
+    "top_p": 0.95
+}
+
+# Generation engines: GENERATION_ENGINES lists the engines to load ("t5", "recipenlg"), the first
+# one serves requests by default and the others can be chosen per request with "engine".
+# Batched candidates, early exit and streaming are T5 features.
+GENERATION_ENGINES = [name.strip() for name in os.environ.get("GENERATION_ENGINES", "t5").split(",") if name.strip()]
+DEFAULT_ENGINE = GENERATION_ENGINES[0]
+engines = {}
+
+# RecipeNLG (GPT-2) engine, run with torch on RECIPENLG_DEVICE (cuda if available)
+RECIPENLG_MODEL_NAME = os.environ.get("RECIPENLG_MODEL_NAME", "mbien/recipenlg")
+RECIPENLG_DEVICE = os.environ.get("RECIPENLG_DEVICE")
+recipenlg_generation_kwargs = {
+    "max_new_tokens": int(os.environ.get("RECIPENLG_MAX_NEW_TOKENS", 500)),
+    "do_sample": True,
+    "temperature": 0.8,
+    "top_k": 50,
+    "top_p": 0.95
+}
+
+# Generate all retry attempts as one batch (can also be chosen per request)
+T5_BATCHED_CANDIDATES = os.environ.get("T5_BATCHED_CANDIDATES", "0") == "1"
+
+# Decode attempts token by token and abort one as soon as its ingredients section closes
+# with the wrong count (can also be chosen per request; applies to the serial mode)
+T5_EARLY_EXIT = os.environ.get("T5_EARLY_EXIT", "0") == "1"
+section_token_id = None
+
+# Concurrent requests share batched BERT and T5 calls, collected for up to
+# SCHEDULER_MAX_WAIT_MS or SCHEDULER_MAX_BATCH_SIZE prompts (SCHEDULER_MAX_BERT_ITEMS names)
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "1") == "1"
+SCHEDULER_MAX_BATCH_SIZE = int(os.environ.get("SCHEDULER_MAX_BATCH_SIZE", 8))
+SCHEDULER_MAX_WAIT_MS = float(os.environ.get("SCHEDULER_MAX_WAIT_MS", 10))
+SCHEDULER_MAX_BERT_ITEMS = int(os.environ.get("SCHEDULER_MAX_BERT_ITEMS", 256))
+bert_batcher = None
+t5_batcher = None
+
+# Maximum number of ingredient sets per /generate_recipes request
+GENERATE_RECIPES_MAX_ITEMS = int(os.environ.get("GENERATE_RECIPES_MAX_ITEMS", 16))
+
+# Default number of attempts per recipe (max_retries in the payload)
+DEFAULT_MAX_RETRIES = 5
+
+# Inputs are padded to the smallest fitting length bucket and batch sizes to powers of two up to
+# the largest batch any endpoint sends (scheduler batches, /generate_recipes items, batched
+# candidates); larger batches run in chunks of the largest bucket. Every shape is compiled at
+# startup (T5_WARMUP_BATCH_SIZES limits the batch sizes), so steady traffic never recompiles.
+T5_INPUT_BUCKETS = [int(b) for b in os.environ.get("T5_INPUT_BUCKETS", "32,64,128,256").split(",")]
+T5_MAX_BATCH_SIZE = max(SCHEDULER_MAX_BATCH_SIZE if SCHEDULER_ENABLED else 1, GENERATE_RECIPES_MAX_ITEMS,
+                        DEFAULT_MAX_RETRIES)
+T5_BATCH_BUCKETS = [2 ** i for i in range(T5_MAX_BATCH_SIZE.bit_length())]
+if T5_BATCH_BUCKETS[-1] < T5_MAX_BATCH_SIZE:
+    T5_BATCH_BUCKETS.append(T5_MAX_BATCH_SIZE)
+T5_WARMUP_BATCH_SIZES = [int(b) for b in os.environ.get("T5_WARMUP_BATCH_SIZES", "").split(",") if b]
+
+# Compiled executables are kept on disk in JAX_COMPILATION_CACHE_DIR (defaults to
+# SHARED_WEIGHTS_DIR/jax_cache), so workers and restarts load warmed shapes instead of compiling
+JAX_COMPILATION_CACHE_DIR = os.environ.get("JAX_COMPILATION_CACHE_DIR") or (
+    os.path.join(SHARED_WEIGHTS_DIR, "jax_cache") if SHARED_WEIGHTS_DIR else None
+)
+if JAX_COMPILATION_CACHE_DIR:
+    jax.config.update("jax_compilation_cache_dir", JAX_COMPILATION_CACHE_DIR)
+t5_generator = None
+
+# The streaming decoder (/generate_recipe/stream and T5_EARLY_EXIT attempts) is compiled for every
+# input bucket at startup; T5_STREAMING_WARMUP=0 skips that unless T5_EARLY_EXIT is on
+T5_STREAMING_WARMUP = os.environ.get("T5_STREAMING_WARMUP", "1") == "1"
+streaming_decoder = None
+
+# Admission control: at most ADMISSION_MAX_CONCURRENT inference requests run at once and
+# ADMISSION_MAX_QUEUE wait for a slot, everything beyond gets 429. Requests carry a deadline
+# (REQUEST_DEADLINE_SECONDS, or deadline_seconds in the payload; 0 for none) that is checked
+# between stages and retries. While requests queue up, ADMISSION_DEGRADE lowers max_retries
+# and, from ADMISSION_REDUCED_LENGTH_PRESSURE queue occupancy on, generates with
+# ADMISSION_REDUCED_MAX_LENGTH (0 disables it). Its shapes are compiled at startup for
+# ADMISSION_REDUCED_WARMUP_BATCH_SIZES (default: the scheduler's batch buckets, or 1), so overload never
+# triggers compiles; with the compilation cache this is paid once per deployment.
+ADMISSION_MAX_CONCURRENT = int(os.environ.get("ADMISSION_MAX_CONCURRENT", 4))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", 16))
+ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", 2))
+REQUEST_DEADLINE_SECONDS = float(os.environ.get("REQUEST_DEADLINE_SECONDS", 60))
+ADMISSION_DEGRADE = os.environ.get("ADMISSION_DEGRADE", "1") == "1"
+ADMISSION_REDUCED_MAX_LENGTH = int(os.environ.get("ADMISSION_REDUCED_MAX_LENGTH", 256))
+ADMISSION_REDUCED_LENGTH_PRESSURE = float(os.environ.get("ADMISSION_REDUCED_LENGTH_PRESSURE", 0.5))
+ADMISSION_REDUCED_WARMUP_BATCH_SIZES = (
+    [int(b) for b in os.environ.get("ADMISSION_REDUCED_WARMUP_BATCH_SIZES", "").split(",") if b]
+    or ([b for b in T5_BATCH_BUCKETS if b <= SCHEDULER_MAX_BATCH_SIZE] if SCHEDULER_ENABLED else [1])
+)
+admission = AdmissionController(ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE)
+t5_reduced_generator = None
+t5_reduced_batcher = None
+
+# Pipeline: /generate_recipe and jobs run ingredient selection (torch) and generation (JAX) in
+# separate worker pools connected by a queue, so one request's selection overlaps another's decoding.
+# PIPELINE_BERT_CPUS / PIPELINE_T5_CPUS ("0-7,16") pin each stage, including the model loading
+# thread and thus the intra-op pools and batchers it starts; TORCH_NUM_THREADS caps torch's intra-op
+# threads. XLA has no supported thread count setting, PIPELINE_T5_CPUS bounds its pool instead.
+PIPELINE_ENABLED = os.environ.get("PIPELINE_ENABLED", "1") == "1"
+PIPELINE_BERT_WORKERS = int(os.environ.get("PIPELINE_BERT_WORKERS", 1))
+PIPELINE_T5_WORKERS = int(os.environ.get("PIPELINE_T5_WORKERS", ADMISSION_MAX_CONCURRENT))
+PIPELINE_BERT_CPUS = parse_cpu_list(os.environ.get("PIPELINE_BERT_CPUS"))
+PIPELINE_T5_CPUS = parse_cpu_list(os.environ.get("PIPELINE_T5_CPUS"))
+TORCH_NUM_THREADS = int(os.environ.get("TORCH_NUM_THREADS", 0))
+if TORCH_NUM_THREADS:
+    torch.set_num_threads(TORCH_NUM_THREADS)
+recipe_pipeline = None
+
+# Request profiling (PROFILING_ENABLED=1): a request sending "X-Profile: 1", or the next N requests
+# armed via POST /admin/profile, are profiled with cProfile, a stack sampler every
+# PROFILE_SAMPLE_INTERVAL_MS and the PROFILE_TRACES framework profilers. Profiled requests run their
+# BERT and T5 calls in the request thread instead of the batchers and the pipeline. The last
+# PROFILE_MAX_STORED profiles are kept in PROFILE_DIR with the payload and served under /admin/profiles.
+# With ADMIN_TOKEN set, the admin endpoints and X-Profile require a matching X-Admin-Token header.
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = os.environ.get("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "recipe-profiles")
+PROFILE_MAX_STORED = int(os.environ.get("PROFILE_MAX_STORED", 20))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", 5))
+PROFILE_TRACES = [name.strip() for name in os.environ.get("PROFILE_TRACES", "torch,jax").split(",") if name.strip()]
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+request_profiler = RequestProfiler(PROFILE_DIR, PROFILE_MAX_STORED, PROFILE_SAMPLE_INTERVAL_MS / 1000,
+                                   PROFILE_TRACES) if PROFILING_ENABLED else None
+
+# Optional cache of validated recipes per optimized ingredient set
+RECIPE_CACHE_ENABLED = os.environ.get("RECIPE_CACHE_ENABLED", "0") == "1"
+recipe_cache = RecipeCache(
+    max_size=int(os.environ.get("RECIPE_CACHE_SIZE", 1024)),
+    ttl_seconds=int(os.environ.get("RECIPE_CACHE_TTL", 3600)),
+    variants=int(os.environ.get("RECIPE_CACHE_VARIANTS", 3)),
+    policy=os.environ.get("RECIPE_CACHE_POLICY", "round_robin")
+)
+
+def embedding_store_path(path):
+    """
+    Suffixes a persisted embedding store path with BERT_POOLING and BERT_PRECISION.
+
+    Embeddings of other pooling strategies and precisions are stored next to
+    the mean pooling fp32 ones, so a restart with other settings never loads them.
+    """
+    for value, default in ((BERT_POOLING, "mean"), (BERT_PRECISION, "fp32")):
+        if path and value != default:
+            path += f"-{value}"
+    return path
+
+# Embedding cache for ingredient vectors (set EMBEDDING_CACHE_PATH to persist across restarts)
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", 4096))
+EMBEDDING_CACHE_PATH = embedding_store_path(os.environ.get("EMBEDDING_CACHE_PATH"))
+embedding_cache = EmbeddingCache(max_size=EMBEDDING_CACHE_SIZE, path=EMBEDDING_CACHE_PATH)
+if embedding_cache.load():
+    log_event(logger, logging.INFO, "Loaded cached embeddings", entries=len(embedding_cache), path=EMBEDDING_CACHE_PATH)
+atexit.register(embedding_cache.save)
+
+# Precomputed embedding index for the ingredient catalog of the Flutter app
+INGREDIENT_CATALOG_PATH = os.environ.get(
+    "INGREDIENT_CATALOG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "ingriedientsData.dart")
+)
+INGREDIENT_INDEX_PATH = embedding_store_path(os.environ.get("INGREDIENT_INDEX_PATH") or (
+    os.path.join(SHARED_WEIGHTS_DIR, "ingredient_index") if SHARED_WEIGHTS_DIR else None
+))
+INGREDIENT_INDEX_MAX_SIZE = int(os.environ.get("INGREDIENT_INDEX_MAX_SIZE", 20000))
+INDEX_BATCH_SIZE = int(os.environ.get("INDEX_BATCH_SIZE", 128))
+ingredient_index = IngredientIndex(max_size=INGREDIENT_INDEX_MAX_SIZE)
+
+# Candidate pruning for large pantries: with more than ANN_MIN_CANDIDATES available ingredients,
+# only the ANN_SHORTLIST_SIZE candidates closest to the required ingredients (found with an IVF
+# index over the ingredient index, probing at least ANN_NPROBE lists) are scored exactly
+ANN_ENABLED = os.environ.get("ANN_ENABLED", "1") == "1"
+ANN_MIN_CANDIDATES = int(os.environ.get("ANN_MIN_CANDIDATES", 500))
+ANN_SHORTLIST_SIZE = int(os.environ.get("ANN_SHORTLIST_SIZE", 128))
+ANN_NPROBE = int(os.environ.get("ANN_NPROBE", 8))
+ANN_LISTS = int(os.environ.get("ANN_LISTS", 0)) or None
+ann_index = IVFIndex(num_lists=ANN_LISTS, nprobe=ANN_NPROBE)
+
+# Pairwise cosine similarities of the first COMPAT_MAX_SIZE index rows (COMPAT_DTYPE float32; float16
+# and int8 save memory but can swap picks with close scores). Selection gathers rows from it instead of
+# multiplying embeddings; large pantries are shortlisted from the COMPAT_TOP_K best candidates cached per
+# required set instead of the IVF index. exact_selection scores the embeddings directly.
+COMPAT_ENABLED = os.environ.get("COMPAT_ENABLED", "1") == "1"
+COMPAT_MAX_SIZE = int(os.environ.get("COMPAT_MAX_SIZE", 8192))
+COMPAT_DTYPE = os.environ.get("COMPAT_DTYPE", "float32")
+COMPAT_TOP_K = int(os.environ.get("COMPAT_TOP_K", 512))
+COMPAT_NEIGHBOR_CACHE_SIZE = int(os.environ.get("COMPAT_NEIGHBOR_CACHE_SIZE", 1024))
+compat_matrix = CompatibilityMatrix(COMPAT_MAX_SIZE, COMPAT_DTYPE, COMPAT_TOP_K, COMPAT_NEIGHBOR_CACHE_SIZE)
 
-    # Mean Pooling - take average of all token embeddings
-    attention_mask = inputs['attention_mask']
+# Batch encoding settings for RecipeBERT (BERT_MAX_LENGTH defaults to the model limit)
+BERT_BATCH_SIZE = int(os.environ.get("BERT_BATCH_SIZE", 32))
+BERT_MAX_LENGTH = int(os.environ["BERT_MAX_LENGTH"]) if os.environ.get("BERT_MAX_LENGTH") else None
+
+# Token id caches: RecipeBERT output per ingredient name, and T5 prompts assembled from the
+# cached ids of their pieces (checked against the tokenizer at startup, T5_PROMPT_CACHE=0 disables)
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 8192))
+T5_PROMPT_CACHE = os.environ.get("T5_PROMPT_CACHE", "1") == "1"
+bert_token_cache = None
+prompt_encoder = None
+
+def make_bert_token_cache():
+    """Returns a token cache for bert_tokenizer with the settings get_embeddings uses by default"""
+    return TokenCache(lambda texts: bert_tokenizer(texts, truncation=True, max_length=BERT_MAX_LENGTH),
+                      TOKEN_CACHE_SIZE)
+
+def mean_pooling(outputs, attention_mask):
+    """Averages the token embeddings of each row, ignoring padding"""
     token_embeddings = outputs.last_hidden_state
     input_mask_expanded = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
     sum_embeddings = torch.sum(token_embeddings * input_mask_expanded, 1)
     sum_mask = torch.clamp(input_mask_expanded.sum(1), min=1e-9)
+    return sum_embeddings / sum_mask
 
-    return (sum_embeddings / sum_mask).squeeze(0)
+def cls_pooling(outputs, attention_mask):
+    """Takes the embedding of the [CLS] token of each row"""
+    return outputs.last_hidden_state[:, 0]
 
-def average_embedding(embedding_list):
-    """Computes the average of a list of embeddings"""
-    tensors = torch.stack([emb for _, emb in embedding_list])
-    return tensors.mean(dim=0)
+POOLING_STRATEGIES = {"mean": mean_pooling, "cls": cls_pooling}
+if BERT_POOLING not in POOLING_STRATEGIES:
+    raise ValueError(f"Unknown BERT_POOLING {BERT_POOLING!r}, expected one of {sorted(POOLING_STRATEGIES)}")
 
-def get_cosine_similarity(vec1, vec2):
-    """Computes the cosine similarity between two vectors"""
-    if torch.is_tensor(vec1):
-        vec1 = vec1.detach().numpy()
-    if torch.is_tensor(vec2):
-        vec2 = vec2.detach().numpy()
+def get_embedding(text):
+    """Computes embedding for a text with the BERT_POOLING strategy"""
+    return get_embeddings([text])[0]
 
-    # Make sure vectors have the right shape (flatten if necessary)
-    vec1 = vec1.flatten()
-    vec2 = vec2.flatten()
+def tokenize_for_bert(texts, max_length):
+    """Returns the RecipeBERT tokenizer output per text, from the token cache where possible"""
+    if bert_token_cache is not None and max_length == BERT_MAX_LENGTH:
+        return bert_token_cache.encode(texts)
+    encoded = bert_tokenizer(texts, truncation=True, max_length=max_length)
+    return [{key: encoded[key][i] for key in encoded.keys()} for i in range(len(texts))]
 
-    dot_product = np.dot(vec1, vec2)
-    norm_a = np.linalg.norm(vec1)
-    norm_b = np.linalg.norm(vec2)
+def get_embeddings(texts, batch_size=None, max_length=None, pooling=None):
+    """
+    Computes pooled embeddings for a list of texts in batched forward passes.
 
-    # Avoid division by zero
-    if norm_a == 0 or norm_b == 0:
-        return 0
+    Texts are tokenized once (names seen before come from the token cache),
+    sorted by token length and padded per chunk, so each chunk only carries
+    the padding it needs.
 
-    return dot_product / (norm_a * norm_b)
+    Args:
+        texts (list): Texts to embed
+        batch_size (int): Texts per forward pass (defaults to BERT_BATCH_SIZE)
+        max_length (int): Truncation length in tokens (defaults to BERT_MAX_LENGTH)
+        pooling (str): Key of POOLING_STRATEGIES (defaults to BERT_POOLING)
 
-def get_combined_scores(query_vector, embedding_list, all_good_embeddings, avg_weight=0.6):
-    """Computes combined score considering both similarity to average and individual ingredients"""
-    results = []
+    Returns:
+        torch.Tensor: One embedding per text, in input order
+    """
+    batch_size = batch_size or BERT_BATCH_SIZE
+    max_length = max_length or BERT_MAX_LENGTH
+    pool = POOLING_STRATEGIES[pooling or BERT_POOLING]
+    embeddings = torch.empty(len(texts), bert_model.config.hidden_size)
+    if not texts:
+        return embeddings
 
-    for name, emb in embedding_list:
-        # Similarity to average vector
-        avg_similarity = get_cosine_similarity(query_vector, emb)
+    encoded = tokenize_for_bert(list(texts), max_length)
+    order = sorted(range(len(texts)), key=lambda i: len(encoded[i]['input_ids']))
 
-        # Average similarity to individual ingredients
-        individual_similarities = [get_cosine_similarity(good_emb, emb)
-                                  for _, good_emb in all_good_embeddings]
-        avg_individual_similarity = sum(individual_similarities) / len(individual_similarities)
+    for start in range(0, len(order), batch_size):
+        chunk = order[start:start + batch_size]
+        features = [dict(encoded[i]) for i in chunk]
+        inputs = bert_tokenizer.pad(features, padding=True, return_tensors="pt")
+        with torch.no_grad():
+            outputs = bert_model(**inputs)
+        embeddings[chunk] = pool(outputs, inputs['attention_mask'])
 
-        # Combined score (weighted average)
-        combined_score = avg_weight * avg_similarity + (1 - avg_weight) * avg_individual_similarity
+    return embeddings
 
-        results.append((name, emb, combined_score))
+def normalize_ingredient(text):
+    """Normalizes an ingredient name for use as a cache key"""
+    text = " ".join(text.split())
+    # Only fold case if the tokenizer does so itself, otherwise embeddings would differ
+    if getattr(bert_tokenizer, "do_lower_case", False):
+        text = text.lower()
+    return text
 
-    # Sort by combined score (descending)
-    results.sort(key=lambda x: x[2], reverse=True)
-    return results
+def encode_ingredient_batch(names):
+    """Embeds a batch of names collected from concurrent requests, each unique name once"""
+    unique = list(dict.fromkeys(names))
+    vectors = dict(zip(unique, get_embeddings(unique).numpy()))
+    return [vectors[name] for name in names]
+
+def encode_ingredients(names):
+    """Embeds names, sharing the forward pass with concurrent requests if the scheduler is enabled"""
+    if SCHEDULER_ENABLED and not (PROFILING_ENABLED and profiling.get()):
+        return bert_batcher.submit(names)
+    return list(get_embeddings(names).numpy())
+
+def get_cached_embeddings(texts):
+    """
+    Returns the embeddings for a list of texts as a matrix.
+    Catalog ingredients are served from the precomputed index; all other names
+    are computed together in one batched pass, cached and appended to the index.
+    """
+    keys = [normalize_ingredient(text) for text in texts]
+    matrix = np.empty((len(keys), bert_model.config.hidden_size), dtype=np.float32)
+
+    missing = {}
+    indexed_positions, indexed_rows = [], []
+    for i, key in enumerate(keys):
+        row = ingredient_index.get_row(key)
+        if row is not None:
+            indexed_positions.append(i)
+            indexed_rows.append(row)
+            continue
+        vector = embedding_cache.get(key)
+        if vector is not None:
+            matrix[i] = vector
+        else:
+            missing.setdefault(key, []).append(i)
+
+    if indexed_rows:
+        matrix[indexed_positions] = ingredient_index.vectors(indexed_rows)
+
+    if missing:
+        names = list(missing)
+        vectors = encode_ingredients(names)
+        for name, vector in zip(names, vectors):
+            embedding_cache.put(name, vector)
+            matrix[missing[name]] = vector
+
+    # Grow the index with every name outside the catalog
+    first_rows = {}
+    for i, key in enumerate(keys):
+        if key not in ingredient_index:
+            first_rows.setdefault(key, i)
+    if first_rows:
+        ingredient_index.add(list(first_rows), matrix[list(first_rows.values())])
+        if ANN_ENABLED:
+            ann_index.update(ingredient_index.matrix)
+        if COMPAT_ENABLED:
+            compat_matrix.update(ingredient_index.matrix)
+
+    return matrix
 
-def find_best_ingredients(required_ingredients, available_ingredients, max_ingredients=6, avg_weight=0.6):
+def build_ingredient_index():
+    """Loads the catalog embedding index from disk or builds it with batched RecipeBERT passes"""
+    if INGREDIENT_INDEX_PATH and ingredient_index.load(INGREDIENT_INDEX_PATH):
+        log_event(logger, logging.INFO, "Loaded ingredient index", entries=len(ingredient_index),
+                  path=INGREDIENT_INDEX_PATH)
+
+    if not os.path.exists(INGREDIENT_CATALOG_PATH):
+        log_event(logger, logging.WARNING, "Ingredient catalog not found, skipping index build",
+                  path=INGREDIENT_CATALOG_PATH)
+        return
+
+    # The app sends lowercased ingredient names, so index them the same way
+    names = [normalize_ingredient(name.lower()) for name in load_catalog(INGREDIENT_CATALOG_PATH)]
+    missing = [name for name in dict.fromkeys(names) if name not in ingredient_index]
+    if missing:
+        log_event(logger, logging.INFO, "Embedding catalog ingredients", count=len(missing))
+        ingredient_index.add(missing, get_embeddings(missing, INDEX_BATCH_SIZE).numpy())
+        if INGREDIENT_INDEX_PATH:
+            ingredient_index.save(INGREDIENT_INDEX_PATH)
+    if ANN_ENABLED and len(ingredient_index):
+        ann_index.train(ingredient_index.matrix)
+    if COMPAT_ENABLED:
+        compat_matrix.update(ingredient_index.matrix)
+    log_event(logger, logging.INFO, "Ingredient index ready", entries=len(ingredient_index))
+
+if INGREDIENT_INDEX_PATH:
+    atexit.register(ingredient_index.save, INGREDIENT_INDEX_PATH)
+
+def compat_rows(names):
+    """Returns the index rows of names if the compatibility matrix covers all of them, else None"""
+    if not COMPAT_ENABLED:
+        return None
+    rows = [ingredient_index.get_row(normalize_ingredient(name)) for name in names]
+    return rows if compat_matrix.covers(rows) else None
+
+def shortlist_compat(required_rows, candidate_rows, k, avg_weight=0.6):
+    """
+    Picks the k candidates that rank best in the cached neighbor list of the required set.
+    
+    Returns:
+        np.ndarray: Positions into candidate_rows in their original order, or None if the
+            neighbor list holds fewer than k of the candidates (score all of them then)
+    """
+    positions = {}
+    for i, row in enumerate(candidate_rows):
+        positions.setdefault(row, i)
+    neighbors = compat_matrix.neighbors(required_rows, ingredient_index.norms, avg_weight)
+    picked = [positions[row] for row in neighbors.tolist() if row in positions][:k]
+    if len(picked) < k:
+        return None
+    # Keep the original order so ties resolve as in the exact selection
+    return np.sort(np.asarray(picked, dtype=np.int64))
+
+def shortlist_candidates(required_matrix, candidate_names, k):
+    """
+    Finds the k candidates closest to the centroid of the required ingredients with the IVF index.
+    
+    Returns:
+        np.ndarray: Positions into candidate_names in their original order, or None
+            if some candidate is not in the ingredient index (score all exactly then)
+    """
+    rows = [ingredient_index.get_row(normalize_ingredient(name)) for name in candidate_names]
+    if any(row is None for row in rows):
+        return None
+    query = normalize_rows(required_matrix.sum(axis=0, keepdims=True))[0]
+    # Keep the original order so ties resolve as in the exact selection
+    return np.sort(ann_index.search(ingredient_index.matrix, query, rows, k))
+
+def find_best_ingredients(required_ingredients, available_ingredients, max_ingredients=6, avg_weight=0.6,
+                          embeddings=None, avoid=None, diversity=0.0, exact=False):
     """
     Finds the best ingredients based on RecipeBERT embeddings.
     
@@ -99,6 +558,10 @@ def find_best_ingredients(required_ingredients, available_ingredients, max_ingre
         available_ingredients (list): Available ingredients to choose from
         max_ingredients (int): Maximum number of ingredients for the recipe
         avg_weight (float): Weight for average vector
+        embeddings (dict): Optional precomputed name -> embedding lookup
+        avoid (np.ndarray): Optional embeddings of ingredients to steer away from
+        diversity (float): Penalty weight for similarity to the avoided ingredients
+        exact (bool): Score every candidate, even for pantries above ANN_MIN_CANDIDATES
         
     Returns:
         list: The optimal combination of ingredients
@@ -113,7 +576,8 @@ def find_best_ingredients(required_ingredients, available_ingredients, max_ingre
         random_ingredient = random.choice(available_ingredients)
         required_ingredients = [random_ingredient]
         available_ingredients = [i for i in available_ingredients if i != random_ingredient]
-        print(f"No required ingredients provided. Randomly selected: {random_ingredient}")
+        log_event(logger, logging.DEBUG, "No required ingredients, selected a random start",
+                  ingredient=random_ingredient)
     
     # If still no ingredients or already at max capacity
     if not required_ingredients or len(required_ingredients) >= max_ingredients:
@@ -123,39 +587,80 @@ def find_best_ingredients(required_ingredients, available_ingredients, max_ingre
     if not available_ingredients:
         return required_ingredients
     
-    # Calculate embeddings for all ingredients
-    embed_required = [(e, get_embedding(e)) for e in required_ingredients]
-    embed_available = [(e, get_embedding(e)) for e in available_ingredients]
+    # Calculate embeddings for all ingredients in one batch
+    with timed_stage("embedding"):
+        if embeddings is None:
+            matrix = get_cached_embeddings(required_ingredients + available_ingredients)
+        else:
+            matrix = np.stack([embeddings[name] for name in required_ingredients + available_ingredients])
+    embed_required = matrix[:len(required_ingredients)]
+    embed_available = matrix[len(required_ingredients):]
     
     # Number of ingredients to add
     num_to_add = min(max_ingredients - len(required_ingredients), len(available_ingredients))
     
-    # Copy required ingredients to final list
-    final_ingredients = embed_required.copy()
+    # Names covered by the compatibility matrix are scored from it (the embeddings passed by
+    # find_best_ingredients_batch are the index rows as well)
+    rows = compat_rows(required_ingredients + available_ingredients) if not exact else None
+    if rows is not None:
+        required_rows, candidate_rows = rows[:len(required_ingredients)], rows[len(required_ingredients):]
     
-    # Add best ingredients
-    for _ in range(num_to_add):
-        # Calculate average vector of current combination
-        avg = average_embedding(final_ingredients)
-        
-        # Calculate combined scores for all candidates
-        candidates = get_combined_scores(avg, embed_available, final_ingredients, avg_weight)
-        
-        # If no candidates left, break
-        if not candidates:
-            break
-            
-        # Choose best ingredient
-        best_name, best_embedding, _ = candidates[0]
+    # Large pantries: only score the candidates near the required ingredients, taken from the
+    # compatibility matrix's neighbor list or the IVF index
+    if (not exact and (rows is not None or (ANN_ENABLED and ann_index.trained))
+            and len(available_ingredients) > ANN_MIN_CANDIDATES and num_to_add < ANN_SHORTLIST_SIZE):
+        with timed_stage("shortlist"):
+            if rows is not None:
+                shortlist = shortlist_compat(required_rows, candidate_rows, ANN_SHORTLIST_SIZE, avg_weight)
+            else:
+                shortlist = shortlist_candidates(embed_required, available_ingredients, ANN_SHORTLIST_SIZE)
+        if shortlist is not None:
+            embed_available = embed_available[shortlist]
+            available_ingredients = [available_ingredients[i] for i in shortlist]
+            if rows is not None:
+                candidate_rows = [candidate_rows[i] for i in shortlist]
+    
+    with timed_stage("selection"):
+        # Penalize candidates close to ingredients that should be avoided
+        penalty = None
+        if diversity and avoid is not None and len(avoid):
+            penalty = diversity * (normalize_rows(embed_available) @ normalize_rows(avoid).T).max(axis=1)
         
-        # Add best ingredient to final list
-        final_ingredients.append((best_name, best_embedding))
+        # Add best ingredients to the required ones
+        if rows is not None:
+            selected = select_ingredients_compat(compat_matrix, ingredient_index.norms, required_rows, candidate_rows,
+                                                 num_to_add, avg_weight, penalty)
+        else:
+            selected = select_ingredients(embed_required, embed_available, num_to_add, avg_weight, penalty)
+    return required_ingredients + [available_ingredients[i] for i in selected]
+
+def find_best_ingredients_batch(requests, diversity=0.0, avg_weight=0.6, exact=False):
+    """
+    Runs find_best_ingredients for several requests with one embedding lookup for all names.
+    
+    Args:
+        requests (list): (required_ingredients, available_ingredients, max_ingredients) tuples
+        diversity (float): Penalty weight that steers each request away from the
+            ingredients picked for the previous ones
+        avg_weight (float): Weight for average vector
+        exact (bool): Score every candidate, even for large pantries
         
-        # Remove ingredient from available ingredients
-        embed_available = [item for item in embed_available if item[0] != best_name]
+    Returns:
+        list: The optimal combination of ingredients per request
+    """
+    names = list(dict.fromkeys(name for required, available, _ in requests for name in required + available))
+    with timed_stage("embedding"):
+        embeddings = dict(zip(names, get_cached_embeddings(names))) if names else {}
     
-    # Extract only ingredient names
-    return [name for name, _ in final_ingredients]
+    results = []
+    chosen = []
+    for required, available, max_ingredients in requests:
+        avoid = np.stack([embeddings[name] for name in chosen]) if chosen else None
+        ingredients = find_best_ingredients(required, available, max_ingredients, avg_weight,
+                                            embeddings=embeddings, avoid=avoid, diversity=diversity, exact=exact)
+        results.append(ingredients)
+        chosen.extend(name for name in ingredients if name not in required and name in embeddings)
+    return results
 
 def skip_special_tokens(text, special_tokens):
     """Removes special tokens from text"""
@@ -198,127 +703,623 @@ def validate_recipe_ingredients(recipe_ingredients, expected_ingredients, tolera
     # Check if ingredient count is within tolerance
     return abs(recipe_count - expected_count) == tolerance
 
-def generate_recipe_with_t5(ingredients_list, max_retries=5):
+def mark_validated(recipe, reason):
     """
-    Generates a recipe using the T5 recipe generation model with validation.
+    Flags a parsed model output that passed validation, the only recipes worth caching.
+    
+    Fallback recipes are never flagged, nor outputs without an ingredients section.
+    """
+    recipe["validated"] = reason is None and not recipe.get("ingredients_missing", False)
+    return recipe
+
+def validation_failure_reason(recipe_ingredients, expected_ingredients):
+    """Returns why a recipe fails validate_recipe_ingredients (None if it passes), counting the failure"""
+    if validate_recipe_ingredients(recipe_ingredients, expected_ingredients):
+        return None
+    recipe_count = len([ing for ing in recipe_ingredients if ing and ing.strip()])
+    reason = "too_few_ingredients" if recipe_count < len(expected_ingredients) else "too_many_ingredients"
+    validation_failures_total.inc(reason)
+    return reason
+
+def run_t5(prompts, reduced_length=False):
+    """
+    Generates token ids for prompts, sharing the batch with concurrent requests if the scheduler is enabled.
+    With reduced_length, output stops at ADMISSION_REDUCED_MAX_LENGTH tokens (if that generator exists).
+    """
+    generator, batcher = t5_generator, t5_batcher
+    if reduced_length and t5_reduced_generator is not None:
+        generator, batcher = t5_reduced_generator, t5_reduced_batcher
+    with generations_in_flight.track():
+        if SCHEDULER_ENABLED and not (PROFILING_ENABLED and profiling.get()):
+            return np.asarray(batcher.submit(prompts))
+        return generator.generate(prompts)
+
+def decode_generated(generated):
+    """Decodes generated token ids and applies the post-processing rules"""
+    with timed_stage("decoding"):
+        return target_postprocessing(
+            t5_tokenizer.batch_decode(generated, skip_special_tokens=False),
+            special_tokens
+        )
+
+def build_prompt(ingredients):
+    """Formats ingredients as T5 input prompt"""
+    return "items: " + ", ".join(ingredients)
+
+def encode_prompt(ingredients):
+    """Returns the T5 prompt for ingredients as cached token ids, or as text without the prompt cache"""
+    if prompt_encoder is not None:
+        return prompt_encoder.encode(ingredients)
+    return build_prompt(ingredients)
+
+def setup_prompt_encoder(samples=200, seed=0):
+    """Creates the prompt encoder if its output matches the T5 tokenizer on sample prompts"""
+    global prompt_encoder
+    encoder = PromptEncoder(t5_tokenizer, build_prompt, TOKEN_CACHE_SIZE)
+    names = ["tomato", "olive oil", "salt", "crème fraîche", "jalapeño", "half-and-half", "1% milk", "SPAM"]
+    if os.path.exists(INGREDIENT_CATALOG_PATH):
+        names += [name.lower() for name in load_catalog(INGREDIENT_CATALOG_PATH)]
+    rng = random.Random(seed)
+    ingredient_lists = [rng.sample(names, rng.randint(1, min(8, len(names)))) for _ in range(samples)]
+    mismatches = encoder.verify(ingredient_lists)
+    if mismatches:
+        log_event(logger, logging.WARNING, "Prompt token cache disabled, ids differ from the tokenizer",
+                  mismatches=len(mismatches), example=mismatches[0])
+        return
+    # Keep the pieces warm but count only real traffic
+    encoder.cache.hits = encoder.cache.misses = encoder.fallbacks = 0
+    prompt_encoder = encoder
+
+def parse_recipe(generated_text, current_ingredients):
+    """
+    Parses a post-processed T5 output into a recipe dictionary.
     
     Args:
-        ingredients_list (list): List of ingredients
-        max_retries (int): Maximum number of retry attempts
+        generated_text (str): Output of target_postprocessing
+        current_ingredients (list): Ingredients used in the prompt (for defaults)
         
     Returns:
         dict: A dictionary with title, ingredients, and directions
     """
+    recipe = {}
+    sections = generated_text.split("\n")
+    for section in sections:
+        section = section.strip()
+        if section.startswith("title:"):
+            recipe["title"] = section.replace("title:", "").strip().capitalize()
+        elif section.startswith("ingredients:"):
+            ingredients_text = section.replace("ingredients:", "").strip()
+            recipe["ingredients"] = [item.strip().capitalize() for item in ingredients_text.split("--") if item.strip()]
+        elif section.startswith("directions:"):
+            directions_text = section.replace("directions:", "").strip()
+            recipe["directions"] = [step.strip().capitalize() for step in directions_text.split("--") if step.strip()]
+    
+    # If title is missing, create one
+    if "title" not in recipe:
+        recipe["title"] = f"Recipe with {', '.join(current_ingredients[:3])}"
+        
+    # Ensure all sections exist (a defaulted ingredients list would pass validation, so mark it)
+    if "ingredients" not in recipe:
+        recipe["ingredients"] = current_ingredients
+        recipe["ingredients_missing"] = True
+    if "directions" not in recipe:
+        recipe["directions"] = ["No directions generated"]
+    
+    return recipe
+
+def fallback_recipe(ingredients):
+    """Returns the placeholder recipe used when generation fails"""
+    return {
+        "title": f"Recipe with {ingredients[0] if ingredients else 'ingredients'}",
+        "ingredients": ingredients,
+        "directions": ["Error generating recipe instructions"]
+    }
+
+def closed_ingredients_section(generated_text):
+    """
+    Returns the ingredients of a partial output once the ingredients section is complete.
+    
+    A section is complete when the next section separator has been generated.
+    
+    Returns:
+        list: The ingredient items, or None while the section is still open
+    """
+    sections = generated_text.split("\n")
+    for section in sections[:-1]:
+        section = section.strip()
+        if section.startswith("ingredients:"):
+            return [item.strip() for item in section.replace("ingredients:", "").split("--") if item.strip()]
+    return None
+
+def stream_candidate(prompt, expected_ingredients, allow_abort=True, max_length=None):
+    """
+    Decodes one candidate token by token, aborting it once its ingredients section fails validation.
+    
+    The output is only decoded when a section separator is sampled (or on every
+    token if the tokenizer has no single separator token) until the ingredients
+    section has been checked.
+    
+    Args:
+        prompt: T5 input prompt (text or token ids from encode_prompt)
+        expected_ingredients (list): Ingredients the recipe must contain
+        allow_abort (bool): False decodes the full output regardless (e.g. for the last attempt)
+        max_length (int): Optional lower output limit than generation_kwargs
+        
+    Returns:
+        tuple: Post-processed text, number of decode steps, and whether the candidate was aborted
+    """
+    input_ids, attention_mask = t5_generator.encode([prompt])
+    token_ids = []
+    watching = allow_abort
+    with timed_stage("generation"):
+        for token_id in streaming_decoder.stream(input_ids, attention_mask, max_length=max_length):
+            token_ids.append(token_id)
+            if not watching or (section_token_id is not None and token_id != section_token_id):
+                continue
+            
+            partial_text = target_postprocessing(t5_tokenizer.decode(token_ids, skip_special_tokens=False),
+                                                 special_tokens)[0]
+            items = closed_ingredients_section(partial_text)
+            if items is None:
+                continue
+            if validation_failure_reason(items, expected_ingredients) is not None:
+                return partial_text, len(token_ids), True
+            # The count is right, the rest of the output needs no more checks
+            watching = False
+    
+    decode_tokens.observe(len(token_ids))
+    text = target_postprocessing(t5_tokenizer.decode(token_ids, skip_special_tokens=False), special_tokens)[0]
+    return text, len(token_ids), False
+
+def generate_recipe_early_exit(ingredients_list, max_retries=5, deadline=None, reduced_length=False):
+    """
+    Generates a recipe like the serial mode, but aborts attempts early.
+    
+    An attempt whose ingredients section closes with the wrong count is dropped
+    right there and the next (shuffled) attempt starts. The last attempt always
+    runs to the end so there is a recipe to return.
+    
+    Returns:
+        dict: A dictionary with title, ingredients, and directions, plus a
+            "generation" entry with the decode steps used and the tokens saved
+    """
     original_ingredients = ingredients_list.copy()
+    max_retries = max(max_retries, 1)
+    max_length = ADMISSION_REDUCED_MAX_LENGTH if reduced_length and ADMISSION_REDUCED_MAX_LENGTH else None
+    report = {"attempts": 0, "aborted": 0, "decode_steps": 0, "tokens_saved": 0}
+    recipe = None
     
     for attempt in range(max_retries):
+        current_ingredients = ingredients_list
+        if attempt > 0:
+            check_deadline(deadline, f"attempt {attempt + 1}")
+            retry_attempts_total.inc()
+            current_ingredients = original_ingredients.copy()
+            random.shuffle(current_ingredients)
+        
         try:
-            # For retries after the first attempt, shuffle the ingredients
+            text, steps, aborted = stream_candidate(encode_prompt(current_ingredients), original_ingredients,
+                                                    allow_abort=attempt < max_retries - 1, max_length=max_length)
+        except Exception as e:
+            record_error(e, f"early exit attempt {attempt + 1}")
+            continue
+        report["attempts"] += 1
+        report["decode_steps"] += steps
+        
+        if aborted:
+            # Estimated against the mean length of complete outputs
+            saved = max(int(expected_decode_tokens() - steps), 0)
+            report["aborted"] += 1
+            report["tokens_saved"] += saved
+            early_exit_tokens_saved_total.inc(amount=saved)
+            log_event(logger, logging.DEBUG, "Attempt aborted early", attempt=attempt + 1, steps=steps)
+            continue
+        
+        with timed_stage("parsing"):
+            recipe = parse_recipe(text, current_ingredients)
+            reason = validation_failure_reason(recipe["ingredients"], original_ingredients)
+            mark_validated(recipe, reason)
+        if reason is None:
+            break
+    
+    if recipe is None:
+        recipe = fallback_recipe(original_ingredients)
+    early_exit_aborts_total.inc(amount=report["aborted"])
+    recipe["generation"] = {"early_exit": report}
+    return recipe
+
+def generate_recipe_with_t5(ingredients_list, max_retries=5, batched=None, early_exit=None, deadline=None,
+                            reduced_length=False, engine=None):
+    """
+    Generates a recipe using the T5 recipe generation model (or another engine) with validation.
+    
+    Args:
+        ingredients_list (list): List of ingredients
+        max_retries (int): Maximum number of retry attempts
+        batched (bool): Generate all attempts as one batch instead of one after another
+            (defaults to T5_BATCHED_CANDIDATES)
+        early_exit (bool): Abort attempts as soon as their ingredients section is invalid
+            (defaults to T5_EARLY_EXIT; not combined with batched)
+        deadline (Deadline): Checked before every retry, raises DeadlineExceeded once passed
+        reduced_length (bool): Generate with ADMISSION_REDUCED_MAX_LENGTH (under overload)
+        engine (str): Key of engines (defaults to DEFAULT_ENGINE); batched and early exit need "t5"
+        
+    Returns:
+        dict: A dictionary with title, ingredients, and directions
+    """
+    engine = engines[engine or DEFAULT_ENGINE]
+    if batched is None:
+        batched = T5_BATCHED_CANDIDATES
+    if early_exit is None:
+        early_exit = T5_EARLY_EXIT
+    if batched and engine.name == "t5":
+        return generate_recipe_candidates(ingredients_list, max_retries, reduced_length)
+    if early_exit and engine.name == "t5":
+        return generate_recipe_early_exit(ingredients_list, max_retries, deadline, reduced_length)
+
+    original_ingredients = ingredients_list.copy()
+    retries_started = None
+    
+    try:
+        for attempt in range(max_retries):
             if attempt > 0:
-                current_ingredients = original_ingredients.copy()
-                random.shuffle(current_ingredients)
-                print(f"Retry {attempt}: Shuffling ingredients order")
-            else:
-                current_ingredients = ingredients_list
-            
-            # Format ingredients as a comma-separated string
-            ingredients_string = ", ".join(current_ingredients)
-            prefix = "items: "
-            
-            # Generation settings
-            generation_kwargs = {
-                "max_length": 512,
-                "min_length": 64,
-                "do_sample": True,
-                "top_k": 60,
-                "top_p": 0.95
-            }
-            print(f"Attempt {attempt + 1}: {prefix + ingredients_string}")
-            
-            # Tokenize input
-            inputs = t5_tokenizer(
-                prefix + ingredients_string,
-                max_length=256,
-                padding="max_length",
-                truncation=True,
-                return_tensors="jax"
-            )
-            
-            # Generate text
-            output_ids = t5_model.generate(
-                input_ids=inputs.input_ids,
-                attention_mask=inputs.attention_mask,
-                **generation_kwargs
-            )
-            
-            # Decode and post-process
-            generated = output_ids.sequences
-            generated_text = target_postprocessing(
-                t5_tokenizer.batch_decode(generated, skip_special_tokens=False),
-                special_tokens
-            )[0]
-            
-            # Parse sections
-            recipe = {}
-            sections = generated_text.split("\n")
-            for section in sections:
-                section = section.strip()
-                if section.startswith("title:"):
-                    recipe["title"] = section.replace("title:", "").strip().capitalize()
-                elif section.startswith("ingredients:"):
-                    ingredients_text = section.replace("ingredients:", "").strip()
-                    recipe["ingredients"] = [item.strip().capitalize() for item in ingredients_text.split("--") if item.strip()]
-                elif section.startswith("directions:"):
-                    directions_text = section.replace("directions:", "").strip()
-                    recipe["directions"] = [step.strip().capitalize() for step in directions_text.split("--") if step.strip()]
-            
-            # If title is missing, create one
-            if "title" not in recipe:
-                recipe["title"] = f"Recipe with {', '.join(current_ingredients[:3])}"
+                check_deadline(deadline, f"attempt {attempt + 1}")
+            try:
+                # For retries after the first attempt, shuffle the ingredients
+                if attempt > 0:
+                    if retries_started is None:
+                        retries_started = time.perf_counter()
+                    retry_attempts_total.inc()
+                    current_ingredients = original_ingredients.copy()
+                    random.shuffle(current_ingredients)
+                else:
+                    current_ingredients = ingredients_list
                 
-            # Ensure all sections exist
-            if "ingredients" not in recipe:
-                recipe["ingredients"] = current_ingredients
-            if "directions" not in recipe:
-                recipe["directions"] = ["No directions generated"]
-            
-            # Validate the recipe
-            if validate_recipe_ingredients(recipe["ingredients"], original_ingredients):
-                print(f"Success on attempt {attempt + 1}: Recipe has correct number of ingredients")
-                return recipe
-            else:
-                print(f"Attempt {attempt + 1} failed: Expected {len(original_ingredients)} ingredients, got {len(recipe['ingredients'])}")
-                if attempt == max_retries - 1:
-                    print("Max retries reached, returning last generated recipe")
+                log_event(logger, logging.DEBUG, "Generation attempt", attempt=attempt + 1,
+                          ingredients=current_ingredients)
+                
+                # Generate, decode and parse the recipe
+                recipe = engine.generate([current_ingredients], reduced_length)[0]
+                reason = validation_failure_reason(recipe["ingredients"], original_ingredients)
+                mark_validated(recipe, reason)
+                
+                # Validate the recipe
+                if reason is None:
+                    log_event(logger, logging.DEBUG, "Recipe valid", attempt=attempt + 1)
                     return recipe
-                    
+                else:
+                    log_event(logger, logging.DEBUG, "Recipe invalid", attempt=attempt + 1, reason=reason,
+                              expected=len(original_ingredients), got=len(recipe['ingredients']))
+                    if attempt == max_retries - 1:
+                        log_event(logger, logging.INFO, "Max retries reached, returning last generated recipe",
+                                  attempts=max_retries)
+                        return recipe
+                        
+            except Exception as e:
+                record_error(e, f"generation attempt {attempt + 1}")
+                if attempt == max_retries - 1:
+                    return fallback_recipe(original_ingredients)
+        
+        # Fallback (should not be reached)
+        return fallback_recipe(original_ingredients)
+    finally:
+        # Time spent on attempts after the first one
+        if retries_started is not None and METRICS_ENABLED:
+            stage_seconds.labels("retries").observe(time.perf_counter() - retries_started)
+
+def generate_recipe_candidates(ingredients_list, num_candidates=5, reduced_length=False):
+    """
+    Generates several recipe candidates in one batched T5 call and returns the first valid one.
+    
+    The first candidate uses the given ingredient order, all others a shuffled
+    order, just like the retries of the serial mode.
+    
+    Args:
+        ingredients_list (list): List of ingredients
+        num_candidates (int): Number of prompts generated together
+        reduced_length (bool): Generate with ADMISSION_REDUCED_MAX_LENGTH (under overload)
+        
+    Returns:
+        dict: A dictionary with title, ingredients, and directions, plus a
+            "generation" entry with the winning candidate and the number of valid candidates
+    """
+    original_ingredients = ingredients_list.copy()
+    num_candidates = max(num_candidates, 1)
+    
+    candidate_ingredients = [original_ingredients]
+    for _ in range(num_candidates - 1):
+        shuffled = original_ingredients.copy()
+        random.shuffle(shuffled)
+        candidate_ingredients.append(shuffled)
+    
+    try:
+        recipes = engines["t5"].generate(candidate_ingredients, reduced_length)
+    except Exception as e:
+        record_error(e, "batched generation")
+        recipe = fallback_recipe(original_ingredients)
+        recipe["generation"] = {"candidates": num_candidates, "candidate": None, "valid_candidates": 0}
+        return recipe
+    
+    valid = [i for i, recipe in enumerate(recipes)
+             if validation_failure_reason(recipe["ingredients"], original_ingredients) is None]
+    
+    # Without a valid candidate, return the last one like the serial mode does
+    winner = valid[0] if valid else len(recipes) - 1
+    candidate = winner if valid else None
+    log_event(logger, logging.DEBUG, "Batched generation", candidates=num_candidates, valid=len(valid),
+              candidate=candidate)
+    
+    recipe = mark_validated(recipes[winner], None if valid else "no_valid_candidate")
+    recipe["generation"] = {
+        "candidates": num_candidates,
+        "candidate": candidate,
+        "valid_candidates": len(valid)
+    }
+    return recipe
+
+def generate_recipes_with_t5(ingredient_lists, max_retries=5, deadline=None, reduced_length=False, engine=None):
+    """
+    Generates recipes for several ingredient lists with one padded T5 (or other engine) batch per attempt.
+    
+    Every attempt generates the recipes that are still invalid together; the
+    retries shuffle the ingredient order just like generate_recipe_with_t5.
+    A failed attempt is logged and retried, and once the deadline passes the
+    remaining attempts are skipped; recipes generated so far are kept either way.
+    
+    Args:
+        ingredient_lists (list): One list of ingredients per recipe
+        max_retries (int): Maximum number of attempts per recipe
+        deadline (Deadline): Checked before every attempt
+        reduced_length (bool): Generate with ADMISSION_REDUCED_MAX_LENGTH (under overload)
+        engine (str): Key of engines (defaults to DEFAULT_ENGINE)
+        
+    Returns:
+        tuple: (recipes, error) with a dictionary with title, ingredients, and directions per
+            ingredient list (None where no attempt produced one) and the exception of the last
+            failed attempt or DeadlineExceeded (None if the last attempt ran)
+    """
+    engine = engines[engine or DEFAULT_ENGINE]
+    recipes = [None] * len(ingredient_lists)
+    pending = list(range(len(ingredient_lists)))
+    error = None
+    
+    for attempt in range(max(max_retries, 1)):
+        if not pending:
+            break
+        try:
+            check_deadline(deadline, f"attempt {attempt + 1}")
+        except DeadlineExceeded as e:
+            error = e
+            break
+        
+        current = []
+        for i in pending:
+            ingredients = ingredient_lists[i].copy()
+            # For retries after the first attempt, shuffle the ingredients
+            if attempt > 0:
+                random.shuffle(ingredients)
+                retry_attempts_total.inc()
+            current.append(ingredients)
+        
+        try:
+            generated = engine.generate(current, reduced_length)
         except Exception as e:
-            print(f"Error in recipe generation attempt {attempt + 1}: {str(e)}")
-            if attempt == max_retries - 1:
-                return {
-                    "title": f"Recipe with {original_ingredients[0] if original_ingredients else 'ingredients'}",
-                    "ingredients": original_ingredients,
-                    "directions": ["Error generating recipe instructions"]
-                }
-    
-    # Fallback (should not be reached)
+            record_error(e, "batch recipe generation")
+            error = e
+            continue
+        error = None
+        
+        still_pending = []
+        for i, recipe in zip(pending, generated):
+            recipes[i] = recipe
+            if validation_failure_reason(recipe["ingredients"], ingredient_lists[i]) is not None:
+                still_pending.append(i)
+        log_event(logger, logging.DEBUG, "Batch attempt", attempt=attempt + 1,
+                  valid=len(pending) - len(still_pending), recipes=len(pending))
+        pending = still_pending
+    
+    return recipes, error
+
+def measure_bert_embeddings(texts):
+    """Embeds texts and returns the embeddings with latency and memory figures"""
+    start = time.perf_counter()
+    embeddings = get_embeddings(texts).numpy()
+    return embeddings, {
+        "latency_seconds": round(time.perf_counter() - start, 4),
+        "model_mb": round(torch_model_mb(bert_model), 1),
+        "rss_mb": round(resident_memory_mb(), 1)
+    }
+
+def apply_bert_precision():
+    """Quantizes RecipeBERT if configured, comparing it against fp32 when PRECISION_REPORT is set"""
+    global bert_model
+    if BERT_PRECISION != "int8":
+        return
+    if not PRECISION_REPORT or not os.path.exists(INGREDIENT_CATALOG_PATH):
+        bert_model = quantize_linear_int8(bert_model)
+        return
+
+    # Catalog names are what the selection runs on, so measure drift on them
+    sample = [name.lower() for name in load_catalog(INGREDIENT_CATALOG_PATH)[:PRECISION_SAMPLE_SIZE]]
+    reference, fp32 = measure_bert_embeddings(sample)
+    bert_model = quantize_linear_int8(bert_model)
+    gc.collect()
+    reduced, int8 = measure_bert_embeddings(sample)
+    precision_report["bert"] = {
+        "fp32": fp32,
+        "int8": int8,
+        "drift": embedding_drift(reference, reduced),
+        "selection_agreement": selection_agreement(reference, reduced, select_ingredients)
+    }
+    log_event(logger, logging.INFO, "RecipeBERT int8 report", report=precision_report['bert'])
+
+def measure_t5_generation(prompt):
+    """Times one generate call (after compiling) and returns latency and memory figures"""
+    generator = BucketedGenerator(t5_model, t5_tokenizer, generation_kwargs, T5_INPUT_BUCKETS, params=t5_params)
+    generator.generate([prompt])
+    start = time.perf_counter()
+    generator.generate([prompt])
     return {
-        "title": f"Recipe with {original_ingredients[0] if original_ingredients else 'ingredients'}",
-        "ingredients": original_ingredients,
-        "directions": ["Error generating recipe instructions"]
+        "latency_seconds": round(time.perf_counter() - start, 4),
+        "params_mb": round(flax_params_mb(t5_params), 1),
+        "rss_mb": round(resident_memory_mb(), 1)
     }
 
-@app.route('/generate_recipe', methods=['POST'])
-def handle_recipe_request():
+def apply_t5_precision():
+    """Casts the T5 params to bf16 if configured, comparing against fp32 when PRECISION_REPORT is set"""
+    global t5_params
+
+    if T5_PRECISION != "bf16":
+        return
+    if not PRECISION_REPORT:
+        t5_params = cast_params_bf16(t5_model, t5_params)
+        return
+
+    prompt = build_prompt(["tomato", "onion", "garlic", "pasta", "olive oil"])
+    fp32 = measure_t5_generation(prompt)
+    t5_params = cast_params_bf16(t5_model, t5_params)
+    gc.collect()
+    precision_report["t5"] = {"fp32": fp32, "bf16": measure_t5_generation(prompt)}
+    log_event(logger, logging.INFO, "T5 bf16 report", report=precision_report['t5'])
+
+def load_bert_weights(path):
+    """Loads RecipeBERT, memory-mapping the shared weights if they have been exported"""
+    if BERT_WEIGHTS_FILE and os.path.exists(BERT_WEIGHTS_FILE):
+        config = AutoConfig.from_pretrained(path)
+        return load_torch_model_mmap(lambda: AutoModel.from_config(config), BERT_WEIGHTS_FILE)
+    return AutoModel.from_pretrained(path).eval()
+
+def load_t5_weights(path):
     """
-    Processes a recipe generation request with a given list of ingredients.
-    Uses the intelligent ingredient combination feature.
+    Loads the T5 model without random initialization, memory-mapping the shared params if they have been exported.
+
+    Returns:
+        tuple: The model and its params
     """
-    if not request.is_json:
-        return jsonify({"error": "Request must be JSON"}), 415
+    if T5_PARAMS_DIR and has_flax_params(T5_PARAMS_DIR):
+        model = FlaxAutoModelForSeq2SeqLM.from_config(AutoConfig.from_pretrained(path), _do_init=False)
+        return model, load_flax_params_mmap(T5_PARAMS_DIR)
+    return FlaxAutoModelForSeq2SeqLM.from_pretrained(path, _do_init=False)
 
-    data = request.get_json()
+def export_shared_state():
+    """
+    Writes the model weights and the ingredient index to SHARED_WEIGHTS_DIR.
+    Runs once in a separate process before the workers start (see serve.py).
+    """
+    global bert_tokenizer, bert_model, bert_token_cache
+
+    bert_path = snapshot_download(bert_model_name)
+    bert_tokenizer = AutoTokenizer.from_pretrained(bert_path)
+    bert_token_cache = make_bert_token_cache()
+    bert_model = load_bert_weights(bert_path)
+    if not os.path.exists(BERT_WEIGHTS_FILE):
+        save_torch_state(bert_model, BERT_WEIGHTS_FILE)
+    
+    # Build the index with the same precision the workers will use
+    apply_bert_precision()
+    build_ingredient_index()
 
+    if "t5" in GENERATION_ENGINES:
+        t5_path = snapshot_download(MODEL_NAME_OR_PATH)
+        if not has_flax_params(T5_PARAMS_DIR):
+            save_flax_params(FlaxAutoModelForSeq2SeqLM.from_pretrained(t5_path, _do_init=False)[1], T5_PARAMS_DIR)
+    log_event(logger, logging.INFO, "Shared state ready", path=SHARED_WEIGHTS_DIR)
+
+def load_bert_model():
+    """Downloads and loads RecipeBERT, then builds the ingredient index"""
+    global bert_tokenizer, bert_model, bert_batcher, bert_token_cache
+
+    pin_current_thread(PIPELINE_BERT_CPUS)
+    with startup.phase("bert", "download"):
+        path = snapshot_download(bert_model_name)
+    with startup.phase("bert", "deserialize"):
+        bert_tokenizer = AutoTokenizer.from_pretrained(path)
+        bert_token_cache = make_bert_token_cache()
+        bert_model = load_bert_weights(path)
+    with startup.phase("bert", "precision"):
+        apply_bert_precision()
+    with startup.phase("bert", "warmup"):
+        build_ingredient_index()
+
+    if SCHEDULER_ENABLED:
+        bert_batcher = MicroBatcher("bert", encode_ingredient_batch, SCHEDULER_MAX_BERT_ITEMS, SCHEDULER_MAX_WAIT_MS)
+
+def load_t5_model():
+    """Downloads and loads the T5 model, then compiles generate for all input buckets"""
+    global t5_tokenizer, t5_model, t5_params, special_tokens, t5_generator, streaming_decoder, t5_batcher
+    global section_token_id
+    global t5_reduced_generator, t5_reduced_batcher
+
+    pin_current_thread(PIPELINE_T5_CPUS)
+    with startup.phase("t5", "download"):
+        path = snapshot_download(MODEL_NAME_OR_PATH)
+    with startup.phase("t5", "deserialize"):
+        t5_tokenizer = AutoTokenizer.from_pretrained(path, use_fast=True)
+        t5_model, t5_params = load_t5_weights(path)
+        special_tokens = t5_tokenizer.all_special_tokens
+        section_token_id = t5_tokenizer.convert_tokens_to_ids("<section>")
+        if section_token_id == t5_tokenizer.unk_token_id:
+            section_token_id = None
+        if T5_PROMPT_CACHE:
+            setup_prompt_encoder()
+    with startup.phase("t5", "precision"):
+        apply_t5_precision()
+    with startup.phase("t5", "warmup"):
+        t5_generator = BucketedGenerator(t5_model, t5_tokenizer, generation_kwargs, T5_INPUT_BUCKETS, T5_BATCH_BUCKETS,
+                                         timer=timed_stage, params=t5_params)
+        t5_generator.warmup(T5_WARMUP_BATCH_SIZES)
+        streaming_decoder = StreamingDecoder(t5_model, generation_kwargs, params=t5_params)
+        if T5_STREAMING_WARMUP or T5_EARLY_EXIT:
+            streaming_decoder.warmup(T5_INPUT_BUCKETS)
+        if ADMISSION_DEGRADE and ADMISSION_REDUCED_MAX_LENGTH:
+            reduced_kwargs = dict(generation_kwargs, max_length=ADMISSION_REDUCED_MAX_LENGTH)
+            t5_reduced_generator = BucketedGenerator(t5_model, t5_tokenizer, reduced_kwargs, T5_INPUT_BUCKETS,
+                                                     T5_BATCH_BUCKETS, timer=timed_stage, params=t5_params)
+            t5_reduced_generator.warmup(ADMISSION_REDUCED_WARMUP_BATCH_SIZES)
+
+    if SCHEDULER_ENABLED:
+        t5_batcher = MicroBatcher("t5", t5_generator.generate, SCHEDULER_MAX_BATCH_SIZE, SCHEDULER_MAX_WAIT_MS)
+        if t5_reduced_generator is not None:
+            t5_reduced_batcher = MicroBatcher("t5-reduced", t5_reduced_generator.generate,
+                                              SCHEDULER_MAX_BATCH_SIZE, SCHEDULER_MAX_WAIT_MS)
+    engines["t5"] = make_t5_engine()
+
+def make_t5_engine():
+    """Returns the generation engine for the loaded T5 model"""
+    return T5Engine(run_t5, encode_prompt, decode_generated, parse_recipe, t5_tokenizer.pad_token_id,
+                    generation_kwargs, params_mb=lambda: flax_params_mb(t5_params) if t5_params else None,
+                    timer=timed_stage)
+
+def load_recipenlg_model():
+    """Downloads and loads the RecipeNLG generation engine"""
+    pin_current_thread(PIPELINE_T5_CPUS)
+    with startup.phase("recipenlg", "download"):
+        path = snapshot_download(RECIPENLG_MODEL_NAME)
+    with startup.phase("recipenlg", "deserialize"):
+        engine = RecipeNLGEngine(path, RECIPENLG_DEVICE, recipenlg_generation_kwargs,
+                                 reduced_max_new_tokens=ADMISSION_REDUCED_MAX_LENGTH if ADMISSION_DEGRADE else None,
+                                 timer=timed_stage)
+    engines["recipenlg"] = engine
+
+ENGINE_LOADERS = {"t5": load_t5_model, "recipenlg": load_recipenlg_model}
+unknown_engines = [name for name in GENERATION_ENGINES if name not in ENGINE_LOADERS]
+if unknown_engines:
+    raise ValueError(f"Unknown GENERATION_ENGINES {unknown_engines}, expected some of {sorted(ENGINE_LOADERS)}")
+
+def startup_tasks():
+    """Returns the loaders of RecipeBERT and the configured generation engines"""
+    return {"bert": load_bert_model, **{name: ENGINE_LOADERS[name] for name in GENERATION_ENGINES}}
+
+# Category lists the app sends instead of available_ingredients
+INGREDIENT_CATEGORIES = ['vegetables', 'fruits', 'main_ingredients', 'spices', 'others']
+
+def get_request_ingredients(data):
+    """
+    Extracts the ingredient settings from a request payload.
+    
+    Returns:
+        tuple: required ingredients, available ingredients and maximum number of ingredients
+    """
     # Extract required and available ingredients from request
     required_ingredients = data.get('required_ingredients', [])
     available_ingredients = data.get('available_ingredients', [])
@@ -327,37 +1328,310 @@ def handle_recipe_request():
     if data.get('ingredients') and not required_ingredients:
         required_ingredients = data.get('ingredients', [])
     
+    # Available ingredients may also come grouped by category, as a dict or as top-level lists
+    if isinstance(available_ingredients, dict):
+        available_ingredients = [name for names in available_ingredients.values() for name in names]
+    elif not available_ingredients:
+        available_ingredients = [name for category in INGREDIENT_CATEGORIES for name in data.get(category) or []]
+    
     # Maximum number of ingredients (for better recipes)
     max_ingredients = data.get('max_ingredients', 7)
     
-    # Maximum retries for recipe generation
-    max_retries = data.get('max_retries', 5)
+    return required_ingredients, available_ingredients, max_ingredients
+
+def ingredient_request_error(data):
+    """
+    Checks the ingredient fields of a request.
     
-    # If no ingredients specified
+    Returns:
+        str: Why the request is invalid, or None
+    """
+    try:
+        required_ingredients, available_ingredients, max_ingredients = get_request_ingredients(data)
+    except (TypeError, AttributeError):
+        return "Ingredients must be lists of strings"
+    for field, names in (("required_ingredients", required_ingredients),
+                         ("available_ingredients", available_ingredients)):
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            return f"'{field}' must be a list of strings"
+    if isinstance(max_ingredients, bool) or not isinstance(max_ingredients, int) or max_ingredients < 1:
+        return "'max_ingredients' must be a positive integer"
     if not required_ingredients and not available_ingredients:
-        return jsonify({"error": "No ingredients provided"}), 400
+        return "No ingredients provided"
+    return None
+
+def max_retries_error(data):
+    """Returns why the max_retries of a request is invalid, or None"""
+    max_retries = data.get('max_retries', DEFAULT_MAX_RETRIES)
+    if isinstance(max_retries, bool) or not isinstance(max_retries, int) or max_retries < 1:
+        return "'max_retries' must be a positive integer"
+    return None
+
+def recipe_request_error(data):
+    """
+    Checks a /generate_recipe payload before it takes an admission slot.
     
+    Returns:
+        str: Why the request is invalid, or None
+    """
+    if not isinstance(data, dict):
+        return "Request must be an object"
+    error = ingredient_request_error(data) or max_retries_error(data)
+    if error is not None:
+        return error
+    engine = data.get('engine') or DEFAULT_ENGINE
+    if engine not in engines:
+        return f"Unknown or unloaded engine '{engine}', available: {sorted(engines)}"
+    pooling = data.get('pooling') or BERT_POOLING
+    if pooling not in POOLING_STRATEGIES:
+        return f"Unknown pooling '{pooling}', available: {sorted(POOLING_STRATEGIES)}"
+    return None
+
+def request_deadline(data):
+    """Returns the deadline of a request (deadline_seconds in the payload or REQUEST_DEADLINE_SECONDS)"""
+    seconds = data.get('deadline_seconds', REQUEST_DEADLINE_SECONDS) if isinstance(data, dict) else None
     try:
-        # Always find best ingredient combination with RecipeBERT
-        optimized_ingredients = find_best_ingredients(
-            required_ingredients, 
-            available_ingredients, 
-            max_ingredients
-        )
+        seconds = float(seconds)
+    except (TypeError, ValueError):
+        seconds = REQUEST_DEADLINE_SECONDS
+    return Deadline(seconds) if seconds > 0 else None
+
+def acquire_admission(deadline, reject=True):
+    """
+    Waits for an inference slot and counts the outcome.
+    
+    Args:
+        deadline (Deadline): Gives up waiting once passed
+        reject (bool): False waits for a slot even while the admission queue is full
+        
+    Returns:
+        tuple: None once admitted, otherwise the error body and status (429 if the queue is full,
+            504 if the deadline passed while waiting); admitted callers must release the slot
+    """
+    outcome = admission.acquire(deadline, reject)
+    admission_total.inc(outcome)
+    if outcome == "rejected":
+        return {"error": "Server is busy, try again later"}, 429
+    if outcome == "timeout":
+        deadline_exceeded_total.inc("queue")
+        return {"error": "Deadline exceeded while waiting for the server"}, 504
+    return None
+
+def admit_request(deadline):
+    """
+    Waits for an inference slot.
+    
+    Returns:
+        tuple: None once admitted, otherwise the error response; admitted requests must call admission.release()
+    """
+    error = acquire_admission(deadline)
+    if error is None:
+        return None
+    body, status = error
+    headers = {"Retry-After": str(ADMISSION_RETRY_AFTER)} if status == 429 else {}
+    return jsonify(body), status, headers
+
+def degraded_settings(max_retries, pressure):
+    """
+    Lowers the retry budget and output length while requests are queueing.
+    
+    Args:
+        max_retries (int): Retries the client asked for
+        pressure (float): Queue occupancy from AdmissionController.pressure (0 to 1)
         
-        # Generate recipe with optimized ingredients using T5 model with validation
-        recipe = generate_recipe_with_t5(optimized_ingredients, max_retries)
+    Returns:
+        tuple: max_retries to use and whether to generate with ADMISSION_REDUCED_MAX_LENGTH
+    """
+    if not ADMISSION_DEGRADE or pressure <= 0:
+        return max_retries, False
+    retries = max(1, min(max_retries, int(round(max_retries * (1 - pressure)))))
+    reduced_length = t5_reduced_generator is not None and pressure >= ADMISSION_REDUCED_LENGTH_PRESSURE
+    if retries < max_retries or reduced_length:
+        degraded_requests_total.inc()
+    return retries, reduced_length
+
+def recipe_selection_stage(task):
+    """
+    First pipeline stage: finds the best ingredient combination with RecipeBERT and looks up the recipe cache.
+    
+    Returns:
+        dict: The task with 'ingredients' (and 'recipe' wrapped in Completed on a cache hit)
+    """
+    # Embeddings of another pooling strategy are not in the caches and the ANN index
+    embeddings = None
+    if task['pooling'] != BERT_POOLING:
+        names = list(dict.fromkeys(task['required_ingredients'] + task['available_ingredients']))
+        with timed_stage("embedding"):
+            embeddings = dict(zip(names, get_embeddings(names, pooling=task['pooling']).numpy()))
+    
+    task['ingredients'] = find_best_ingredients(
+        task['required_ingredients'],
+        task['available_ingredients'],
+        task['max_ingredients'],
+        embeddings=embeddings,
+        exact=task['exact_selection'] or embeddings is not None
+    )
+    task['cache_key'] = RecipeCache.make_key(task['ingredients'], engines[task['engine']].cache_params())
+    if task['use_cache']:
+        recipe = recipe_cache.get(task['cache_key'])
+        recipe_cache_lookups_total.inc("hit" if recipe is not None else "miss")
+        if recipe is not None:
+            task['recipe'] = recipe
+            return Completed(task)
+    return task
+
+def recipe_generation_stage(task):
+    """
+    Second pipeline stage: generates the recipe for the selected ingredients with the requested engine.
+    
+    Returns:
+        dict: The task with 'recipe'
+    """
+    check_deadline(task['deadline'], "generation")
+    
+    # Generate recipe with optimized ingredients with validation
+    start = time.perf_counter()
+    recipe = generate_recipe_with_t5(task['ingredients'], task['max_retries'], task['batched'], task['early_exit'],
+                                     task['deadline'], task['reduced_length'], task['engine'])
+    
+    # Only model outputs that passed validation are worth serving again (never fallbacks); shortened
+    # ones from overload are not cached, since the key describes the full-length settings
+    if RECIPE_CACHE_ENABLED and not task['reduced_length'] and recipe.get('validated'):
+        cached = {key: recipe[key] for key in ('title', 'ingredients', 'directions')}
+        recipe_cache.put(task['cache_key'], cached, time.perf_counter() - start)
+    task['recipe'] = recipe
+    return task
+
+def process_recipe_request(data, deadline=None, pressure=0.0, slot=None):
+    """
+    Runs the full recipe pipeline for a request payload.
+    
+    Args:
+        data (dict): Parsed JSON payload of a /generate_recipe request, checked by recipe_request_error
+        deadline (Deadline): Checked between stages and retries (504 once passed)
+        pressure (float): Admission queue occupancy, degrades generation when above 0
+        slot (AdmissionSlot): Admission slot of the request, held by its pipeline task until
+            the task has finished (also when the request gave up at its deadline)
+        
+    Returns:
+        tuple: Response body (dict) and HTTP status code
+    """
+    required_ingredients, available_ingredients, max_ingredients = get_request_ingredients(data)
+    
+    # Maximum retries for recipe generation (lowered under load)
+    requested_retries = data.get('max_retries', DEFAULT_MAX_RETRIES)
+    max_retries, reduced_length = degraded_settings(requested_retries, pressure)
+    
+    # Optionally generate all attempts as one batch (defaults to T5_BATCHED_CANDIDATES)
+    batched = data.get('batched_candidates')
+    
+    # Optionally abort attempts as soon as their ingredients section is invalid (defaults to T5_EARLY_EXIT)
+    early_exit = data.get('early_exit')
+    
+    # Skip the recipe cache and always generate a new recipe
+    fresh = data.get('fresh', False)
+    
+    # Score every available ingredient instead of an ANN shortlist for large pantries
+    exact_selection = data.get('exact_selection', False)
+    
+    # Generation engine and embedding pooling (default to DEFAULT_ENGINE and BERT_POOLING)
+    engine = data.get('engine') or DEFAULT_ENGINE
+    pooling = data.get('pooling') or BERT_POOLING
+    
+    task = {
+        'required_ingredients': required_ingredients,
+        'available_ingredients': available_ingredients,
+        'max_ingredients': max_ingredients,
+        'exact_selection': exact_selection,
+        'pooling': pooling,
+        'engine': engine,
+        'use_cache': RECIPE_CACHE_ENABLED and not fresh,
+        'max_retries': max_retries,
+        'batched': batched,
+        'early_exit': early_exit,
+        'deadline': deadline,
+        'reduced_length': reduced_length
+    }
+    
+    try:
+        if recipe_pipeline is not None and not (PROFILING_ENABLED and profiling.get()):
+            if slot is not None:
+                slot.hold()
+            task = recipe_pipeline.run(task, deadline, on_exit=slot.release if slot is not None else None)
+        else:
+            task = recipe_selection_stage(task)
+            if not isinstance(task, Completed):
+                task = recipe_generation_stage(task)
+        task = task.result if isinstance(task, Completed) else task
+        recipe, optimized_ingredients = task['recipe'], task['ingredients']
         
         # Format for Flutter app consumption - structured format
-        return jsonify({
+        response = {
             'title': recipe['title'],
             'ingredients': recipe['ingredients'],
             'directions': recipe['directions'],
             'used_ingredients': optimized_ingredients
-        })
+        }
+        if engine != DEFAULT_ENGINE:
+            response['engine'] = engine
+        if 'generation' in recipe:
+            response['generation'] = recipe['generation']
+        if max_retries < requested_retries or reduced_length:
+            response['degraded'] = {
+                'max_retries': max_retries,
+                'max_length': ADMISSION_REDUCED_MAX_LENGTH if reduced_length else generation_kwargs['max_length']
+            }
+        return response, 200
         
+    except DeadlineExceeded as e:
+        deadline_exceeded_total.inc("pipeline")
+        return {"error": str(e)}, 504
     except Exception as e:
-        return jsonify({"error": f"Error in recipe generation: {str(e)}"}), 500
+        record_error(e, "recipe request")
+        return {"error": f"Error in recipe generation: {str(e)}"}, 500
+
+if PIPELINE_ENABLED:
+    recipe_pipeline = StagePipeline([
+        ("selection", recipe_selection_stage, PIPELINE_BERT_WORKERS, PIPELINE_BERT_CPUS),
+        ("generation", recipe_generation_stage, PIPELINE_T5_WORKERS, PIPELINE_T5_CPUS)
+    ])
+    metrics.register("pipeline_queue_wait_seconds", "Time tasks wait for a pipeline stage worker in seconds",
+                     recipe_pipeline.wait_seconds, label="stage")
+    metrics.register("pipeline_service_seconds", "Time a pipeline stage spends on a task in seconds",
+                     recipe_pipeline.service_seconds, label="stage")
+    metrics.register("pipeline_busy_seconds_total", "Worker time spent running tasks per pipeline stage",
+                     lambda: {stage.name: stage.busy_seconds for stage in recipe_pipeline.stages},
+                     label="stage", kind="counter")
+    metrics.register("pipeline_workers", "Worker threads per pipeline stage",
+                     lambda: {stage.name: stage.workers for stage in recipe_pipeline.stages}, label="stage",
+                     kind="gauge")
+    metrics.register("pipeline_queue_depth", "Tasks waiting per pipeline stage",
+                     lambda: {stage.name: stage.depth() for stage in recipe_pipeline.stages},
+                     label="stage", kind="gauge")
+
+@app.route('/generate_recipe', methods=['POST'])
+def handle_recipe_request():
+    """
+    Processes a recipe generation request with a given list of ingredients.
+    Uses the intelligent ingredient combination feature.
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 415
+
+    data = request.get_json()
+    error = recipe_request_error(data)
+    if error is not None:
+        return jsonify({"error": error}), 400
+    deadline = request_deadline(data)
+    rejection = admit_request(deadline)
+    if rejection is not None:
+        return rejection
+    slot = AdmissionSlot(admission)
+    try:
+        body, status = process_recipe_request(data, deadline, admission.pressure(), slot)
+    finally:
+        slot.release()
+    return jsonify(body), status
 
 @app.route('/generate_recipe_smart', methods=['POST'])
 def handle_smart_recipe_request():
@@ -368,5 +1642,491 @@ def handle_smart_recipe_request():
     # Delegate to handle_recipe_request
     return handle_recipe_request()
 
+@app.route('/generate_recipes', methods=['POST'])
+def handle_recipes_request():
+    """
+    Generates recipes for several ingredient sets in one request (e.g. a week of meals).
+    
+    The payload is {"requests": [...], "diversity": 0.3, "max_retries": 5} where each
+    request has the same format as for /generate_recipe; a bare list of requests is
+    accepted as well. Ingredient selection runs for all items with one embedding
+    lookup, and the engine ("engine", defaults to DEFAULT_ENGINE) generates all recipes
+    together in padded batches. With diversity > 0,
+    items prefer ingredients unlike those already chosen for earlier items.
+    Results are returned in request order; invalid items and items that got no
+    recipe before an error or the deadline get an error entry.
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 415
+    
+    data = request.get_json()
+    if isinstance(data, list):
+        data = {"requests": data}
+    items = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "No requests provided"}), 400
+    if len(items) > GENERATE_RECIPES_MAX_ITEMS:
+        return jsonify({"error": f"At most {GENERATE_RECIPES_MAX_ITEMS} requests per batch"}), 400
+    
+    try:
+        diversity = float(data.get('diversity', 0.0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'diversity' must be a number"}), 400
+    error = max_retries_error(data)
+    if error is not None:
+        return jsonify({"error": error}), 400
+    requested_retries = data.get('max_retries', DEFAULT_MAX_RETRIES)
+    exact_selection = data.get('exact_selection', False)
+    engine = data.get('engine') or DEFAULT_ENGINE
+    if engine not in engines:
+        return jsonify({"error": f"Unknown or unloaded engine '{engine}', available: {sorted(engines)}"}), 400
+    
+    results = [None] * len(items)
+    valid = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[i] = {"error": "Request must be an object", "status": 400}
+            continue
+        error = ingredient_request_error(item)
+        if error is not None:
+            results[i] = {"error": error, "status": 400}
+            continue
+        valid.append((i, get_request_ingredients(item)))
+    
+    deadline = request_deadline(data)
+    rejection = admit_request(deadline)
+    if rejection is not None:
+        return rejection
+    try:
+        max_retries, reduced_length = degraded_settings(requested_retries, admission.pressure())
+        try:
+            optimized = find_best_ingredients_batch([settings for _, settings in valid], diversity,
+                                                    exact=exact_selection)
+        except Exception as e:
+            record_error(e, "batch ingredient selection")
+            return jsonify({"error": f"Error in ingredient selection: {str(e)}"}), 500
+        
+        recipes, error = generate_recipes_with_t5(optimized, max_retries, deadline, reduced_length, engine)
+    finally:
+        admission.release()
+    
+    if isinstance(error, DeadlineExceeded) and None in recipes:
+        deadline_exceeded_total.inc("pipeline")
+    for (i, _), ingredients, recipe in zip(valid, optimized, recipes):
+        if recipe is None:
+            if isinstance(error, DeadlineExceeded):
+                results[i] = {"error": str(error), "status": 504, "used_ingredients": ingredients}
+            else:
+                results[i] = {"error": f"Error in recipe generation: {error}", "status": 500,
+                              "used_ingredients": ingredients}
+            continue
+        results[i] = {
+            'title': recipe['title'],
+            'ingredients': recipe['ingredients'],
+            'directions': recipe['directions'],
+            'used_ingredients': ingredients
+        }
+    
+    return jsonify({"results": results})
+
+# Timings of the streaming endpoint
+stream_first_event_seconds = Histogram([0.1, 0.25, 0.5, 1, 2, 5, 10, 30])
+stream_total_seconds = Histogram([0.5, 1, 2, 5, 10, 30, 60, 120])
+metrics.register("stream_first_event_seconds", "Time to the first streamed recipe part in seconds",
+                 stream_first_event_seconds)
+metrics.register("stream_total_seconds", "Duration of streamed generations in seconds", stream_total_seconds)
+
+def sse_event(event, data):
+    """Formats a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_recipe(required_ingredients, available_ingredients, max_ingredients, deadline=None):
+    """
+    Generates a recipe and yields SSE events as soon as each part is complete.
+    
+    Events are "selected" (the optimized ingredients), "title", "ingredient" and
+    "direction" for each completed part, and "done" with the full structured
+    result and timings. Streamed output cannot be taken back, so there is no
+    validation and retry as in generate_recipe_with_t5. Once the deadline has
+    passed, generation stops with an "error" event.
+    """
+    start = time.perf_counter()
+    first_event = None
+    try:
+        optimized_ingredients = find_best_ingredients(required_ingredients, available_ingredients, max_ingredients)
+        yield sse_event("selected", {"used_ingredients": optimized_ingredients})
+        check_deadline(deadline, "generation")
+        
+        input_ids, attention_mask = t5_generator.encode([encode_prompt(optimized_ingredients)])
+        parser = RecipeSectionParser()
+        token_ids = []
+        generated_text = ""
+        for token_id in streaming_decoder.stream(input_ids, attention_mask):
+            check_deadline(deadline, "next token")
+            token_ids.append(token_id)
+            generated_text = target_postprocessing(
+                t5_tokenizer.decode(token_ids, skip_special_tokens=False),
+                special_tokens
+            )[0]
+            for kind, index, value in parser.feed(generated_text):
+                if first_event is None:
+                    first_event = time.perf_counter() - start
+                    stream_first_event_seconds.observe(first_event)
+                yield sse_event(kind, {"index": index, kind: value})
+        
+        for kind, index, value in parser.feed(generated_text, final=True):
+            yield sse_event(kind, {"index": index, kind: value})
+        
+        recipe = parse_recipe(generated_text, optimized_ingredients)
+        total = time.perf_counter() - start
+        stream_total_seconds.observe(total)
+        yield sse_event("done", {
+            'title': recipe['title'],
+            'ingredients': recipe['ingredients'],
+            'directions': recipe['directions'],
+            'used_ingredients': optimized_ingredients,
+            'timing': {'time_to_first_event': first_event, 'total': total}
+        })
+    except DeadlineExceeded as e:
+        deadline_exceeded_total.inc("stream")
+        yield sse_event("error", {"error": str(e)})
+    except Exception as e:
+        record_error(e, "recipe stream")
+        yield sse_event("error", {"error": f"Error in recipe generation: {str(e)}"})
+
+def release_after(events):
+    """Yields the events and frees the admission slot once the stream ends or is closed"""
+    try:
+        yield from events
+    finally:
+        admission.release()
+
+@app.route('/generate_recipe/stream', methods=['POST'])
+def handle_recipe_stream_request():
+    """
+    Streams a recipe as Server-Sent Events while it is being generated.
+    The payload has the same format as for /generate_recipe.
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 415
+
+    data = request.get_json()
+    error = ingredient_request_error(data) if isinstance(data, dict) else "Request must be an object"
+    if error is not None:
+        return jsonify({"error": error}), 400
+    required_ingredients, available_ingredients, max_ingredients = get_request_ingredients(data)
+    if streaming_decoder is None or (data.get('engine') or "t5") != "t5":
+        return jsonify({"error": "Streaming needs the t5 engine"}), 400
+
+    deadline = request_deadline(data)
+    rejection = admit_request(deadline)
+    if rejection is not None:
+        return rejection
+    return Response(
+        release_after(stream_recipe(required_ingredients, available_ingredients, max_ingredients, deadline)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Asynchronous jobs: size the worker pool to the available cores
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", 64))
+JOB_RESULT_TTL = int(os.environ.get("JOB_RESULT_TTL", 600))
+
+def process_job(data):
+    """
+    Runs a queued job like a /generate_recipe request, with a deadline from its start.
+    
+    Accepted jobs are never rejected: the worker waits for an inference slot until
+    the deadline (the JOB_WORKERS workers bound how many wait at once).
+    """
+    error = recipe_request_error(data)
+    if error is not None:
+        return {"error": error}, 400
+    deadline = request_deadline(data)
+    error = acquire_admission(deadline, reject=False)
+    if error is not None:
+        return error
+    slot = AdmissionSlot(admission)
+    try:
+        return process_recipe_request(data, deadline, admission.pressure(), slot)
+    finally:
+        slot.release()
+
+job_queue = JobQueue(process_job, JOB_WORKERS, JOB_QUEUE_SIZE, JOB_RESULT_TTL)
+
+@app.route('/jobs', methods=['POST'])
+def handle_job_submission():
+    """
+    Queues a recipe generation request and returns its job id immediately.
+    The payload has the same format as for /generate_recipe.
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 415
+
+    job_id = job_queue.submit(request.get_json())
+    if job_id is None:
+        return jsonify({"error": "Job queue is full"}), 429, {"Retry-After": "5"}
+
+    return jsonify({"job_id": job_id, "status": "queued"}), 202, {"Location": f"/jobs/{job_id}"}
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def handle_job_status(job_id):
+    """
+    Returns the status of a job and, once finished, its result.
+    The result has the same format as the /generate_recipe response.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+
+    response = {"job_id": job_id, "status": job["status"]}
+    if "result" in job:
+        response["result"] = job["result"]
+        response["status_code"] = job["status_code"]
+    return jsonify(response)
+
+@app.route('/stats', methods=['GET'])
+def handle_stats_request():
+    """
+    Returns runtime statistics of the server.
+    """
+    return jsonify({
+        'embedding_cache': embedding_cache.stats(),
+        'ingredient_index': {'size': len(ingredient_index)},
+        'token_cache': {
+            'bert': bert_token_cache.stats() if bert_token_cache else None,
+            't5_prompts': prompt_encoder.stats() if prompt_encoder else None
+        },
+        'compat_matrix': compat_matrix.stats() if COMPAT_ENABLED else None,
+        'ann_index': dict(ann_index.stats(), enabled=ANN_ENABLED, min_candidates=ANN_MIN_CANDIDATES,
+                          shortlist_size=ANN_SHORTLIST_SIZE) if ANN_ENABLED else None,
+        't5_generator': t5_generator.stats() if t5_generator else None,
+        'streaming_decoder': streaming_decoder.stats() if streaming_decoder else None,
+        'engines': {
+            'default': DEFAULT_ENGINE,
+            'loaded': {name: engine.stats() for name, engine in list(engines.items())},
+            'pooling': BERT_POOLING
+        },
+        'scheduler': {
+            'bert': bert_batcher.stats(),
+            't5': t5_batcher.stats() if t5_batcher else None
+        } if SCHEDULER_ENABLED and startup.ready.is_set() else None,
+        'jobs': job_queue.stats(),
+        'pipeline': dict(recipe_pipeline.stats(), torch_threads=torch.get_num_threads()) if recipe_pipeline else None,
+        'admission': dict(admission.stats(), pressure=round(admission.pressure(), 3),
+                          deadline_seconds=REQUEST_DEADLINE_SECONDS, degrade=ADMISSION_DEGRADE,
+                          reduced_max_length=ADMISSION_REDUCED_MAX_LENGTH if t5_reduced_generator else None),
+        'recipe_cache': recipe_cache.stats() if RECIPE_CACHE_ENABLED else None,
+        'profiling': request_profiler.stats() if PROFILING_ENABLED else None,
+        'memory': dict(process_memory_mb() or {}, pid=os.getpid()),
+        'precision': {
+            'bert': BERT_PRECISION,
+            't5': T5_PRECISION,
+            'report': precision_report or None
+        },
+        'streaming': {
+            'time_to_first_event_seconds': stream_first_event_seconds.snapshot(),
+            'total_seconds': stream_total_seconds.snapshot()
+        },
+        'early_exit': {
+            'enabled': T5_EARLY_EXIT,
+            'aborted_attempts': early_exit_aborts_total.snapshot().get(None, 0),
+            'tokens_saved': early_exit_tokens_saved_total.snapshot().get(None, 0),
+            'decode_tokens': decode_tokens.snapshot()
+        }
+    })
+
+metrics.register("embedding_cache_lookups_total", "Embedding cache lookups",
+                 lambda: {"hit": embedding_cache.hits, "miss": embedding_cache.misses}, label="result", kind="counter")
+def token_caches():
+    """Returns the active token caches by tokenizer"""
+    caches = {"bert": bert_token_cache, "t5": prompt_encoder.cache if prompt_encoder else None}
+    return {name: cache for name, cache in caches.items() if cache is not None}
+
+metrics.register("token_cache_hits_total", "Token cache hits per tokenizer",
+                 lambda: {name: cache.hits for name, cache in token_caches().items()}, label="cache", kind="counter")
+metrics.register("token_cache_misses_total", "Token cache misses per tokenizer",
+                 lambda: {name: cache.misses for name, cache in token_caches().items()}, label="cache", kind="counter")
+metrics.register("engine_generated_tokens_total", "Tokens generated per engine",
+                 lambda: {name: engine.tokens for name, engine in list(engines.items())}, label="engine",
+                 kind="counter")
+metrics.register("engine_generation_seconds_total", "Time spent in generate per engine",
+                 lambda: {name: engine.seconds for name, engine in list(engines.items())}, label="engine",
+                 kind="counter")
+metrics.register("compat_matrix_rows", "Ingredients covered by the compatibility matrix", lambda: len(compat_matrix),
+                 kind="gauge")
+metrics.register("compat_neighbor_lookups_total", "Neighbor list lookups per required set",
+                 lambda: {"hit": compat_matrix.neighbor_hits, "miss": compat_matrix.neighbor_misses},
+                 label="result", kind="counter")
+metrics.register("ingredient_index_size", "Ingredients in the embedding index", lambda: len(ingredient_index),
+                 kind="gauge")
+metrics.register("job_queue_depth", "Queued asynchronous jobs", lambda: job_queue.stats().get("queued"), kind="gauge")
+metrics.register("admission_running", "Inference requests holding a slot", lambda: admission.running, kind="gauge")
+metrics.register("admission_waiting", "Inference requests waiting for a slot", lambda: admission.waiting, kind="gauge")
+if PROFILING_ENABLED:
+    metrics.register("profiles_captured_total", "Requests profiled", lambda: request_profiler.captured,
+                     kind="counter")
+metrics.register("ready", "1 once all models are loaded and warmed up", lambda: int(startup.ready.is_set()),
+                 kind="gauge")
+
+@app.route('/metrics', methods=['GET'])
+def handle_metrics_request():
+    """
+    Returns the metrics in the Prometheus text exposition format.
+    """
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.before_request
+def start_request_tracking():
+    """Assigns the request id (X-Request-ID if sent) and counts the request as in flight"""
+    request_id.set(request.headers.get("X-Request-ID") or uuid.uuid4().hex)
+    g.request_start = time.perf_counter()
+    g.endpoint = request.endpoint or "unmatched"
+    requests_in_flight.inc(g.endpoint)
+
+@app.after_request
+def finish_request_tracking(response):
+    """Records latency and status, returns the request id and logs the request"""
+    # For streamed responses this runs once the headers are sent
+    if "request_start" in g:
+        duration = time.perf_counter() - g.request_start
+        requests_in_flight.dec(g.endpoint)
+        request_seconds.labels(g.endpoint).observe(duration)
+        responses_total.inc(str(response.status_code))
+        log_event(logger, logging.INFO, "Request", method=request.method, path=request.path,
+                  status=response.status_code, duration_ms=round(duration * 1000, 2))
+    response.headers["X-Request-ID"] = request_id.get()
+    return response
+
+@app.route('/healthz', methods=['GET'])
+def handle_liveness_request():
+    """
+    Liveness probe: the process is up and no model failed to load.
+    """
+    if startup.errors:
+        return jsonify({"status": "error", "errors": startup.errors}), 500
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz', methods=['GET'])
+def handle_readiness_request():
+    """
+    Readiness probe: all models are loaded and warmed up.
+    Includes per-phase startup timings.
+    """
+    status = startup.status()
+    if not status["ready"]:
+        return jsonify(status), 503, {"Retry-After": str(STARTUP_RETRY_AFTER)}
+    return jsonify(status)
+
+# Endpoints that work before the models are loaded
+STARTUP_EXEMPT_ENDPOINTS = {
+    'handle_liveness_request', 'handle_readiness_request', 'handle_stats_request', 'handle_job_status',
+    'handle_metrics_request', 'handle_profile_arm_request', 'handle_profiles_request', 'handle_profile_file_request'
+}
+
+@app.before_request
+def reject_until_ready():
+    """Answers 503 with Retry-After to inference requests that arrive before startup is complete"""
+    if startup.ready.is_set() or request.method == 'OPTIONS' or request.endpoint in STARTUP_EXEMPT_ENDPOINTS:
+        return None
+    return jsonify({"error": "Models are still loading"}), 503, {"Retry-After": str(STARTUP_RETRY_AFTER)}
+
+# Endpoints that can be profiled (streams are not, their body is produced after the request returns)
+PROFILED_ENDPOINTS = {'handle_recipe_request', 'handle_smart_recipe_request', 'handle_recipes_request'}
+
+def is_admin_request():
+    """True if no ADMIN_TOKEN is configured or the request sends it in X-Admin-Token"""
+    if not ADMIN_TOKEN:
+        return True
+    return hmac.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN)
+
+def start_profiling():
+    """Starts a profile for requests that send X-Profile: 1 or while requests are armed"""
+    if request.endpoint not in PROFILED_ENDPOINTS:
+        return None
+    requested = request.headers.get("X-Profile") == "1" and is_admin_request()
+    try:
+        g.profile = request_profiler.start(requested, request.get_json(silent=True), request_id.get())
+    except Exception as e:
+        record_error(e, "profiling")
+    return None
+
+def finish_profiling(response):
+    """Stores the profile of the request and returns its id in X-Profile-Id"""
+    session = g.pop("profile", None)
+    if session is not None:
+        try:
+            request_profiler.finish(session, response.status_code)
+            response.headers["X-Profile-Id"] = session.profile_id
+            log_event(logger, logging.INFO, "Request profiled", profile_id=session.profile_id)
+        except Exception as e:
+            record_error(e, "profiling")
+    return response
+
+def abort_profiling(error):
+    """Stops the profile of a request that failed before its response was built"""
+    session = g.pop("profile", None)
+    if session is not None:
+        request_profiler.finish(session, 500)
+
+if PROFILING_ENABLED:
+    # Registered after the tracking hooks, so requests rejected before startup are never profiled
+    app.before_request(start_profiling)
+    app.after_request(finish_profiling)
+    app.teardown_request(abort_profiling)
+
+@app.route('/admin/profile', methods=['POST'])
+def handle_profile_arm_request():
+    """
+    Profiles the next N inference requests.
+
+    The payload is {"requests": N}; 0 disarms.
+    """
+    if not PROFILING_ENABLED:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    if not is_admin_request():
+        return jsonify({"error": "Invalid admin token"}), 403
+    data = request.get_json(silent=True) or {}
+    try:
+        count = int(data.get('requests', 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'requests' must be an integer"}), 400
+    return jsonify({"armed": request_profiler.arm(count)})
+
+@app.route('/admin/profiles', methods=['GET'])
+def handle_profiles_request():
+    """
+    Lists the stored profiles, newest first, with their metadata and file names.
+    """
+    if not PROFILING_ENABLED:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    if not is_admin_request():
+        return jsonify({"error": "Invalid admin token"}), 403
+    profiles = [request_profiler.meta(profile_id) for profile_id in request_profiler.list_ids()]
+    return jsonify({"profiles": [meta for meta in profiles if meta is not None]})
+
+@app.route('/admin/profiles/<profile_id>/<name>', methods=['GET'])
+def handle_profile_file_request(profile_id, name):
+    """
+    Downloads a file of a stored profile.
+
+    stacks.txt holds collapsed stacks for flamegraph.pl or speedscope, profile.pstats the
+    cProfile data (pstats, snakeviz), torch_trace.json a Chrome trace and jax_trace.zip a
+    TensorBoard profile; payload.json and meta.json describe the request.
+    """
+    if not PROFILING_ENABLED:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    if not is_admin_request():
+        return jsonify({"error": "Invalid admin token"}), 403
+    path = request_profiler.path(profile_id, name)
+    if path is None:
+        return jsonify({"error": "Profile file not found"}), 404
+    return send_file(path, as_attachment=True, download_name=f"{profile_id}-{name}")
+
+# serve.py defers loading while it prepares the shared state in a separate process
+if os.environ.get("DEFER_MODEL_LOADING", "0") != "1":
+    startup.start(startup_tasks())
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8000, debug=True)
\ No newline at end of file
@@ -0,0 +1,552 @@
+"""
+Offline benchmark and load test for the recipe server.
+
+Replaces RecipeBERT and T5 with deterministic stand-ins that have the same
+interfaces as bert_tokenizer/bert_model and t5_tokenizer/t5_generator and a
+configurable compute cost, so runs need no downloads and are reproducible.
+With --models auto (or real), cached Hugging Face weights are used instead
+when they are present.
+
+Measures find_best_ingredients for pantry sizes from 10 to 2000 ingredients,
+the recall of the ANN shortlist against exact selection for large pantries,
+the tokens/s, latency and memory of every loaded generation engine on the
+same prompts, and the end-to-end HTTP throughput and p50/p95/p99 latency of
+/generate_recipe at several concurrency levels. Results are written as JSON
+so runs can be compared across commits. Only T5 has a stand-in; the other
+engines (GENERATION_ENGINES=t5,recipenlg) are measured with --models real.
+
+Usage:
+    python benchmark.py --output bench.json
+    python benchmark.py --pantry-sizes 10,100,2000 --concurrency 1,8,32 --requests 200
+    GENERATION_ENGINES=t5,recipenlg python benchmark.py --models real --skip-http
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+SPECIAL_TOKENS = ["<pad>", "</s>", "<unk>"]
+
+
+class StubBertTokenizer:
+    """Deterministic word-level tokenizer with the calls used on bert_tokenizer"""
+
+    do_lower_case = True
+    vocab_size = 30522
+
+    def _ids(self, text, max_length):
+        ids = [101] + [zlib.crc32(word.encode()) % (self.vocab_size - 1000) + 1000 for word in text.split()] + [102]
+        return ids[:max_length] if max_length else ids
+
+    def __call__(self, texts, truncation=True, max_length=None, padding=False, return_tensors=None):
+        single = isinstance(texts, str)
+        encoded = {"input_ids": [self._ids(text, max_length) for text in ([texts] if single else texts)]}
+        encoded["attention_mask"] = [[1] * len(ids) for ids in encoded["input_ids"]]
+        if padding or return_tensors:
+            return self.pad([{key: encoded[key][i] for key in encoded} for i in range(len(encoded["input_ids"]))],
+                            padding=True, return_tensors=return_tensors)
+        return encoded
+
+    def pad(self, features, padding=True, return_tensors=None):
+        import torch
+        length = max(len(feature["input_ids"]) for feature in features)
+        input_ids = [feature["input_ids"] + [0] * (length - len(feature["input_ids"])) for feature in features]
+        attention_mask = [[1] * len(feature["input_ids"]) + [0] * (length - len(feature["input_ids"]))
+                          for feature in features]
+        return {"input_ids": torch.tensor(input_ids), "attention_mask": torch.tensor(attention_mask)}
+
+
+def build_stub_bert_model(hidden_size=768, layers=2, seed=0):
+    """
+    Returns a torch module that behaves like RecipeBERT for the server:
+    token embeddings followed by `layers` dense layers (the compute cost).
+    """
+    import torch
+
+    class StubBertModel(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.config = SimpleNamespace(hidden_size=hidden_size)
+            generator = torch.Generator().manual_seed(seed)
+            self.embeddings = torch.nn.Parameter(torch.randn(StubBertTokenizer.vocab_size, hidden_size,
+                                                             generator=generator))
+            self.layers = torch.nn.ModuleList(torch.nn.Linear(hidden_size, hidden_size) for _ in range(layers))
+            for layer in self.layers:
+                torch.nn.init.normal_(layer.weight, std=hidden_size ** -0.5, generator=generator)
+                torch.nn.init.zeros_(layer.bias)
+
+        def forward(self, input_ids, attention_mask=None, **kwargs):
+            hidden = self.embeddings[input_ids]
+            for layer in self.layers:
+                hidden = hidden + torch.tanh(layer(hidden))
+            return SimpleNamespace(last_hidden_state=hidden)
+
+    return StubBertModel().eval()
+
+
+class StubT5Tokenizer:
+    """Word-level tokenizer whose ids decode back to the words StubGenerator emits"""
+
+    all_special_tokens = SPECIAL_TOKENS
+    pad_token_id = 0
+
+    def __init__(self):
+        self._ids = {token: i for i, token in enumerate(SPECIAL_TOKENS)}
+        self._words = list(SPECIAL_TOKENS)
+        self._lock = threading.Lock()
+
+    def encode_words(self, words):
+        with self._lock:
+            for word in words:
+                if word not in self._ids:
+                    self._ids[word] = len(self._words)
+                    self._words.append(word)
+            return [self._ids[word] for word in words]
+
+    def __call__(self, texts, truncation=True, max_length=None):
+        input_ids = [self.encode_words(text.split())[:max_length] for text in texts]
+        return {"input_ids": input_ids, "attention_mask": [[1] * len(ids) for ids in input_ids]}
+
+    def decode(self, ids, skip_special_tokens=False):
+        words = [self._words[i] for i in ids]
+        if skip_special_tokens:
+            words = [word for word in words if word not in SPECIAL_TOKENS]
+        return " ".join(words)
+
+    def batch_decode(self, sequences, skip_special_tokens=False):
+        return [self.decode(ids, skip_special_tokens) for ids in sequences]
+
+
+class StubGenerator:
+    """
+    Stand-in for BucketedGenerator that writes a well-formed recipe for each prompt.
+
+    Each call sleeps batch_ms plus prompt_ms per prompt (like a device call, it
+    releases the GIL). A prompt yields the wrong number of ingredients with
+    probability invalid_rate, decided by a hash of the prompt, so retries with
+    a shuffled order behave like they do with the real model.
+    """
+
+    def __init__(self, tokenizer, batch_ms=50.0, prompt_ms=10.0, invalid_rate=0.2):
+        self.tokenizer = tokenizer
+        self.batch_ms = batch_ms
+        self.prompt_ms = prompt_ms
+        self.invalid_rate = invalid_rate
+        self.calls = 0
+
+    def recipe_text(self, prompt):
+        ingredients = [name.strip() for name in prompt.replace("items:", "", 1).split(",") if name.strip()]
+        if zlib.crc32(prompt.encode()) % 1000 < self.invalid_rate * 1000:
+            ingredients = ingredients[:-1]
+        listed = " <sep> ".join(f"1 cup {name}" for name in ingredients)
+        steps = " <sep> ".join(f"add the {name} and stir." for name in ingredients)
+        return f"title: stub {ingredients[0] if ingredients else 'dish'} <section> ingredients: {listed} " \
+               f"<section> directions: {steps} <sep> serve. </s>"
+
+    def encode(self, prompts):
+        encoded = self.tokenizer(prompts)
+        length = max(len(ids) for ids in encoded["input_ids"])
+        input_ids = np.zeros((len(prompts), length), dtype=np.int32)
+        for i, ids in enumerate(encoded["input_ids"]):
+            input_ids[i, :len(ids)] = ids
+        return input_ids, (input_ids != 0).astype(np.int32)
+
+    def generate(self, prompts, prng_key=None):
+        self.calls += 1
+        time.sleep((self.batch_ms + self.prompt_ms * len(prompts)) / 1000.0)
+        sequences = [self.tokenizer.encode_words(self.recipe_text(prompt).split()) for prompt in prompts]
+        output = np.zeros((len(sequences), max(len(ids) for ids in sequences)), dtype=np.int32)
+        for i, ids in enumerate(sequences):
+            output[i, :len(ids)] = ids
+        return output
+
+    def warmup(self, batch_sizes=None):
+        pass
+
+    def stats(self):
+        return {"stub": True, "calls": self.calls, "batch_ms": self.batch_ms, "prompt_ms": self.prompt_ms}
+
+
+def install_stub_models(server, args):
+    """Sets the model globals of backendServer to the stand-ins and marks the server ready"""
+    from inferenceScheduler import MicroBatcher
+
+    server.bert_tokenizer = StubBertTokenizer()
+    server.bert_token_cache = server.make_bert_token_cache()
+    server.bert_model = build_stub_bert_model(layers=args.bert_layers, seed=args.seed)
+    server.build_ingredient_index()
+
+    server.t5_tokenizer = StubT5Tokenizer()
+    server.special_tokens = server.t5_tokenizer.all_special_tokens
+    server.t5_generator = StubGenerator(server.t5_tokenizer, args.t5_batch_ms, args.t5_prompt_ms, args.invalid_rate)
+    server.engines = {"t5": server.make_t5_engine()}
+    server.DEFAULT_ENGINE = "t5"
+
+    if server.SCHEDULER_ENABLED:
+        server.bert_batcher = MicroBatcher("bert", server.encode_ingredient_batch, server.SCHEDULER_MAX_BERT_ITEMS,
+                                           server.SCHEDULER_MAX_WAIT_MS)
+        server.t5_batcher = MicroBatcher("t5", server.t5_generator.generate, server.SCHEDULER_MAX_BATCH_SIZE,
+                                         server.SCHEDULER_MAX_WAIT_MS)
+    server.startup.started = time.time()
+    server.startup.finished.set()
+    server.startup.ready.set()
+
+
+def load_real_models(server):
+    """Loads the real models from the local Hugging Face cache, returns False if they are not cached"""
+    from huggingface_hub import snapshot_download
+    model_names = {"t5": server.MODEL_NAME_OR_PATH, "recipenlg": server.RECIPENLG_MODEL_NAME}
+    try:
+        snapshot_download(server.bert_model_name, local_files_only=True)
+        for engine in server.GENERATION_ENGINES:
+            snapshot_download(model_names[engine], local_files_only=True)
+    except Exception:
+        return False
+    server.startup.start(server.startup_tasks())
+    server.startup.finished.wait()
+    if server.startup.errors:
+        raise SystemExit(f"Loading the cached models failed: {server.startup.errors}")
+    return True
+
+
+def pantry(names, size, rng):
+    """Returns size distinct ingredient names, padding the catalog with synthetic names"""
+    if size <= len(names):
+        return rng.sample(names, size)
+    return list(names) + [f"ingredient {i}" for i in range(size - len(names))]
+
+
+def latency_summary(seconds):
+    """Returns count, mean and p50/p95/p99 in milliseconds"""
+    values = np.asarray(seconds) * 1000
+    if not len(values):
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": len(values),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def bench_selection(server, names, args):
+    """Times find_best_ingredients per pantry size (first call embeds, later calls hit the caches)"""
+    results = []
+    for size in args.pantry_sizes:
+        rng = random.Random(args.seed + size)
+        available = pantry(names, size, rng)
+        required = available[:2]
+
+        start = time.perf_counter()
+        server.find_best_ingredients(required, available, args.max_ingredients)
+        first = time.perf_counter() - start
+
+        seconds = []
+        for _ in range(args.selection_repeats):
+            start = time.perf_counter()
+            server.find_best_ingredients(required, available, args.max_ingredients)
+            seconds.append(time.perf_counter() - start)
+        results.append({"pantry_size": size, "first_call_ms": round(first * 1000, 3), **latency_summary(seconds)})
+        print(f"selection pantry={size}: {results[-1]}", file=sys.stderr)
+    return results
+
+
+def timed_selection(server, required, available, args, compat, exact=False):
+    """Runs find_best_ingredients with the compatibility matrix on or off and returns the selection and seconds"""
+    enabled = server.COMPAT_ENABLED
+    server.COMPAT_ENABLED = compat
+    try:
+        start = time.perf_counter()
+        selected = server.find_best_ingredients(required, available, args.max_ingredients, exact=exact)
+        return selected, time.perf_counter() - start
+    finally:
+        server.COMPAT_ENABLED = enabled
+
+
+def shortlist_recall(recalls):
+    """Mean recall and share of identical selections"""
+    if not recalls:
+        return None, None
+    return round(float(np.mean(recalls)), 4), round(float(np.mean([r == 1.0 for r in recalls])), 4)
+
+
+def bench_ann(server, names, args):
+    """
+    Compares the IVF shortlist and the compatibility matrix shortlist with exact selection per pantry size.
+
+    Recall is the share of the ingredients added by the exact selection that
+    the shortlisted selection adds as well. The IVF numbers are measured with
+    the compatibility matrix turned off, since covered names bypass the IVF index.
+    """
+    results = []
+    for size in args.pantry_sizes:
+        if size <= server.ANN_MIN_CANDIDATES:
+            continue
+        rng = random.Random(args.seed + size)
+        available = pantry(names, size, rng)
+        server.find_best_ingredients(available[:2], available, args.max_ingredients, exact=True)
+
+        recalls, compat_recalls, exact_seconds, ann_seconds, compat_seconds = [], [], [], [], []
+        for _ in range(args.ann_trials):
+            required = rng.sample(available, 2)
+            exact, seconds = timed_selection(server, required, available, args, False, exact=True)
+            exact_seconds.append(seconds)
+            approximate, seconds = timed_selection(server, required, available, args, False)
+            ann_seconds.append(seconds)
+            added = set(exact) - set(required)
+            if added:
+                recalls.append(len(added & set(approximate)) / len(added))
+
+            if server.COMPAT_ENABLED:
+                approximate, seconds = timed_selection(server, required, available, args, True)
+                compat_seconds.append(seconds)
+                if added:
+                    compat_recalls.append(len(added & set(approximate)) / len(added))
+
+        recall, identical_share = shortlist_recall(recalls)
+        compat_recall, compat_identical_share = shortlist_recall(compat_recalls)
+        results.append({
+            "pantry_size": size,
+            "shortlist_size": server.ANN_SHORTLIST_SIZE,
+            "recall": recall,
+            "identical_share": identical_share,
+            "compat_recall": compat_recall,
+            "compat_identical_share": compat_identical_share,
+            "exact": latency_summary(exact_seconds),
+            "ann": latency_summary(ann_seconds),
+            "compat": latency_summary(compat_seconds) if compat_seconds else None,
+        })
+        print(f"ann pantry={size}: {results[-1]}", file=sys.stderr)
+    return results
+
+
+def bench_engines(server, names, args):
+    """
+    Runs every loaded generation engine on the same ingredient lists per batch size.
+
+    Reports generated tokens/s, recipes/s, the latency of a generate call, the
+    size of the engine's weights and the resident memory after the runs.
+    """
+    results = []
+    for name, engine in server.engines.items():
+        for batch_size in args.engine_batch_sizes:
+            rng = random.Random(args.seed + batch_size)
+            batches = [[rng.sample(names, args.max_ingredients) for _ in range(batch_size)]
+                       for _ in range(args.engine_repeats)]
+            # First call compiles or allocates for this batch size
+            engine.generate(batches[0])
+
+            tokens, seconds = engine.tokens, []
+            for batch in batches:
+                start = time.perf_counter()
+                engine.generate(batch)
+                seconds.append(time.perf_counter() - start)
+            total = sum(seconds)
+            model_mb = engine.model_mb()
+            results.append({
+                "engine": name,
+                "batch_size": batch_size,
+                "tokens_per_second": round((engine.tokens - tokens) / total, 1) if total else None,
+                "recipes_per_second": round(batch_size * len(batches) / total, 3) if total else None,
+                "model_mb": round(model_mb, 1) if model_mb is not None else None,
+                "rss_mb": (server.process_memory_mb() or {}).get("rss_mb"),
+                **latency_summary(seconds),
+            })
+            print(f"engine {name} batch={batch_size}: {results[-1]}", file=sys.stderr)
+    return results
+
+
+def post_json(url, payload, timeout):
+    """Sends a JSON POST and returns the status code"""
+    request = urllib.request.Request(url, json.dumps(payload).encode(), {"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def pipeline_busy_seconds(server):
+    """Returns the busy seconds of every pipeline stage (empty without the pipeline)"""
+    if server.recipe_pipeline is None:
+        return {}
+    return {stage.name: stage.busy_seconds for stage in server.recipe_pipeline.stages}
+
+
+def pipeline_utilization(server, busy_before, wall):
+    """Returns the utilization of every pipeline stage since busy_before was taken"""
+    if server.recipe_pipeline is None:
+        return None
+    return {
+        stage.name: round((stage.busy_seconds - busy_before.get(stage.name, 0.0)) / (wall * stage.workers), 4)
+        for stage in server.recipe_pipeline.stages
+    }
+
+
+def bench_http(server, names, args):
+    """Runs /generate_recipe at each concurrency level against an in-process threaded HTTP server"""
+    from werkzeug.serving import make_server
+
+    http = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{http.server_port}/generate_recipe"
+
+    rng = random.Random(args.seed)
+    payloads = []
+    for _ in range(args.requests):
+        available = rng.sample(names, args.http_pantry_size)
+        payloads.append({
+            "required_ingredients": available[:2],
+            "available_ingredients": available[2:],
+            "max_ingredients": args.max_ingredients,
+            "max_retries": args.max_retries,
+        })
+
+    results = []
+    try:
+        for payload in payloads[:args.warmup]:
+            post_json(url, payload, args.timeout)
+
+        for concurrency in args.concurrency:
+            def timed(payload):
+                start = time.perf_counter()
+                status = post_json(url, payload, args.timeout)
+                return status, time.perf_counter() - start
+
+            busy = pipeline_busy_seconds(server)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                outcomes = list(pool.map(timed, payloads))
+            wall = time.perf_counter() - start
+
+            ok = [seconds for status, seconds in outcomes if status == 200]
+            results.append({
+                "concurrency": concurrency,
+                "requests": len(outcomes),
+                "errors": len(outcomes) - len(ok),
+                "wall_seconds": round(wall, 3),
+                "throughput_rps": round(len(outcomes) / wall, 3),
+                **latency_summary(ok),
+                "pipeline_utilization": pipeline_utilization(server, busy, wall),
+            })
+            print(f"http concurrency={concurrency}: {results[-1]}", file=sys.stderr)
+    finally:
+        http.shutdown()
+    return results
+
+
+def git_commit():
+    """Returns the current commit hash, or None outside a git checkout"""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", choices=["stub", "auto", "real"], default="stub",
+                        help="stub: stand-in models; auto: cached weights if present; real: cached weights only")
+    parser.add_argument("--pantry-sizes", default="10,50,100,250,500,1000,2000")
+    parser.add_argument("--selection-repeats", type=int, default=20)
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--requests", type=int, default=64, help="HTTP requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=4)
+    parser.add_argument("--http-pantry-size", type=int, default=30)
+    parser.add_argument("--max-ingredients", type=int, default=7)
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--bert-layers", type=int, default=2, help="Dense layers of the stub RecipeBERT")
+    parser.add_argument("--t5-batch-ms", type=float, default=50.0, help="Stub T5 cost per generate call")
+    parser.add_argument("--t5-prompt-ms", type=float, default=10.0, help="Stub T5 cost per prompt")
+    parser.add_argument("--invalid-rate", type=float, default=0.2, help="Share of stub recipes that fail validation")
+    parser.add_argument("--ann-trials", type=int, default=50, help="Selections per pantry size for the ANN recall")
+    parser.add_argument("--engine-batch-sizes", default="1,4,8",
+                        help="Prompts per generate call in the engine benchmark")
+    parser.add_argument("--engine-repeats", type=int, default=5, help="Generate calls per engine and batch size")
+    parser.add_argument("--skip-selection", action="store_true")
+    parser.add_argument("--skip-ann", action="store_true")
+    parser.add_argument("--skip-engines", action="store_true")
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file for the results (default: stdout)")
+    args = parser.parse_args()
+    args.pantry_sizes = [int(size) for size in args.pantry_sizes.split(",") if size]
+    args.concurrency = [int(level) for level in args.concurrency.split(",") if level]
+    args.engine_batch_sizes = [int(size) for size in args.engine_batch_sizes.split(",") if size]
+    return args
+
+
+def main():
+    args = parse_args()
+
+    # Nothing is downloaded or persisted, and models load only when asked for
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    os.environ["DEFER_MODEL_LOADING"] = "1"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    for name in ("SHARED_WEIGHTS_DIR", "EMBEDDING_CACHE_PATH", "INGREDIENT_INDEX_PATH"):
+        os.environ.pop(name, None)
+    random.seed(args.seed)
+
+    import torch
+    import backendServer as server
+    from ingredientIndex import load_catalog
+    torch.manual_seed(args.seed)
+
+    models = "stub"
+    if args.models != "stub" and load_real_models(server):
+        models = "real"
+    elif args.models == "real":
+        raise SystemExit("Real models are not in the Hugging Face cache")
+    else:
+        install_stub_models(server, args)
+
+    names = list(dict.fromkeys(name.lower() for name in load_catalog(server.INGREDIENT_CATALOG_PATH)))
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "models": models,
+            "scheduler": server.SCHEDULER_ENABLED,
+            "pipeline": server.PIPELINE_ENABLED,
+            "engines": sorted(server.engines),
+            "pooling": server.BERT_POOLING,
+            "compat_matrix": server.compat_matrix.stats() if server.COMPAT_ENABLED else None,
+            "args": {key: value for key, value in vars(args).items() if key != "output"},
+        },
+        "selection": None if args.skip_selection else bench_selection(server, names, args),
+        "ann": None if args.skip_ann or not server.ANN_ENABLED else bench_ann(server, names, args),
+        "engines": None if args.skip_engines else bench_engines(server, names, args),
+        "http": None if args.skip_http else bench_http(server, names, args),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Cosine similarities are in [-1, 1]; int8 storage maps them to [-127, 127]
+INT8_SCALE = 127.0
+
+
+class CompatibilityMatrix:
+    """
+    Precomputed pairwise cosine similarities of the rows of an IngredientIndex.
+
+    Similarities are stored as float32 (selections identical to scoring the
+    embeddings), float16 or int8 (1/127 steps; both can swap picks with close
+    scores, more so for anisotropic embeddings) in a square buffer that grows
+    geometrically; rows added later get their row and column computed against
+    all existing rows. Reads are row gathers cast to float32. At most max_size
+    rows are covered, rows beyond that are scored from the embeddings by the
+    caller.
+
+    neighbors() keeps an LRU of the best candidates of every required set,
+    ranked by the first greedy step of the selection; for a single required
+    ingredient that is just its sorted row.
+    """
+
+    def __init__(self, max_size=8192, dtype="float32", top_k=256, cache_size=1024, block_size=1024):
+        if dtype not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unsupported compatibility matrix dtype {dtype!r}")
+        self.max_size = max_size
+        self.dtype = np.dtype(dtype)
+        self.top_k = top_k
+        self.cache_size = cache_size
+        self.block_size = block_size
+        self.size = 0
+        self.neighbor_hits = 0
+        self.neighbor_misses = 0
+        self._buffer = None
+        self._neighbors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def covers(self, rows):
+        """True if every index row has a row in the matrix"""
+        return all(row is not None and row < self.size for row in rows)
+
+    def _encode(self, similarities):
+        if self.dtype == np.int8:
+            return np.clip(np.rint(similarities * INT8_SCALE), -127, 127).astype(np.int8)
+        return similarities.astype(self.dtype)
+
+    def _decode(self, stored):
+        if self.dtype == np.int8:
+            return stored.astype(np.float32) / INT8_SCALE
+        return stored.astype(np.float32)
+
+    def _reserve(self, count):
+        """Makes sure the buffer can hold count rows and columns"""
+        capacity = 0 if self._buffer is None else self._buffer.shape[0]
+        if count <= capacity:
+            return
+        # Memory grows with the square of the capacity, so grow in smaller steps than a list
+        capacity = min(max(count, int(1.25 * capacity), 64), self.max_size)
+        buffer = np.zeros((capacity, capacity), dtype=self.dtype)
+        if self.size:
+            buffer[:self.size, :self.size] = self._buffer[:self.size, :self.size]
+        self._buffer = buffer
+
+    def update(self, matrix):
+        """
+        Adds the rows of a normalized embedding matrix that are not covered yet.
+
+        Args:
+            matrix (np.ndarray): Normalized embeddings of all index rows (earlier rows unchanged)
+
+        Returns:
+            int: Number of rows added
+        """
+        with self._lock:
+            start = self.size
+            end = min(len(matrix), self.max_size)
+            if end <= start:
+                return 0
+            self._reserve(end)
+            covered = np.asarray(matrix[:end], dtype=np.float32)
+            for first in range(start, end, self.block_size):
+                last = min(first + self.block_size, end)
+                block = self._encode(covered[first:last] @ covered.T)
+                self._buffer[first:last, :end] = block
+                self._buffer[:end, first:last] = block.T
+            self.size = end
+            return end - start
+
+    def gather(self, rows, columns=None):
+        """
+        Returns similarities as float32.
+
+        Args:
+            rows (list): Matrix rows
+            columns (list): Matrix columns (defaults to all covered rows)
+
+        Returns:
+            np.ndarray: len(rows) x len(columns) similarities
+        """
+        with self._lock:
+            buffer, size = self._buffer, self.size
+        stored = buffer[np.asarray(rows, dtype=np.int64)]
+        stored = stored[:, :size] if columns is None else stored[:, np.asarray(columns, dtype=np.int64)]
+        return self._decode(stored)
+
+    def first_step_scores(self, required_rows, norms, avg_weight=0.6, columns=None):
+        """
+        Scores candidates like the first step of the greedy selection.
+
+        The cosine to the centroid of the required embeddings v_j is
+        sum_j |v_j| S[c, j] / |sum_j v_j|, with |sum_j v_j|^2 = sum_ij |v_i| |v_j| S[i, j].
+
+        Args:
+            required_rows (list): Rows of the required ingredients
+            norms (np.ndarray): Embedding norms of all index rows
+            avg_weight (float): Weight of the similarity to the centroid
+            columns (list): Candidate rows (defaults to all covered rows)
+
+        Returns:
+            np.ndarray: Combined score per candidate
+        """
+        required_norms = np.asarray(norms, dtype=np.float32)[np.asarray(required_rows, dtype=np.int64)]
+        similarities = self.gather(required_rows, columns)
+        block = self.gather(required_rows, required_rows)
+        centroid_norm = np.sqrt(max(float(required_norms @ block @ required_norms), 0.0))
+        avg_similarity = required_norms @ similarities / centroid_norm if centroid_norm > 0 else 0.0
+        return avg_weight * avg_similarity + (1 - avg_weight) * similarities.mean(axis=0)
+
+    def neighbors(self, required_rows, norms, avg_weight=0.6):
+        """
+        Returns the top_k rows with the best first step score for a required set, best first.
+
+        Results are cached per required set and recomputed once rows were added.
+        """
+        key = (tuple(sorted(required_rows)), avg_weight)
+        with self._lock:
+            entry = self._neighbors.get(key)
+            if entry is not None and entry[0] == self.size:
+                self._neighbors.move_to_end(key)
+                self.neighbor_hits += 1
+                return entry[1]
+            self.neighbor_misses += 1
+            size = self.size
+
+        if len(required_rows) == 1:
+            scores = self.gather(required_rows)[0]
+        else:
+            scores = self.first_step_scores(required_rows, norms, avg_weight)
+        scores[list(required_rows)] = -np.inf
+        k = min(self.top_k, size)
+        top = np.argpartition(-scores, k - 1)[:k] if k < size else np.arange(size)
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        with self._lock:
+            self._neighbors[key] = (size, top)
+            self._neighbors.move_to_end(key)
+            while len(self._neighbors) > self.cache_size:
+                self._neighbors.popitem(last=False)
+        return top
+
+    def memory_mb(self):
+        """Size of the similarity buffer in MB"""
+        return 0.0 if self._buffer is None else self._buffer.nbytes / (1024 * 1024)
+
+    def stats(self):
+        """Returns size, storage and neighbor cache counts"""
+        return {
+            "rows": self.size,
+            "max_size": self.max_size,
+            "dtype": self.dtype.name,
+            "memory_mb": round(self.memory_mb(), 1),
+            "top_k": self.top_k,
+            "neighbor_sets": len(self._neighbors),
+            "neighbor_hits": self.neighbor_hits,
+            "neighbor_misses": self.neighbor_misses,
+        }
@@ -0,0 +1,100 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from matrixStore import load_matrix, save_matrix
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU cache for ingredient embeddings with an optional on-disk store.
+
+    The disk store consists of two files: a float32 matrix (<path>.npy) that is
+    memory-mapped on load and a JSON name index (<path>.json) mapping each key
+    to its row in the matrix.
+    """
+
+    def __init__(self, max_size=4096, path=None):
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """Returns the cached vector for key or None, updating hit/miss counters"""
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key, vector):
+        """Stores a vector, evicting the least recently used entries if full"""
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Returns size and hit/miss counters"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def load(self):
+        """
+        Loads the on-disk store, if present.
+
+        Rows are kept as views into the memory-mapped matrix, so only the
+        vectors that are actually used get paged in.
+
+        Returns:
+            int: Number of entries loaded
+        """
+        if not self.path:
+            return 0
+        stored = load_matrix(self.path)
+        if stored is None:
+            return 0
+        matrix, names = stored
+        if len(matrix) != len(names):
+            return 0
+
+        # save writes from least to most recently used, so keep the newest max_size entries in that order
+        first = max(len(names) - self.max_size, 0)
+        with self._lock:
+            for row in range(first, len(names)):
+                self._entries[names[row]] = matrix[row]
+        return len(names) - first
+
+    def save(self):
+        """Writes all cached entries to the on-disk store"""
+        if not self.path:
+            return
+        with self._lock:
+            names = list(self._entries.keys())
+            if not names:
+                return
+            matrix = np.stack([self._entries[k] for k in names]).astype(np.float32)
+
+        # Workers sharing EMBEDDING_CACHE_PATH save at exit together; save_matrix keeps the pair consistent
+        save_matrix(self.path, matrix, names)
@@ -0,0 +1,222 @@
+import threading
+import time
+from contextlib import nullcontext
+
+import numpy as np
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+
+def _no_timer(stage):
+    return nullcontext()
+
+
+class GenerationEngine:
+    """
+    Recipe generation backend.
+
+    generate() turns a batch of ingredient lists into recipe dictionaries
+    (title, ingredients, directions) with one batched model call, so the
+    server's retry and validation loops work with every engine. Calls,
+    generated tokens and time spent are counted for /stats and benchmarks.
+    """
+
+    name = None
+
+    def __init__(self):
+        self.calls = 0
+        self.sequences = 0
+        self.tokens = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def generate(self, ingredient_lists, reduced_length=False):
+        """
+        Generates one recipe per ingredient list in a single batch.
+
+        Args:
+            ingredient_lists (list): Ingredients per prompt
+            reduced_length (bool): Use the shorter output length kept for overload, where the engine has one
+
+        Returns:
+            list: A dictionary with title, ingredients, and directions per ingredient list
+        """
+        if not ingredient_lists:
+            return []
+        start = time.perf_counter()
+        recipes, tokens = self._generate(ingredient_lists, reduced_length)
+        with self._lock:
+            self.calls += 1
+            self.sequences += len(ingredient_lists)
+            self.tokens += tokens
+            self.seconds += time.perf_counter() - start
+        return recipes
+
+    def _generate(self, ingredient_lists, reduced_length):
+        """Returns the recipes and the number of generated tokens"""
+        raise NotImplementedError
+
+    def cache_params(self):
+        """Settings that change the output, used in recipe cache keys"""
+        raise NotImplementedError
+
+    def model_mb(self):
+        """Size of the model weights in MB"""
+        return None
+
+    def stats(self):
+        """Returns call and token counts and the generation throughput"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "sequences": self.sequences,
+                "tokens": self.tokens,
+                "seconds": round(self.seconds, 3),
+                "tokens_per_second": round(self.tokens / self.seconds, 1) if self.seconds else None,
+            }
+
+
+class T5Engine(GenerationEngine):
+    """
+    Flax T5 (flax-community/t5-recipe-generation).
+
+    Wraps the server's T5 path: prompts from the prompt token cache, padded
+    length and batch buckets, the micro-batcher shared with concurrent
+    requests and the section/separator post-processing. Flax generate keeps a
+    key/value cache for the decoder.
+    """
+
+    name = "t5"
+
+    def __init__(self, run, encode_prompt, decode, parse, pad_token_id, generation_kwargs, params_mb=None,
+                 timer=None):
+        super().__init__()
+        self.run = run
+        self.encode_prompt = encode_prompt
+        self.decode = decode
+        self.parse = parse
+        self.pad_token_id = pad_token_id
+        self.generation_kwargs = generation_kwargs
+        self.params_mb = params_mb
+        self.timer = timer or _no_timer
+
+    def _generate(self, ingredient_lists, reduced_length):
+        generated = np.asarray(self.run([self.encode_prompt(ingredients) for ingredients in ingredient_lists],
+                                        reduced_length))
+        texts = self.decode(generated)
+        with self.timer("parsing"):
+            recipes = [self.parse(text, ingredients) for text, ingredients in zip(texts, ingredient_lists)]
+        # Generated sequences start with the decoder start token and are padded after their end
+        tokens = int(np.count_nonzero(generated[:, 1:] != self.pad_token_id))
+        return recipes, tokens
+
+    def cache_params(self):
+        return self.generation_kwargs
+
+    def model_mb(self):
+        return self.params_mb() if self.params_mb else None
+
+
+class RecipeNLGEngine(GenerationEngine):
+    """
+    GPT-2 based RecipeNLG model (mbien/recipenlg) in torch.
+
+    Prompts use the RecipeNLG control tokens and end with <INGR_START>, so the
+    model writes the ingredients, directions and title sections. Batches are
+    left-padded and decoded with the key/value cache, so every step only runs
+    the newest token through the model.
+    """
+
+    name = "recipenlg"
+    RECIPE_END = "<RECIPE_END>"
+
+    def __init__(self, path, device=None, generation_kwargs=None, reduced_max_new_tokens=None, timer=None):
+        super().__init__()
+        self.device = torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = AutoModelForCausalLM.from_pretrained(path).to(self.device).eval()
+        self.generation_kwargs = dict(generation_kwargs or {})
+        self.reduced_max_new_tokens = reduced_max_new_tokens
+        self.timer = timer or _no_timer
+
+        # Stop at the end of the recipe if the tokenizer knows the control token
+        end_id = self.tokenizer.convert_tokens_to_ids(self.RECIPE_END)
+        self.stop_ids = {self.tokenizer.eos_token_id}
+        if end_id is not None and end_id != self.tokenizer.unk_token_id:
+            self.stop_ids.add(end_id)
+
+    @staticmethod
+    def build_prompt(ingredients):
+        """Formats ingredients as RecipeNLG input"""
+        return "<RECIPE_START> <INPUT_START> " + " <NEXT_INPUT> ".join(ingredients) + " <INPUT_END> <INGR_START>"
+
+    @staticmethod
+    def _section(text, start, end):
+        """Returns the text between two control tokens (None if start is missing)"""
+        if start not in text:
+            return None
+        return text.split(start, 1)[1].split(end, 1)[0].strip()
+
+    def parse(self, generated_text, current_ingredients):
+        """
+        Parses the generated continuation of a prompt into a recipe dictionary.
+
+        Returns:
+            dict: A dictionary with title, ingredients, and directions
+        """
+        text = "<INGR_START>" + generated_text.split(self.RECIPE_END, 1)[0]
+        ingredients = self._section(text, "<INGR_START>", "<INGR_END>")
+        directions = self._section(text, "<INSTR_START>", "<INSTR_END>")
+        title = self._section(text, "<TITLE_START>", "<TITLE_END>")
+        recipe = {
+            "title": title.capitalize() if title else f"Recipe with {', '.join(current_ingredients[:3])}",
+            "ingredients": [item.strip().capitalize() for item in ingredients.split("<NEXT_INGR>") if item.strip()]
+            if ingredients else current_ingredients,
+            "directions": [step.strip().capitalize() for step in directions.split("<NEXT_INSTR>") if step.strip()]
+            if directions else ["No directions generated"],
+        }
+        if not ingredients:
+            # The prompt list stands in for the missing section, it must not count as validated
+            recipe["ingredients_missing"] = True
+        return recipe
+
+    def _generate(self, ingredient_lists, reduced_length):
+        prompts = [self.build_prompt(ingredients) for ingredients in ingredient_lists]
+        with self.timer("tokenization"):
+            inputs = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.device)
+        kwargs = dict(self.generation_kwargs)
+        if reduced_length and self.reduced_max_new_tokens:
+            kwargs["max_new_tokens"] = min(kwargs.get("max_new_tokens", self.reduced_max_new_tokens),
+                                           self.reduced_max_new_tokens)
+        with self.timer("generation"), torch.no_grad():
+            output = self.model.generate(
+                **inputs,
+                use_cache=True,
+                pad_token_id=self.tokenizer.pad_token_id,
+                eos_token_id=sorted(self.stop_ids),
+                **kwargs
+            )
+        new_tokens = output[:, inputs["input_ids"].shape[1]:].cpu().numpy()
+
+        # Count tokens up to and including the first stop token of each row
+        tokens = 0
+        for row in new_tokens:
+            stops = np.flatnonzero(np.isin(row, list(self.stop_ids)))
+            tokens += int(stops[0]) + 1 if len(stops) else len(row)
+
+        with self.timer("decoding"):
+            texts = self.tokenizer.batch_decode(new_tokens, skip_special_tokens=False)
+        with self.timer("parsing"):
+            recipes = [self.parse(text.replace(self.tokenizer.pad_token, "").replace(self.tokenizer.eos_token, ""),
+                                  ingredients)
+                       for text, ingredients in zip(texts, ingredient_lists)]
+        return recipes, tokens
+
+    def cache_params(self):
+        return dict(self.generation_kwargs, engine=self.name)
+
+    def model_mb(self):
+        return sum(p.numel() * p.element_size() for p in self.model.parameters()) / (1024 * 1024)
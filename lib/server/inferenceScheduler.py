@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+
+from metrics import Histogram
+
+
+class _Job:
+    """Work submitted by one caller and the slot for its result"""
+
+    def __init__(self, items):
+        self.items = items
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Collects work items from concurrent callers into batches.
+
+    A single worker thread waits up to max_wait_ms after the first queued job,
+    or until max_batch_size items are collected, then passes all items to
+    process_batch in one call and hands each caller its slice of the results.
+    """
+
+    def __init__(self, name, process_batch, max_batch_size=8, max_wait_ms=10):
+        self.name = name
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue_depth = Histogram([0, 1, 2, 4, 8, 16, 32, 64])
+        self.batch_size = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.wait_seconds = Histogram([0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0])
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, items):
+        """
+        Queues items and blocks until their batch has been processed.
+
+        Returns:
+            list: One result per item, in order
+        """
+        job = _Job(list(items))
+        if not job.items:
+            return []
+        self.queue_depth.observe(self._queue.qsize())
+        self._queue.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _collect(self):
+        """Blocks for the first job, then gathers more until the batch is full or the wait expires"""
+        jobs = [self._queue.get()]
+        size = len(jobs[0].items)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            jobs.append(job)
+            size += len(job.items)
+        return jobs
+
+    def _run(self):
+        while True:
+            jobs = self._collect()
+            started = time.perf_counter()
+            items = [item for job in jobs for item in job.items]
+            for job in jobs:
+                self.wait_seconds.observe(started - job.enqueued)
+            self.batch_size.observe(len(items))
+
+            try:
+                results = self.process_batch(items)
+                offset = 0
+                for job in jobs:
+                    job.result = results[offset:offset + len(job.items)]
+                    offset += len(job.items)
+            except Exception as e:
+                for job in jobs:
+                    job.error = e
+            finally:
+                for job in jobs:
+                    job.done.set()
+
+    def stats(self):
+        """Returns queue depth, batch size and wait time histograms"""
+        return {
+            "queued": self._queue.qsize(),
+            "queue_depth": self.queue_depth.snapshot(),
+            "batch_size": self.batch_size.snapshot(),
+            "wait_seconds": self.wait_seconds.snapshot(),
+        }
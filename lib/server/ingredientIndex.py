@@ -0,0 +1,156 @@
+import re
+import threading
+
+import numpy as np
+
+from matrixStore import load_matrix, save_matrix
+
+
+def load_catalog(path):
+    """
+    Parses the ingredient catalog shipped with the Flutter app.
+
+    Args:
+        path (str): Path to ingriedientsData.dart
+
+    Returns:
+        list: Unique ingredient names in catalog order
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        source = f.read()
+
+    # Drop line comments such as "// Legumes" inside the lists
+    source = re.sub(r"//[^\n]*", "", source)
+
+    names = []
+    seen = set()
+    for block in re.findall(r'"ingredients"\s*:\s*\[(.*?)\]', source, re.S):
+        for name in re.findall(r'"([^"]*)"', block):
+            if name and name not in seen:
+                seen.add(name)
+                names.append(name)
+    return names
+
+
+class IngredientIndex:
+    """
+    Contiguous float32 matrix of L2-normalized ingredient embeddings.
+
+    Each name maps to one row. The original vector norms are kept next to the
+    matrix so un-normalized embeddings can be reconstructed when needed.
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.rows = {}
+        self.names = []
+        self._matrix = None
+        self._norms = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.rows
+
+    @property
+    def matrix(self):
+        """Normalized embeddings of all rows"""
+        return self._matrix[:len(self.names)]
+
+    @property
+    def norms(self):
+        """Original L2 norms of all rows"""
+        return self._norms[:len(self.names)]
+
+    def get_row(self, name):
+        """Returns the row of a name or None"""
+        return self.rows.get(name)
+
+    def vectors(self, rows):
+        """Returns the un-normalized embeddings for the given rows"""
+        rows = np.asarray(rows, dtype=np.int64)
+        return self._matrix[rows] * self._norms[rows, None]
+
+    def _reserve(self, count, dim):
+        """Makes sure the buffers can hold count rows and are writable"""
+        if self._matrix is None:
+            capacity = max(count, 64)
+            self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+            self._norms = np.zeros(capacity, dtype=np.float32)
+            return
+
+        if count <= self._matrix.shape[0] and self._matrix.flags.writeable:
+            return
+
+        # Grow geometrically; this also copies memory-mapped buffers into RAM
+        capacity = max(count, 2 * self._matrix.shape[0])
+        matrix = np.zeros((capacity, self._matrix.shape[1]), dtype=np.float32)
+        norms = np.zeros(capacity, dtype=np.float32)
+        matrix[:len(self.names)] = self.matrix
+        norms[:len(self.names)] = self.norms
+        self._matrix, self._norms = matrix, norms
+
+    def add(self, names, vectors):
+        """
+        Appends new names and their (un-normalized) embeddings.
+
+        Names that are already indexed are skipped. Once max_size is reached,
+        no further names are added.
+
+        Returns:
+            list: The rows of all given names (None for names not added)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(names), -1)
+        with self._lock:
+            new, seen = [], set()
+            for i, name in enumerate(names):
+                if name not in self.rows and name not in seen:
+                    seen.add(name)
+                    new.append(i)
+            if self.max_size is not None:
+                new = new[:max(self.max_size - len(self.names), 0)]
+
+            if new:
+                start = len(self.names)
+                self._reserve(start + len(new), vectors.shape[1])
+                norms = np.linalg.norm(vectors[new], axis=1)
+                safe_norms = np.where(norms == 0, 1.0, norms)
+                self._matrix[start:start + len(new)] = vectors[new] / safe_norms[:, None]
+                self._norms[start:start + len(new)] = norms
+                for offset, i in enumerate(new):
+                    self.rows[names[i]] = start + offset
+                    self.names.append(names[i])
+
+            return [self.rows.get(name) for name in names]
+
+    def save(self, path):
+        """Writes the matrix (<path>.npy) and the name index (<path>.json)"""
+        with self._lock:
+            if not self.names:
+                return
+            matrix = np.ascontiguousarray(self.matrix)
+            index = {"names": list(self.names), "norms": self.norms.tolist()}
+        save_matrix(path, matrix, index)
+
+    def load(self, path):
+        """
+        Memory-maps a previously saved index.
+
+        Returns:
+            bool: True if an index was found and loaded
+        """
+        stored = load_matrix(path)
+        if stored is None:
+            return False
+        matrix, index = stored
+        if len(matrix) != len(index["names"]):
+            return False
+
+        with self._lock:
+            self._matrix = matrix
+            self._norms = np.asarray(index["norms"], dtype=np.float32)
+            self.names = list(index["names"])
+            self.rows = {name: row for row, name in enumerate(self.names)}
+        return True
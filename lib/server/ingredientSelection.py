@@ -0,0 +1,149 @@
+import numpy as np
+
+
+def normalize_rows(matrix):
+    """L2-normalizes each row of a matrix, leaving zero rows at zero"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms != 0)
+
+
+def get_combined_scores(query_vector, candidates, similarities, avg_weight=0.6):
+    """
+    Computes combined score considering both similarity to average and individual ingredients.
+
+    Args:
+        query_vector (np.ndarray): Average vector of the current combination
+        candidates (np.ndarray): Normalized candidate embeddings (candidates x dim)
+        similarities (np.ndarray): Cosine similarities of candidates to the selected ingredients
+            (candidates x selected)
+        avg_weight (float): Weight for average vector
+
+    Returns:
+        np.ndarray: Combined score per candidate
+    """
+    # Similarity to average vector
+    query_norm = np.linalg.norm(query_vector)
+    if query_norm == 0:
+        avg_similarity = np.zeros(len(candidates), dtype=candidates.dtype)
+    else:
+        avg_similarity = candidates @ (query_vector / query_norm)
+
+    # Average similarity to individual ingredients
+    avg_individual_similarity = similarities.mean(axis=1)
+
+    # Combined score (weighted average)
+    return avg_weight * avg_similarity + (1 - avg_weight) * avg_individual_similarity
+
+
+def greedy_select(num_candidates, num_to_add, score, add, penalty=None):
+    """
+    Selection loop of select_ingredients and select_ingredients_compat.
+
+    Args:
+        num_candidates (int): Number of candidates to choose from
+        num_to_add (int): Number of candidates to select
+        score (callable): Returns the combined score per candidate for the current combination
+        add (callable): Adds the candidate at a position to the combination
+        penalty (np.ndarray): Optional amount subtracted from each candidate's score
+
+    Returns:
+        list: Candidate positions in selection order
+    """
+    available = np.ones(num_candidates, dtype=bool)
+    selected = []
+    for _ in range(num_to_add):
+        scores = score()
+        if penalty is not None:
+            scores = scores - penalty
+
+        # Masked argmax returns the first maximum, same as a stable descending sort
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        add(best)
+    return selected
+
+
+def select_ingredients(required_matrix, candidate_matrix, num_to_add, avg_weight=0.6, penalty=None):
+    """
+    Greedily selects the candidates that fit the current combination best.
+
+    The centroid is kept as a running sum and the candidate x selected similarity
+    matrix gets one new column per step, so no step recomputes earlier work.
+
+    Args:
+        required_matrix (np.ndarray): Embeddings of the required ingredients
+        candidate_matrix (np.ndarray): Embeddings of the available ingredients
+        num_to_add (int): Number of candidates to select
+        avg_weight (float): Weight for average vector
+        penalty (np.ndarray): Optional amount subtracted from each candidate's score
+
+    Returns:
+        list: Row indices into candidate_matrix in selection order
+    """
+    candidates = normalize_rows(candidate_matrix)
+    count = len(required_matrix)
+    centroid_sum = required_matrix.sum(axis=0)
+
+    similarities = np.empty((len(candidates), count + num_to_add), dtype=candidates.dtype)
+    similarities[:, :count] = candidates @ normalize_rows(required_matrix).T
+
+    def score():
+        return get_combined_scores(centroid_sum / count, candidates, similarities[:, :count], avg_weight)
+
+    def add(best):
+        nonlocal centroid_sum, count
+        centroid_sum += candidate_matrix[best]
+        similarities[:, count] = candidates @ candidates[best]
+        count += 1
+
+    return greedy_select(len(candidates), num_to_add, score, add, penalty)
+
+
+def select_ingredients_compat(compat_matrix, norms, required_rows, candidate_rows, num_to_add, avg_weight=0.6,
+                              penalty=None):
+    """
+    select_ingredients scored from the compatibility matrix.
+
+    The centroid similarity of each candidate is kept as a running sum of
+    |v_j| * S[c, j] over the selected rows, the squared centroid norm as
+    sum_ij |v_i| |v_j| S[i, j]; each step gathers the row of the new pick.
+
+    Args:
+        compat_matrix (CompatibilityMatrix): Similarities of the index rows
+        norms (np.ndarray): Embedding norm per index row (IngredientIndex.norms)
+        required_rows (list): Index rows of the required ingredients
+        candidate_rows (list): Index rows of the available ingredients
+        num_to_add (int): Number of candidates to select
+        avg_weight (float): Weight for average vector
+        penalty (np.ndarray): Optional amount subtracted from each candidate's score
+
+    Returns:
+        list: Positions into candidate_rows in selection order
+    """
+    candidate_rows = np.asarray(candidate_rows, dtype=np.int64)
+    candidate_norms = norms[candidate_rows].astype(np.float32)
+    required_norms = norms[np.asarray(required_rows, dtype=np.int64)].astype(np.float32)
+
+    similarities = compat_matrix.gather(required_rows, candidate_rows)
+    weighted_sum = required_norms @ similarities
+    similarity_sum = similarities.sum(axis=0)
+    centroid_sq = float(required_norms @ compat_matrix.gather(required_rows, required_rows) @ required_norms)
+    count = len(required_rows)
+
+    def score():
+        centroid_norm = np.sqrt(max(centroid_sq, 0.0))
+        avg_similarity = weighted_sum / centroid_norm if centroid_norm > 0 else np.zeros_like(weighted_sum)
+        return avg_weight * avg_similarity + (1 - avg_weight) * similarity_sum / count
+
+    def add(best):
+        nonlocal centroid_sq, weighted_sum, similarity_sum, count
+        best_norm = float(candidate_norms[best])
+        centroid_sq += 2 * best_norm * float(weighted_sum[best]) + best_norm * best_norm
+        column = compat_matrix.gather([candidate_rows[best]], candidate_rows)[0]
+        weighted_sum += best_norm * column
+        similarity_sum += column
+        count += 1
+
+    return greedy_select(len(candidate_rows), num_to_add, score, add, penalty)
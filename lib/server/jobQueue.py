@@ -0,0 +1,87 @@
+import queue
+import threading
+import time
+import uuid
+
+
+class JobQueue:
+    """
+    Runs submitted payloads on a fixed pool of worker threads.
+
+    Jobs wait in a bounded queue; finished results are kept for ttl_seconds
+    after completion and then discarded.
+    """
+
+    def __init__(self, process, workers=2, max_queue=64, ttl_seconds=600):
+        self.process = process
+        self.ttl_seconds = ttl_seconds
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, payload):
+        """
+        Queues a payload for processing.
+
+        Returns:
+            str: The job id, or None if the queue is full
+        """
+        self._expire()
+        job_id = uuid.uuid4().hex
+        job = {"id": job_id, "status": "queued", "created": time.time()}
+        with self._lock:
+            self._jobs[job_id] = job
+        try:
+            self._queue.put_nowait((job_id, payload))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+            return None
+        return job_id
+
+    def get(self, job_id):
+        """Returns a copy of the job state, or None if unknown or expired"""
+        self._expire()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _expire(self):
+        """Drops finished jobs whose TTL has passed"""
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.get("finished") and now - job["finished"] > self.ttl_seconds]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def _run(self):
+        while True:
+            job_id, payload = self._queue.get()
+            with self._lock:
+                self._jobs[job_id].update(status="running", started=time.time())
+            try:
+                result, status_code = self.process(payload)
+                update = {"status": "done", "result": result, "status_code": status_code}
+            except Exception as e:
+                update = {"status": "failed", "result": {"error": str(e)}, "status_code": 500}
+            with self._lock:
+                self._jobs[job_id].update(finished=time.time(), **update)
+
+    def stats(self):
+        """Returns queue and job counts"""
+        with self._lock:
+            states = [job["status"] for job in self._jobs.values()]
+        return {
+            "workers": len(self._workers),
+            "queued": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "running": states.count("running"),
+            "finished": states.count("done") + states.count("failed"),
+        }
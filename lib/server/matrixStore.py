@@ -0,0 +1,76 @@
+import json
+import os
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development server only
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path, exclusive=True):
+    """
+    Holds an advisory lock on <path>.lock across processes (no-op without fcntl).
+
+    Args:
+        path (str): Store path the lock belongs to
+        exclusive (bool): Exclusive lock for writers, shared lock for readers
+    """
+    if fcntl is None:
+        yield
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def save_matrix(path, matrix, index):
+    """
+    Writes a float32 matrix (<path>.npy) and its JSON index (<path>.json).
+
+    Both files are written under per-process temporary names and replaced as a
+    pair while holding the store's lock, so processes saving the same store at
+    once never interleave writes or pair one's matrix with another's index.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_matrix, tmp_index = f"{path}.{os.getpid()}.tmp.npy", f"{path}.{os.getpid()}.tmp.json"
+    try:
+        np.save(tmp_matrix, matrix)
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        with file_lock(path):
+            os.replace(tmp_matrix, path + ".npy")
+            os.replace(tmp_index, path + ".json")
+    finally:
+        for tmp in (tmp_matrix, tmp_index):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def load_matrix(path):
+    """
+    Memory-maps a matrix written by save_matrix and reads its index.
+
+    Returns:
+        tuple: (matrix, index), or None if the store does not exist
+    """
+    if not (os.path.exists(path + ".npy") and os.path.exists(path + ".json")):
+        return None
+    # Opening both files under the lock keeps them from the same save; the mmap stays
+    # valid after a later replace
+    with file_lock(path, exclusive=False):
+        matrix = np.load(path + ".npy", mmap_mode="r")
+        with open(path + ".json", "r", encoding="utf-8") as f:
+            index = json.load(f)
+    return matrix, index
@@ -0,0 +1,212 @@
+import bisect
+import math
+import numbers
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with Prometheus-style cumulative bucket counts.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = sorted(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Records one value"""
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        """Returns cumulative counts per upper bound, plus count and sum"""
+        with self._lock:
+            buckets, total = {}, 0
+            for bound, count in zip(self.bounds + ["+Inf"], self.counts):
+                total += count
+                buckets[str(bound)] = total
+            return {"buckets": buckets, "count": self.count, "sum": round(self.sum, 6)}
+
+
+class Counter:
+    """
+    Monotonic counter, optionally split by the value of one label.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label=None, amount=1):
+        """Adds amount to the counter for label"""
+        with self._lock:
+            self.values[label] = self.values.get(label, 0) + amount
+
+    def snapshot(self):
+        """Returns the value per label"""
+        with self._lock:
+            return dict(self.values)
+
+
+class Gauge(Counter):
+    """
+    Value that goes up and down, e.g. the number of requests in flight.
+    """
+
+    def dec(self, label=None, amount=1):
+        """Subtracts amount from the gauge for label"""
+        self.inc(label, -amount)
+
+    @contextmanager
+    def track(self, label=None):
+        """Counts the enclosed block as in flight"""
+        self.inc(label)
+        try:
+            yield
+        finally:
+            self.dec(label)
+
+
+class HistogramFamily:
+    """
+    Histograms with shared bounds, one per value of a label (created on first use).
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, label):
+        """Returns the histogram for label"""
+        histogram = self.children.get(label)
+        if histogram is None:
+            with self._lock:
+                histogram = self.children.setdefault(label, Histogram(self.bounds))
+        return histogram
+
+    @contextmanager
+    def time(self, label):
+        """Observes the duration of the enclosed block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.labels(label).observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        """Returns the snapshot of every histogram per label"""
+        return {label: histogram.snapshot() for label, histogram in list(self.children.items())}
+
+
+class Registry:
+    """
+    Named metrics rendered in the Prometheus text exposition format.
+
+    Metrics are registered with the name of their label (if any); callbacks
+    return a value or a label -> value dict at scrape time, so existing
+    statistics can be exported without copying them into counters.
+    """
+
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self._metrics = []
+
+    def register(self, name, help, metric, label=None, kind=None):
+        """Adds a Counter, Gauge, Histogram, HistogramFamily or callback and returns it"""
+        if kind is None:
+            kind = {Gauge: "gauge", Counter: "counter"}.get(type(metric), "histogram")
+        self._metrics.append((self.prefix + name, help, kind, label, metric))
+        return metric
+
+    def counter(self, name, help, label=None):
+        return self.register(name, help, Counter(), label)
+
+    def gauge(self, name, help, label=None):
+        return self.register(name, help, Gauge(), label)
+
+    def histogram(self, name, help, bounds, label=None):
+        metric = HistogramFamily(bounds) if label else Histogram(bounds)
+        return self.register(name, help, metric, label)
+
+    def render(self):
+        """Returns all metrics in the Prometheus text format"""
+        lines = []
+        for name, help, kind, label, metric in self._metrics:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                children = metric.snapshot() if isinstance(metric, HistogramFamily) else {None: metric.snapshot()}
+                for value, snapshot in children.items():
+                    lines.extend(_histogram_lines(name, _labels(label, value), snapshot))
+                continue
+
+            values = metric() if callable(metric) else metric.snapshot()
+            if not isinstance(values, dict):
+                values = {None: values}
+            for value, number in values.items():
+                if number is not None:
+                    lines.append(f"{name}{_labels(label, value)} {_number(number)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(label, value):
+    """Formats a label set, e.g. {stage="generation"}"""
+    return f'{{{label}="{_escape(value)}"}}' if label and value is not None else ""
+
+
+def _number(number):
+    """Formats a sample value: integers exactly, floats with repr so no digits are lost"""
+    if isinstance(number, numbers.Integral):
+        return str(int(number))
+    number = float(number)
+    if math.isnan(number):
+        return "NaN"
+    if math.isinf(number):
+        return "+Inf" if number > 0 else "-Inf"
+    return repr(number)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(name, labels, snapshot):
+    """Formats a Histogram snapshot as _bucket, _sum and _count samples"""
+    inner = labels[1:-1] + "," if labels else ""
+    lines = [f'{name}_bucket{{{inner}le="{bound}"}} {count}' for bound, count in snapshot["buckets"].items()]
+    lines.append(f"{name}_sum{labels} {snapshot['sum']}")
+    lines.append(f"{name}_count{labels} {snapshot['count']}")
+    return lines
+
+
+def process_memory_mb(pid="self"):
+    """
+    Returns the memory breakdown of a process in MB from /proc/<pid>/smaps_rollup.
+
+    Private memory is what the process alone pays for; shared memory (e.g.
+    memory-mapped weights) is counted once per node no matter how many
+    processes map it. Returns None where smaps_rollup is unavailable.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        return None
+    return {
+        "rss_mb": round(fields.get("Rss", 0), 1),
+        "pss_mb": round(fields.get("Pss", 0), 1),
+        "private_mb": round(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0), 1),
+        "shared_mb": round(fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0), 1),
+    }
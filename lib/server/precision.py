@@ -0,0 +1,83 @@
+import io
+import os
+import resource
+
+import jax
+import numpy as np
+import torch
+
+
+def resident_memory_mb():
+    """Returns the resident set size of this process in MB"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Peak RSS as fallback (KB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if os.uname().sysname == "Darwin" else peak / 1024
+
+
+def torch_model_mb(model):
+    """Returns the serialized size of a torch model's state in MB"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+def flax_params_mb(params):
+    """Returns the size of a Flax parameter tree in MB"""
+    return sum(leaf.nbytes for leaf in jax.tree_util.tree_leaves(params)) / (1024 * 1024)
+
+
+def quantize_linear_int8(model):
+    """Returns a copy of a torch model with dynamically int8-quantized linear layers"""
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def cast_params_bf16(model, params):
+    """Returns the parameters of a Flax model cast to bfloat16"""
+    return model.to_bf16(params)
+
+
+def embedding_drift(reference, reduced):
+    """
+    Compares embeddings row by row.
+
+    Returns:
+        dict: Mean and worst cosine similarity between reference and reduced rows
+    """
+    reference = np.asarray(reference, dtype=np.float32)
+    reduced = np.asarray(reduced, dtype=np.float32)
+    norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(reduced, axis=1)
+    cosine = np.sum(reference * reduced, axis=1) / np.maximum(norms, 1e-12)
+    return {"mean_cosine": float(cosine.mean()), "min_cosine": float(cosine.min())}
+
+
+def selection_agreement(reference, reduced, select, trials=50, required=2, candidates=60, num_to_add=5, seed=0):
+    """
+    Runs the same random selection problems on both embedding sets.
+
+    Args:
+        reference (np.ndarray): fp32 embeddings
+        reduced (np.ndarray): Reduced-precision embeddings of the same texts
+        select (callable): select(required_matrix, candidate_matrix, num_to_add) -> list of rows
+
+    Returns:
+        float: Share of trials with identical selections and order
+    """
+    rng = np.random.default_rng(seed)
+    count = len(reference)
+    if count < required + num_to_add:
+        return None
+    candidates = min(candidates, count - required)
+
+    same = 0
+    for _ in range(trials):
+        rows = rng.choice(count, required + candidates, replace=False)
+        req, cand = rows[:required], rows[required:]
+        same += select(reference[req], reference[cand], num_to_add) == select(reduced[req], reduced[cand], num_to_add)
+    return same / trials
@@ -0,0 +1,87 @@
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecipeCache:
+    """
+    LRU cache of validated recipes keyed on ingredient set and generation settings.
+
+    Each key collects up to `variants` recipes. Until that many are stored,
+    lookups miss so new recipes keep being generated; afterwards the stored
+    recipes are served in turn (or at random) to keep some variety. Recipes
+    expire ttl_seconds after they were generated.
+    """
+
+    def __init__(self, max_size=1024, ttl_seconds=3600, variants=3, policy="round_robin"):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.variants = variants
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(ingredients, params):
+        """Builds a cache key from the ingredient set and generation parameters"""
+        names = sorted({" ".join(name.split()).lower() for name in ingredients})
+        return json.dumps([names, params], sort_keys=True)
+
+    def get(self, key):
+        """Returns a copy of a cached recipe, or None if the key is missing or not yet full"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["recipes"] = [r for r in entry["recipes"] if now - r["created"] <= self.ttl_seconds]
+                if not entry["recipes"]:
+                    del self._entries[key]
+                    entry = None
+
+            if entry is None or len(entry["recipes"]) < self.variants:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            if self.policy == "random":
+                cached = random.choice(entry["recipes"])
+            else:
+                cached = entry["recipes"][entry["next"] % len(entry["recipes"])]
+                entry["next"] += 1
+            self.hits += 1
+            self.seconds_saved += cached["seconds"]
+            return dict(cached["recipe"])
+
+    def put(self, key, recipe, seconds):
+        """
+        Stores a recipe under key.
+
+        Args:
+            key (str): Key from make_key
+            recipe (dict): The validated recipe
+            seconds (float): Time it took to generate, counted as saved on each hit
+        """
+        with self._lock:
+            entry = self._entries.setdefault(key, {"recipes": [], "next": 0})
+            entry["recipes"].append({"recipe": dict(recipe), "seconds": seconds, "created": time.time()})
+            del entry["recipes"][:-self.variants]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Returns size, hit ratio and generation time saved"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "seconds_saved": round(self.seconds_saved, 3),
+        }
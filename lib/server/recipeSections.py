@@ -0,0 +1,46 @@
+class RecipeSectionParser:
+    """
+    Incrementally extracts recipe parts from post-processed T5 output.
+
+    Sections are separated by newlines and items within a section by "--"
+    (the tokens_map rules). An item counts as complete once the separator
+    after it has been generated, or when the text is final.
+    """
+
+    SECTIONS = {"title:": "title", "ingredients:": "ingredient", "directions:": "direction"}
+
+    def __init__(self):
+        self._emitted = {}
+
+    def feed(self, text, final=False):
+        """
+        Returns the parts that became complete since the last call.
+
+        Args:
+            text (str): Complete post-processed output so far
+            final (bool): True once generation has finished
+
+        Returns:
+            list: (kind, index, value) tuples with kind "title", "ingredient" or "direction"
+        """
+        events = []
+        sections = text.split("\n")
+        for position, section in enumerate(sections):
+            section_complete = final or position < len(sections) - 1
+            section = section.strip()
+            for prefix, kind in self.SECTIONS.items():
+                if not section.startswith(prefix):
+                    continue
+                body = section.replace(prefix, "").strip()
+                if kind == "title":
+                    items = [body] if section_complete and body else []
+                else:
+                    items = body.split("--")
+                    if not section_complete:
+                        items = items[:-1]
+                    items = [item for item in items if item.strip()]
+
+                for index in range(self._emitted.get(kind, 0), len(items)):
+                    events.append((kind, index, items[index].strip().capitalize()))
+                self._emitted[kind] = max(self._emitted.get(kind, 0), len(items))
+        return events
@@ -0,0 +1,252 @@
+import contextvars
+import cProfile
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+# True while the current request is profiled; batched and pipelined work then
+# runs in the request thread, so the profile contains all of it
+profiling = contextvars.ContextVar("profiling", default=False)
+
+# Files a stored profile may contain
+PROFILE_FILES = ("meta.json", "payload.json", "stacks.txt", "profile.pstats", "torch_trace.json", "jax_trace.zip")
+
+# Creation time to the microsecond and a random suffix, so ids sort by age
+PROFILE_ID = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9]{6}-[0-9a-f]{8}$")
+
+
+class StackSampler:
+    """
+    Samples the Python stack of one thread at a fixed interval.
+
+    The samples are counted per stack and written in the collapsed format
+    ("outer;inner count" per line) that flamegraph.pl and speedscope read.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def collapsed(self):
+        """Returns the samples as collapsed stacks, most frequent first"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileSession:
+    """
+    Profiles of one request: cProfile, stack samples and optional torch and JAX traces.
+
+    Must be started and stopped in the thread that handles the request.
+    """
+
+    def __init__(self, profile_id, directory, payload, request_id=None, interval=0.005, traces=()):
+        self.profile_id = profile_id
+        self.directory = directory
+        self.payload = payload
+        self.request_id = request_id
+        self.traces = set(traces)
+        self.started = None
+        self.finished = False
+        self._profile = cProfile.Profile()
+        self._sampler = StackSampler(threading.get_ident(), interval)
+        self._torch_profile = None
+        self._jax_dir = None
+        self._token = None
+        self.trace_errors = {}
+
+    def _start_jax(self):
+        import jax
+        jax_dir = os.path.join(self.directory, "jax_trace")
+        jax.profiler.start_trace(jax_dir)
+        self._jax_dir = jax_dir
+
+    def _start_torch(self):
+        import torch
+        torch_profile = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU])
+        torch_profile.__enter__()
+        self._torch_profile = torch_profile
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # A trace that cannot start (e.g. one already running) is skipped, the Python profiles still work
+        for name, start in (("jax", self._start_jax), ("torch", self._start_torch)):
+            if name in self.traces:
+                try:
+                    start()
+                except Exception as e:
+                    self.trace_errors[name] = f"{type(e).__name__}: {e}"
+        self._token = profiling.set(True)
+        self.started = time.perf_counter()
+        self._sampler.start()
+        self._profile.enable()
+
+    def stop(self, status=None):
+        """Stops all profilers and writes the files (only the first call has an effect)"""
+        if self.finished:
+            return
+        self.finished = True
+        self._profile.disable()
+        self._sampler.stop()
+        duration = time.perf_counter() - self.started
+        profiling.reset(self._token)
+        if self._torch_profile is not None:
+            self._torch_profile.__exit__(None, None, None)
+            self._torch_profile.export_chrome_trace(os.path.join(self.directory, "torch_trace.json"))
+        if self._jax_dir is not None:
+            import jax
+            jax.profiler.stop_trace()
+            shutil.make_archive(os.path.join(self.directory, "jax_trace"), "zip", self._jax_dir)
+            shutil.rmtree(self._jax_dir, ignore_errors=True)
+
+        self._profile.dump_stats(os.path.join(self.directory, "profile.pstats"))
+        with open(os.path.join(self.directory, "stacks.txt"), "w", encoding="utf-8") as f:
+            f.write(self._sampler.collapsed())
+        with open(os.path.join(self.directory, "payload.json"), "w", encoding="utf-8") as f:
+            json.dump(self.payload, f)
+        meta = {
+            "id": self.profile_id,
+            "request_id": self.request_id,
+            "created": time.time(),
+            "duration_seconds": round(duration, 6),
+            "status": status,
+            "samples": sum(self._sampler.stacks.values()),
+            "sample_interval_seconds": self._sampler.interval,
+            "trace_errors": self.trace_errors or None,
+        }
+        meta["files"] = [name for name in PROFILE_FILES if name == "meta.json"
+                         or os.path.exists(os.path.join(self.directory, name))]
+        with open(os.path.join(self.directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+
+class RequestProfiler:
+    """
+    Decides which requests are profiled and keeps the stored profiles.
+
+    Requests are profiled when they ask for it or while arm(n) has requests
+    left. Only one request is profiled at a time, since the torch and JAX
+    profilers are process wide; others run unprofiled meanwhile. The oldest
+    profiles are deleted beyond max_stored.
+    """
+
+    def __init__(self, directory, max_stored=20, interval=0.005, traces=()):
+        self.directory = directory
+        self.max_stored = max_stored
+        self.interval = interval
+        self.traces = tuple(traces)
+        self.armed = 0
+        self.captured = 0
+        self.skipped = 0
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+
+    def arm(self, count):
+        """Profiles the next count requests (0 disarms)"""
+        with self._lock:
+            self.armed = max(int(count), 0)
+        return self.armed
+
+    def start(self, requested, payload, request_id=None):
+        """
+        Starts a session if the request asked for one or requests are armed.
+
+        Returns:
+            ProfileSession: The running session, or None
+        """
+        if not requested and not self.armed:
+            return None
+        if not self._busy.acquire(blocking=False):
+            self.skipped += 1
+            return None
+        with self._lock:
+            if not requested:
+                if not self.armed:
+                    self._busy.release()
+                    return None
+                self.armed -= 1
+
+        now = time.time()
+        created = time.strftime('%Y%m%d-%H%M%S', time.localtime(now))
+        profile_id = f"{created}-{int(now % 1 * 1e6):06d}-{uuid.uuid4().hex[:8]}"
+        session = ProfileSession(profile_id, os.path.join(self.directory, profile_id), payload, request_id,
+                                 self.interval, self.traces)
+        try:
+            session.start()
+        except Exception:
+            self._busy.release()
+            raise
+        return session
+
+    def finish(self, session, status=None):
+        """Stops a session, stores its files and drops the oldest profiles"""
+        if session.finished:
+            return
+        try:
+            session.stop(status)
+            self.captured += 1
+        finally:
+            self._busy.release()
+        self._prune()
+
+    def _prune(self):
+        for profile_id in self.list_ids()[self.max_stored:]:
+            shutil.rmtree(os.path.join(self.directory, profile_id), ignore_errors=True)
+
+    def list_ids(self):
+        """Returns the ids of the stored profiles, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted((name for name in os.listdir(self.directory) if PROFILE_ID.match(name)), reverse=True)
+
+    def meta(self, profile_id):
+        """Returns the metadata of a stored profile, or None"""
+        path = self.path(profile_id, "meta.json")
+        if path is None:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def path(self, profile_id, name):
+        """Returns the path of a stored profile file, or None for unknown ids and names"""
+        if not PROFILE_ID.match(profile_id) or name not in PROFILE_FILES:
+            return None
+        path = os.path.join(self.directory, profile_id, name)
+        return path if os.path.exists(path) else None
+
+    def stats(self):
+        """Returns the armed, captured and stored profile counts"""
+        return {
+            "armed": self.armed,
+            "captured": self.captured,
+            "skipped": self.skipped,
+            "stored": len(self.list_ids()),
+            "directory": self.directory,
+            "traces": list(self.traces),
+        }
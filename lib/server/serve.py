@@ -0,0 +1,86 @@
+"""
+Production entry point for the recipe server.
+
+Prepares the read-only state once (model weights and ingredient index in
+SHARED_WEIGHTS_DIR) in a separate process, then starts gunicorn workers that
+memory-map it. The master process never imports torch or JAX, so forking the
+workers is safe.
+
+Usage:
+    SHARED_WEIGHTS_DIR=/var/cache/recipe WEB_WORKERS=4 python serve.py
+"""
+import multiprocessing
+import os
+import threading
+import time
+
+from gunicorn.app.base import BaseApplication
+
+from metrics import process_memory_mb
+
+WEB_BIND = os.environ.get("WEB_BIND", "0.0.0.0:8000")
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", 2))
+WEB_THREADS = int(os.environ.get("WEB_THREADS", 8))
+WEB_TIMEOUT = int(os.environ.get("WEB_TIMEOUT", 300))
+MEMORY_REPORT_INTERVAL = int(os.environ.get("MEMORY_REPORT_INTERVAL", 60))
+
+
+def prepare_shared_state():
+    """Exports weights and index to SHARED_WEIGHTS_DIR (runs in a spawned process)"""
+    os.environ["DEFER_MODEL_LOADING"] = "1"
+    import backendServer
+    backendServer.export_shared_state()
+
+
+def report_worker_memory(server):
+    """Logs the memory breakdown of every worker periodically"""
+    while True:
+        time.sleep(MEMORY_REPORT_INTERVAL)
+        for pid in list(server.WORKERS):
+            memory = process_memory_mb(pid)
+            if memory:
+                server.log.info(f"Worker {pid} memory: {memory}")
+
+
+def when_ready(server):
+    """gunicorn hook: starts the memory report once the master is up"""
+    if MEMORY_REPORT_INTERVAL > 0:
+        threading.Thread(target=report_worker_memory, args=(server,), daemon=True).start()
+
+
+class RecipeServer(BaseApplication):
+    """gunicorn application that imports the Flask app inside each worker"""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from backendServer import app
+        return app
+
+
+if __name__ == '__main__':
+    if not os.environ.get("SHARED_WEIGHTS_DIR"):
+        raise SystemExit("SHARED_WEIGHTS_DIR must be set")
+
+    # Spawn (not fork) keeps torch and JAX out of the master process
+    process = multiprocessing.get_context("spawn").Process(target=prepare_shared_state)
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise SystemExit("Preparing the shared state failed")
+
+    RecipeServer({
+        "bind": WEB_BIND,
+        "workers": WEB_WORKERS,
+        "worker_class": "gthread",
+        "threads": WEB_THREADS,
+        "timeout": WEB_TIMEOUT,
+        "preload_app": False,
+        "when_ready": when_ready,
+    }).run()
@@ -0,0 +1,73 @@
+import json
+import os
+
+import jax
+import numpy as np
+import torch
+from flax.core import unfreeze
+from flax.traverse_util import flatten_dict, unflatten_dict
+from transformers.modeling_utils import no_init_weights
+
+
+def save_torch_state(model, path):
+    """Saves a torch model's state dict in a format that can be memory-mapped"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    torch.save(model.state_dict(), path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def load_torch_model_mmap(build_model, path):
+    """
+    Builds a torch model whose weights are memory-mapped from a saved state dict.
+
+    The weights stay backed by the page cache, so every process that loads the
+    same file shares them as long as nobody writes to them.
+
+    Args:
+        build_model (callable): Returns the model architecture (weights are not initialized)
+        path (str): File written by save_torch_state
+
+    Returns:
+        torch.nn.Module: The model in eval mode
+    """
+    with no_init_weights():
+        model = build_model()
+    state = torch.load(path, mmap=True, weights_only=True)
+    model.load_state_dict(state, assign=True)
+    return model.eval()
+
+
+def save_flax_params(params, directory):
+    """Saves a Flax parameter tree as one .npy file per leaf plus an index of key paths"""
+    os.makedirs(directory, exist_ok=True)
+    flat = flatten_dict(unfreeze(params))
+    keys = []
+    for i, (key, value) in enumerate(flat.items()):
+        np.save(os.path.join(directory, f"{i}.npy"), np.asarray(value))
+        keys.append(list(key))
+    with open(os.path.join(directory, "index.json.tmp"), "w", encoding="utf-8") as f:
+        json.dump(keys, f)
+    os.replace(os.path.join(directory, "index.json.tmp"), os.path.join(directory, "index.json"))
+
+
+def load_flax_params_mmap(directory):
+    """
+    Loads a parameter tree written by save_flax_params with memory-mapped leaves.
+
+    On CPU, JAX can use suitably aligned host buffers without copying them,
+    in which case the weights are shared across processes via the page cache.
+    """
+    with open(os.path.join(directory, "index.json"), "r", encoding="utf-8") as f:
+        keys = json.load(f)
+    flat = {
+        tuple(key): jax.device_put(np.load(os.path.join(directory, f"{i}.npy"), mmap_mode="r"))
+        for i, key in enumerate(keys)
+    }
+    return unflatten_dict(flat)
+
+
+def has_flax_params(directory):
+    """Returns True if directory contains params written by save_flax_params"""
+    return os.path.exists(os.path.join(directory, "index.json"))
@@ -0,0 +1,227 @@
+import contextvars
+import os
+import queue
+import threading
+import time
+
+from admissionControl import DeadlineExceeded, check_deadline
+from metrics import HistogramFamily
+
+
+def parse_cpu_list(text):
+    """
+    Parses a CPU list such as "0-3,8".
+
+    Returns:
+        set: CPU numbers, or None for an empty list
+    """
+    cpus = set()
+    for part in (text or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus or None
+
+
+def pin_current_thread(cpus):
+    """
+    Restricts the calling thread to a set of CPUs (Linux only).
+
+    Threads started afterwards by this thread inherit the restriction, which
+    includes the intra-op pools torch and XLA create on first use.
+
+    Returns:
+        bool: Whether the affinity was set
+    """
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return False
+    os.sched_setaffinity(0, cpus)
+    return True
+
+
+class Completed:
+    """Returned by a stage to finish a task early; the remaining stages are skipped"""
+
+    def __init__(self, result):
+        self.result = result
+
+
+class _Task:
+    """Payload travelling through the stages and the slot for its result"""
+
+    def __init__(self, payload, deadline, on_exit=None):
+        self.payload = payload
+        # Stages run in the caller's context, so log lines keep its request id
+        self.context = contextvars.copy_context()
+        self.deadline = deadline
+        self.enqueued = time.perf_counter()
+        self.cancelled = False
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.on_exit = on_exit
+
+    def exit(self):
+        """Called once the task has left the pipeline, finished or dropped"""
+        if self.on_exit is not None:
+            self.on_exit()
+
+
+class StageExecutor:
+    """
+    Pool of worker threads that runs one pipeline stage.
+
+    Workers take tasks from the stage's queue, pass their payload through fn
+    and hand the return value to the next stage. Queue wait and service time
+    are observed per task; busy_seconds over the elapsed time of all workers
+    gives the utilization of the stage.
+    """
+
+    def __init__(self, name, fn, workers=1, cpus=None, wait_seconds=None, service_seconds=None):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.cpus = cpus
+        self.wait_seconds = wait_seconds
+        self.service_seconds = service_seconds
+        self.next = None
+        self.busy_seconds = 0.0
+        self.processed = 0
+        self.active = 0
+        self.started = time.perf_counter()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f"{name}-stage-{i}", daemon=True).start()
+
+    def put(self, task):
+        """Queues a task for this stage"""
+        task.enqueued = time.perf_counter()
+        self._queue.put(task)
+
+    def depth(self):
+        """Number of queued tasks"""
+        return self._queue.qsize()
+
+    def _finish(self, task, result=None, error=None):
+        task.result, task.error = result, error
+        task.done.set()
+        task.exit()
+
+    def _run(self):
+        pin_current_thread(self.cpus)
+        while True:
+            task = self._queue.get()
+            started = time.perf_counter()
+            if self.wait_seconds is not None:
+                self.wait_seconds.observe(started - task.enqueued)
+            if task.cancelled:
+                task.exit()
+                continue
+            try:
+                check_deadline(task.deadline, self.name)
+            except DeadlineExceeded as e:
+                self._finish(task, error=e)
+                continue
+
+            with self._lock:
+                self.active += 1
+            try:
+                output, error = task.context.run(self.fn, task.payload), None
+            except Exception as e:
+                output, error = None, e
+            finally:
+                duration = time.perf_counter() - started
+                with self._lock:
+                    self.active -= 1
+                    self.busy_seconds += duration
+                    self.processed += 1
+                if self.service_seconds is not None:
+                    self.service_seconds.observe(duration)
+
+            if error is not None:
+                self._finish(task, error=error)
+            elif isinstance(output, Completed):
+                self._finish(task, output.result)
+            elif self.next is None:
+                self._finish(task, output)
+            else:
+                task.payload = output
+                self.next.put(task)
+
+    def utilization(self):
+        """Share of the workers' time spent running tasks since the stage started"""
+        elapsed = (time.perf_counter() - self.started) * self.workers
+        return self.busy_seconds / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        """Returns pool size, queue depth, utilization and the wait and service time histograms"""
+        with self._lock:
+            stats = {
+                "workers": self.workers,
+                "cpus": sorted(self.cpus) if self.cpus else None,
+                "queued": self.depth(),
+                "active": self.active,
+                "processed": self.processed,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "utilization": round(self.utilization(), 4),
+            }
+        stats["wait_seconds"] = self.wait_seconds.snapshot() if self.wait_seconds is not None else None
+        stats["service_seconds"] = self.service_seconds.snapshot() if self.service_seconds is not None else None
+        return stats
+
+
+class StagePipeline:
+    """
+    Chain of StageExecutors connected by queues.
+
+    Each stage has its own worker pool, so while one task is in a later stage
+    the next task can already run in an earlier one. A stage may return
+    Completed(result) to skip the rest of the chain.
+    """
+
+    WAIT_BOUNDS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+    SERVICE_BOUNDS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+    def __init__(self, stages):
+        """
+        Args:
+            stages (list): (name, fn, workers, cpus) per stage, in order
+        """
+        self.wait_seconds = HistogramFamily(self.WAIT_BOUNDS)
+        self.service_seconds = HistogramFamily(self.SERVICE_BOUNDS)
+        self.stages = [
+            StageExecutor(name, fn, workers, cpus, self.wait_seconds.labels(name), self.service_seconds.labels(name))
+            for name, fn, workers, cpus in stages
+        ]
+        for stage, following in zip(self.stages, self.stages[1:]):
+            stage.next = following
+
+    def run(self, payload, deadline=None, on_exit=None):
+        """
+        Passes payload through all stages and blocks until the result is ready.
+
+        A task given up at its deadline keeps running until it reaches the next
+        stage; on_exit is called once it has left the pipeline, which for such a
+        task is after run has raised (e.g. to hold a concurrency slot until then).
+
+        Raises:
+            DeadlineExceeded: If the deadline passes before the last stage finishes
+                (the task is dropped once it reaches the next stage)
+            Exception: Whatever a stage raised
+        """
+        task = _Task(payload, deadline, on_exit)
+        self.stages[0].put(task)
+        timeout = None if deadline is None else max(deadline.remaining(), 0)
+        if not task.done.wait(timeout):
+            task.cancelled = True
+            raise DeadlineExceeded(f"Deadline of {deadline.seconds:g}s exceeded in the pipeline")
+        if task.error is not None:
+            raise task.error
+        return task.result
+
+    def stats(self):
+        """Returns the statistics of every stage by name"""
+        return {stage.name: stage.stats() for stage in self.stages}
@@ -0,0 +1,79 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from structuredLog import get_logger, log_event
+
+logger = get_logger("startup")
+
+
+class StartupManager:
+    """
+    Runs model loading tasks in parallel background threads and tracks readiness.
+
+    Each task records the duration of its phases (e.g. download, deserialize,
+    warmup). The server counts as ready once all tasks finished without error.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.errors = {}
+        self.ready = threading.Event()
+        self.finished = threading.Event()
+        self.started = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, task, name):
+        """Times a phase of a task"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.timings.setdefault(task, {})[name] = round(time.perf_counter() - start, 3)
+
+    def start(self, tasks):
+        """
+        Starts all tasks in their own threads and returns immediately.
+
+        Args:
+            tasks (dict): Task name -> function without arguments
+        """
+        self.started = time.time()
+        threads = [
+            threading.Thread(target=self._run_task, args=(name, task), name=f"startup-{name}", daemon=True)
+            for name, task in tasks.items()
+        ]
+        for thread in threads:
+            thread.start()
+        threading.Thread(target=self._wait, args=(threads,), name="startup", daemon=True).start()
+
+    def _run_task(self, name, task):
+        try:
+            task()
+        except Exception as e:
+            log_event(logger, logging.ERROR, "Startup task failed", task=name, error=str(e))
+            with self._lock:
+                self.errors[name] = str(e)
+
+    def _wait(self, threads):
+        for thread in threads:
+            thread.join()
+        self.finished.set()
+        if not self.errors:
+            self.ready.set()
+            log_event(logger, logging.INFO, "Startup complete",
+                      seconds=round(time.time() - self.started, 1), timings=self.timings)
+
+    def status(self):
+        """Returns readiness, per-phase timings and errors"""
+        with self._lock:
+            return {
+                "ready": self.ready.is_set(),
+                "finished": self.finished.is_set(),
+                "seconds_since_start": round(time.time() - self.started, 3) if self.started else None,
+                "timings": {task: dict(phases) for task, phases in self.timings.items()},
+                "errors": dict(self.errors),
+            }
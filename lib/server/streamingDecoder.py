@@ -0,0 +1,125 @@
+import logging
+import random
+import time
+
+import jax
+import jax.numpy as jnp
+
+from structuredLog import get_logger, log_event
+
+logger = get_logger("streaming")
+
+
+class StreamingDecoder:
+    """
+    Token-by-token sampling loop for a Flax T5 model.
+
+    Mirrors the settings of generate (min_length, top_k, top_p sampling) but
+    yields every token as soon as it is sampled. The encoder runs once and the
+    decoder reuses its key/value cache, one jitted step per token. params
+    defaults to model.params (must be given for models built with _do_init=False).
+    """
+
+    def __init__(self, model, generation_kwargs, params=None):
+        self.model = model
+        self.params = params if params is not None else model.params
+        self.max_length = generation_kwargs.get("max_length", 512)
+        self.min_length = generation_kwargs.get("min_length", 0)
+        self.top_k = generation_kwargs.get("top_k", 50)
+        self.top_p = generation_kwargs.get("top_p", 1.0)
+        self.eos_token_id = model.config.eos_token_id
+        self.decoder_start_token_id = model.config.decoder_start_token_id
+        self._initial_cache = {}
+        self.warmup_seconds = 0.0
+        self._encode = jax.jit(self._encode_inputs)
+        self._step = jax.jit(self._decode_step)
+
+    def _encode_inputs(self, params, input_ids, attention_mask):
+        return self.model.encode(input_ids=input_ids, attention_mask=attention_mask, params=params).last_hidden_state
+
+    def _decode_step(self, params, token, past_key_values, encoder_hidden_states, attention_mask, cur_len, prng_key):
+        """Runs the decoder for one token and samples the next one"""
+        outputs = self.model.decode(
+            token,
+            (encoder_hidden_states,),
+            encoder_attention_mask=attention_mask,
+            decoder_attention_mask=jnp.ones((1, self.max_length), dtype="i4"),
+            past_key_values=past_key_values,
+            params=params
+        )
+        logits = outputs.logits[0, -1, :]
+
+        # No end of sequence before min_length, as in generate
+        is_eos = jnp.arange(logits.shape[-1]) == self.eos_token_id
+        logits = jnp.where(is_eos & (cur_len < self.min_length), -jnp.inf, logits)
+
+        # Top-k, then top-p (nucleus) filtering
+        top_logits, top_ids = jax.lax.top_k(logits, self.top_k)
+        probs = jax.nn.softmax(top_logits)
+        keep = jnp.cumsum(probs) - probs < self.top_p
+        top_logits = jnp.where(keep, top_logits, -jnp.inf)
+
+        choice = jax.random.categorical(prng_key, top_logits)
+        return top_ids[choice], outputs.past_key_values
+
+    def _get_initial_cache(self, encoder_hidden_states):
+        """Returns an empty decoder cache for the encoder output shape"""
+        key = encoder_hidden_states.shape
+        if key not in self._initial_cache:
+            self._initial_cache[key] = self.model.init_cache(1, self.max_length, (encoder_hidden_states,))
+        return self._initial_cache[key]
+
+    def warmup(self, buckets):
+        """
+        Compiles the encoder and decode step and builds the initial cache for every input bucket.
+
+        Runs one single-token stream per bucket, so the first request of a
+        bucket (streamed or early-exit) does not compile in its own path.
+        """
+        for bucket in buckets:
+            start = time.perf_counter()
+            input_ids = jnp.full((1, bucket), self.eos_token_id, dtype="i4")
+            for _ in self.stream(input_ids, jnp.ones((1, bucket), dtype="i4"), jax.random.PRNGKey(0), max_length=2):
+                pass
+            elapsed = time.perf_counter() - start
+            self.warmup_seconds += elapsed
+            log_event(logger, logging.INFO, "Compiled T5 streaming decoder", bucket=bucket, seconds=round(elapsed, 1))
+
+    def stats(self):
+        """Returns the input shapes compiled so far and the time spent warming them up"""
+        return {
+            "compiled_shapes": [f"{batch_size}x{length}" for batch_size, length, _ in sorted(self._initial_cache)],
+            "compile_count": len(self._initial_cache),
+            "warmup_seconds": round(self.warmup_seconds, 3),
+        }
+
+    def stream(self, input_ids, attention_mask, prng_key=None, max_length=None):
+        """
+        Samples tokens for a single prompt.
+
+        Args:
+            input_ids (np.ndarray): Encoded prompt (1 x length)
+            attention_mask (np.ndarray): Attention mask of the prompt
+            prng_key: JAX random key for sampling (a fresh key by default)
+            max_length (int): Stop earlier than the configured max_length
+
+        Yields:
+            int: Each generated token id, ending with the end of sequence token
+        """
+        if prng_key is None:
+            prng_key = jax.random.PRNGKey(random.getrandbits(31))
+
+        encoder_hidden_states = self._encode(self.params, input_ids, attention_mask)
+        past_key_values = self._get_initial_cache(encoder_hidden_states)
+        token = jnp.array([[self.decoder_start_token_id]], dtype="i4")
+
+        for cur_len in range(1, min(max_length or self.max_length, self.max_length)):
+            prng_key, step_key = jax.random.split(prng_key)
+            next_token, past_key_values = self._step(
+                self.params, token, past_key_values, encoder_hidden_states, attention_mask, cur_len, step_key
+            )
+            next_token = int(next_token)
+            yield next_token
+            if next_token == self.eos_token_id:
+                break
+            token = jnp.array([[next_token]], dtype="i4")
@@ -0,0 +1,58 @@
+import contextvars
+import json
+import logging
+import sys
+
+# Id of the request handled by the current thread (set by the Flask before_request hook)
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line with the request id and the
+    fields passed as extra={"fields": {...}}.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        current = request_id.get()
+        if current is not None:
+            entry["request_id"] = current
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level="INFO", json_format=True):
+    """Sends all recipe server logs to stderr, as JSON lines unless json_format is False"""
+    handler = logging.StreamHandler(sys.stderr)
+    if json_format:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger = logging.getLogger("recipe")
+    logger.handlers[:] = [handler]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+
+def get_logger(name):
+    """Returns a logger below the "recipe" logger configured by configure_logging"""
+    return logging.getLogger(f"recipe.{name}")
+
+
+def log_event(logger, level, message, **fields):
+    """
+    Logs message with structured fields.
+
+    The level check comes first, so disabled levels cost one comparison and
+    neither the message nor the fields are formatted.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"fields": fields})
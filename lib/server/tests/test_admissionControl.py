@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+from admissionControl import AdmissionController, AdmissionSlot, Deadline, DeadlineExceeded, check_deadline
+
+
+def test_deadline_check():
+    check_deadline(None, "generation")
+    Deadline(60).check("generation")
+    with pytest.raises(DeadlineExceeded, match="before generation"):
+        Deadline(-1).check("generation")
+
+
+def test_rejects_beyond_the_queue():
+    admission = AdmissionController(max_concurrent=1, max_queue=0)
+    assert admission.acquire() == "admitted"
+    assert admission.acquire(Deadline(1)) == "rejected"
+    assert admission.stats()["rejected"] == 1
+
+
+def test_waiting_request_times_out_at_its_deadline():
+    admission = AdmissionController(max_concurrent=1, max_queue=1)
+    admission.acquire()
+    assert admission.acquire(Deadline(0.05)) == "timeout"
+    assert admission.stats()["waiting"] == 0 and admission.stats()["timed_out"] == 1
+
+
+def test_waiting_request_gets_a_released_slot():
+    admission = AdmissionController(max_concurrent=1, max_queue=1)
+    admission.acquire()
+    threading.Timer(0.05, admission.release).start()
+    assert admission.acquire(Deadline(5)) == "admitted"
+    assert admission.stats()["running"] == 1
+
+
+def test_unbounded_waiters_are_not_rejected():
+    admission = AdmissionController(max_concurrent=1, max_queue=0)
+    admission.acquire()
+    threading.Timer(0.05, admission.release).start()
+    assert admission.acquire(Deadline(5), reject=False) == "admitted"
+
+
+def test_pressure_follows_the_queue():
+    admission = AdmissionController(max_concurrent=1, max_queue=2)
+    admission.acquire()
+    assert admission.pressure() == 0.0
+    waiter = threading.Thread(target=admission.acquire, args=(Deadline(5),))
+    waiter.start()
+    while admission.stats()["waiting"] == 0:
+        time.sleep(0.01)
+    assert admission.pressure() == 0.5
+    admission.release()
+    waiter.join()
+    admission.release()
+
+
+def test_slot_is_freed_by_the_last_holder():
+    admission = AdmissionController(max_concurrent=1)
+    admission.acquire()
+    slot = AdmissionSlot(admission)
+    slot.hold()
+    slot.release()
+    assert admission.stats()["running"] == 1
+    slot.release()
+    assert admission.stats()["running"] == 0
@@ -0,0 +1,33 @@
+import os
+
+from ingredientIndex import load_catalog
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "ingriedientsData.dart")
+
+
+def test_load_catalog_parses_names_in_order(tmp_path):
+    path = tmp_path / "ingredients.dart"
+    path.write_text('''
+final List<Map<String, dynamic>> ingredientCategories = [
+  {
+    "name": "Vegetables",
+    "ingredients": [
+      "Tomato", "Bell Pepper", // Peppers
+      "Jalapeño",
+    ]
+  },
+  {
+    "name": "Spices",
+    "ingredients": ["Salt", "Tomato", ""]
+  },
+];
+''', encoding="utf-8")
+    assert load_catalog(str(path)) == ["Tomato", "Bell Pepper", "Jalapeño", "Salt"]
+
+
+def test_load_catalog_reads_the_app_catalog():
+    names = load_catalog(CATALOG_PATH)
+    assert len(names) > 100
+    assert len(names) == len(set(names))
+    assert "Tomato" in names
+    assert not any(name in ("Vegetables", "name", "ingredients") for name in names)
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from compatibilityMatrix import CompatibilityMatrix
+from ingredientIndex import IngredientIndex
+from ingredientSelection import select_ingredients, select_ingredients_compat
+
+CASES = 300
+
+
+def cosine(a, b):
+    norm = np.linalg.norm(a) * np.linalg.norm(b)
+    return 0.0 if norm == 0 else float(np.dot(a, b) / norm)
+
+
+def baseline_select(required, candidates, num_to_add, avg_weight=0.6):
+    """The original greedy loop: rescore every candidate against the whole combination per step"""
+    final = list(required)
+    available = list(enumerate(candidates))
+    selected = []
+    for _ in range(num_to_add):
+        average = np.mean(final, axis=0)
+        scored = []
+        for position, vector in available:
+            individual = sum(cosine(chosen, vector) for chosen in final) / len(final)
+            scored.append((position, vector, avg_weight * cosine(average, vector) + (1 - avg_weight) * individual))
+        scored.sort(key=lambda item: item[2], reverse=True)
+        position, vector, _ = scored[0]
+        selected.append(position)
+        final.append(vector)
+        available = [item for item in available if item[0] != position]
+    return selected
+
+
+def random_case(rng, size):
+    required = list(rng.choice(size, rng.integers(1, 4), replace=False))
+    candidates = [row for row in rng.choice(size, rng.integers(5, 40), replace=False) if row not in required]
+    return required, candidates, int(rng.integers(1, min(6, len(candidates)) + 1))
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    rng = np.random.default_rng(0)
+    # Clustered vectors of varying norms, like ingredient embeddings
+    centers = rng.normal(size=(12, 32))
+    vectors = centers[rng.integers(0, 12, 400)] + 0.8 * rng.normal(size=(400, 32))
+    return vectors * rng.uniform(0.5, 2.0, (400, 1))
+
+
+def test_select_ingredients_matches_baseline(vectors):
+    rng = np.random.default_rng(1)
+    for _ in range(CASES):
+        required, candidates, num_to_add = random_case(rng, len(vectors))
+        expected = baseline_select(vectors[required], vectors[candidates], num_to_add)
+        assert select_ingredients(vectors[required], vectors[candidates], num_to_add) == expected
+
+
+def test_select_ingredients_compat_matches_baseline(vectors):
+    index = IngredientIndex()
+    index.add([f"ingredient {i}" for i in range(len(vectors))], vectors.astype(np.float32))
+    compat_matrix = CompatibilityMatrix(dtype="float32")
+    compat_matrix.update(index.matrix)
+
+    rng = np.random.default_rng(2)
+    for _ in range(CASES):
+        required, candidates, num_to_add = random_case(rng, len(vectors))
+        expected = baseline_select(index.vectors(required), index.vectors(candidates), num_to_add)
+        assert select_ingredients_compat(compat_matrix, index.norms, required, candidates, num_to_add) == expected
+
+
+def test_selectors_agree_with_penalty(vectors):
+    index = IngredientIndex()
+    index.add([f"ingredient {i}" for i in range(len(vectors))], vectors.astype(np.float32))
+    compat_matrix = CompatibilityMatrix(dtype="float32")
+    compat_matrix.update(index.matrix)
+
+    rng = np.random.default_rng(3)
+    for _ in range(50):
+        required, candidates, num_to_add = random_case(rng, len(vectors))
+        penalty = rng.uniform(0, 0.3, len(candidates)).astype(np.float32)
+        expected = select_ingredients(index.vectors(required), index.vectors(candidates), num_to_add, penalty=penalty)
+        assert select_ingredients_compat(compat_matrix, index.norms, required, candidates, num_to_add,
+                                         penalty=penalty) == expected
+
+
+def test_select_ingredients_never_repeats_a_candidate():
+    # Identical candidates tie on every step; each must still be picked once, in order
+    vectors = np.ones((4, 3))
+    assert select_ingredients(vectors[:1], vectors[1:], 3) == [0, 1, 2]
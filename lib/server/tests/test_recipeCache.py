@@ -0,0 +1,60 @@
+from recipeCache import RecipeCache
+
+
+def recipe(title):
+    return {"title": title, "ingredients": ["salt"], "directions": ["Cook"]}
+
+
+def test_key_ignores_order_case_and_whitespace():
+    params = {"engine": "t5", "max_retries": 5}
+    key = RecipeCache.make_key(["Tomato", "olive  oil"], params)
+    assert key == RecipeCache.make_key(["olive oil", "tomato"], params)
+    assert key != RecipeCache.make_key(["Tomato", "olive  oil"], dict(params, engine="recipenlg"))
+
+
+def test_misses_until_all_variants_are_stored():
+    cache = RecipeCache(variants=2)
+    cache.put("k", recipe("a"), 1.0)
+    assert cache.get("k") is None
+    cache.put("k", recipe("b"), 2.0)
+    assert cache.get("k")["title"] == "a"
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 1
+
+
+def test_round_robin_serves_variants_in_turn():
+    cache = RecipeCache(variants=3)
+    for title in "abc":
+        cache.put("k", recipe(title), 1.0)
+    assert [cache.get("k")["title"] for _ in range(4)] == ["a", "b", "c", "a"]
+    assert cache.stats()["seconds_saved"] == 4.0
+
+
+def test_keeps_only_the_newest_variants():
+    cache = RecipeCache(variants=2)
+    for title in "abc":
+        cache.put("k", recipe(title), 1.0)
+    assert {cache.get("k")["title"] for _ in range(2)} == {"b", "c"}
+
+
+def test_returns_copies():
+    cache = RecipeCache(variants=1)
+    cache.put("k", recipe("a"), 1.0)
+    cache.get("k")["title"] = "changed"
+    assert cache.get("k")["title"] == "a"
+
+
+def test_evicts_least_recently_used_key():
+    cache = RecipeCache(max_size=2, variants=1)
+    cache.put("a", recipe("a"), 1.0)
+    cache.put("b", recipe("b"), 1.0)
+    cache.get("a")
+    cache.put("c", recipe("c"), 1.0)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_expired_recipes_are_dropped():
+    cache = RecipeCache(variants=1, ttl_seconds=-1)
+    cache.put("k", recipe("a"), 1.0)
+    assert cache.get("k") is None
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,29 @@
+from recipeSections import RecipeSectionParser
+
+
+def test_emits_items_once_their_separator_is_generated():
+    parser = RecipeSectionParser()
+    assert parser.feed("title: tomato soup") == []
+    assert parser.feed("title: tomato soup\ningredients: 2 tomatoes-- salt") == [
+        ("title", 0, "Tomato soup"),
+        ("ingredient", 0, "2 tomatoes"),
+    ]
+    assert parser.feed("title: tomato soup\ningredients: 2 tomatoes-- salt--") == [("ingredient", 1, "Salt")]
+
+
+def test_final_text_completes_the_last_items():
+    parser = RecipeSectionParser()
+    text = "title: soup\ningredients: water\ndirections: boil-- serve"
+    assert parser.feed(text) == [("title", 0, "Soup"), ("ingredient", 0, "Water"), ("direction", 0, "Boil")]
+    assert parser.feed(text, final=True) == [("direction", 1, "Serve")]
+    assert parser.feed(text, final=True) == []
+
+
+def test_whole_output_at_once_matches_incremental_feeding():
+    text = "title: salad\ningredients: lettuce-- oil-- vinegar\ndirections: toss-- season-- serve"
+    incremental = RecipeSectionParser()
+    events = []
+    for end in range(1, len(text) + 1):
+        events.extend(incremental.feed(text[:end]))
+    events.extend(incremental.feed(text, final=True))
+    assert events == RecipeSectionParser().feed(text, final=True)
@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+from admissionControl import AdmissionController, AdmissionSlot, Deadline, DeadlineExceeded
+from stagePipeline import Completed, StagePipeline, parse_cpu_list
+
+
+def test_parse_cpu_list():
+    assert parse_cpu_list("0-2,5") == {0, 1, 2, 5}
+    assert parse_cpu_list("") is None
+
+
+def test_runs_stages_in_order_and_completes_early():
+    pipeline = StagePipeline([
+        ("first", lambda payload: Completed("cached") if payload == "hit" else payload + 1, 1, None),
+        ("second", lambda payload: payload * 10, 1, None),
+    ])
+    assert pipeline.run(1) == 20
+    assert pipeline.run("hit") == "cached"
+    assert pipeline.stats()["second"]["processed"] == 1
+
+
+def test_stage_errors_reach_the_caller():
+    def fail(payload):
+        raise ValueError("bad payload")
+
+    pipeline = StagePipeline([("only", fail, 1, None)])
+    with pytest.raises(ValueError, match="bad payload"):
+        pipeline.run(None)
+
+
+def test_expired_task_is_dropped_before_the_next_stage():
+    started, proceed = threading.Event(), threading.Event()
+    second_calls = []
+
+    def slow(payload):
+        started.set()
+        proceed.wait(5)
+        return payload
+
+    pipeline = StagePipeline([("slow", slow, 1, None), ("second", second_calls.append, 1, None)])
+    exited = threading.Event()
+    with pytest.raises(DeadlineExceeded):
+        pipeline.run("task", Deadline(0.05), on_exit=exited.set)
+    assert started.is_set() and not exited.is_set()
+
+    proceed.set()
+    assert exited.wait(5)
+    assert second_calls == []
+
+
+def test_slot_is_held_until_an_abandoned_task_leaves_the_pipeline():
+    admission = AdmissionController(max_concurrent=1, max_queue=0)
+    proceed = threading.Event()
+    pipeline = StagePipeline([("slow", lambda payload: proceed.wait(5), 1, None)])
+
+    assert admission.acquire() == "admitted"
+    slot = AdmissionSlot(admission)
+    slot.hold()
+    try:
+        with pytest.raises(DeadlineExceeded):
+            pipeline.run("task", Deadline(0.05), on_exit=slot.release)
+    finally:
+        slot.release()
+
+    # The request has answered, but its task still runs and keeps the slot
+    assert admission.acquire() == "rejected"
+    proceed.set()
+    deadline = Deadline(5)
+    while admission.stats()["running"] and deadline.remaining() > 0:
+        time.sleep(0.01)
+    assert admission.acquire() == "admitted"
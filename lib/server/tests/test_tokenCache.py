@@ -0,0 +1,67 @@
+from tokenCache import PromptEncoder, TokenCache
+
+EOS = 1
+
+
+def build_prompt(ingredients):
+    return "items: " + ", ".join(ingredients)
+
+
+class WordTokenizer:
+    """Stand-in for the T5 tokenizer: splits on whitespace, then encodes each word on its own"""
+
+    eos_token_id = EOS
+
+    def __init__(self, merges=()):
+        self.merges = merges
+        self.vocab = {}
+
+    def encode(self, text):
+        # merges turn a phrase into a single token, which crosses the whitespace split
+        for phrase in self.merges:
+            text = text.replace(phrase, phrase.replace(" ", "_"))
+        return [self.vocab.setdefault(word, len(self.vocab) + 2) for word in text.split()]
+
+    def __call__(self, texts, add_special_tokens=True):
+        suffix = [EOS] if add_special_tokens else []
+        if isinstance(texts, str):
+            return {"input_ids": self.encode(texts) + suffix}
+        return {"input_ids": [self.encode(text) + suffix for text in texts]}
+
+
+def test_token_cache_tokenizes_only_missing_texts():
+    calls = []
+    tokenizer = WordTokenizer()
+
+    def tokenize(texts):
+        calls.append(list(texts))
+        return tokenizer(texts, add_special_tokens=False)
+
+    cache = TokenCache(tokenize, max_size=2)
+    first = cache.encode(["salt", "pepper", "salt"])
+    assert first[0] is first[2]
+    cache.encode(["pepper", "sugar"])
+    assert calls == [["salt", "pepper"], ["sugar"]]
+    assert len(cache) == 2
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 3
+
+
+def test_prompt_encoder_matches_the_tokenizer():
+    tokenizer = WordTokenizer()
+    encoder = PromptEncoder(tokenizer, build_prompt)
+    samples = [["tomato"], ["olive oil", "salt"], ["crème fraîche", "1% milk", "half-and-half"]]
+    assert encoder.verify(samples) == []
+    assert encoder.encode(["olive oil", "salt"]) == tokenizer(build_prompt(["olive oil", "salt"]))["input_ids"]
+
+
+def test_prompt_encoder_verify_reports_mismatches():
+    tokenizer = WordTokenizer(merges=["oil, salt"])
+    encoder = PromptEncoder(tokenizer, build_prompt)
+    assert encoder.verify([["tomato"], ["olive oil", "salt"]]) == [["olive oil", "salt"]]
+
+
+def test_prompt_encoder_falls_back_for_irregular_whitespace():
+    tokenizer = WordTokenizer()
+    encoder = PromptEncoder(tokenizer, build_prompt)
+    assert encoder.encode(["olive  oil"]) == tokenizer(build_prompt(["olive  oil"]))["input_ids"]
+    assert encoder.stats()["fallbacks"] == 1
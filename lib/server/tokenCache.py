@@ -0,0 +1,123 @@
+import threading
+from collections import OrderedDict
+
+
+class TokenCache:
+    """
+    LRU cache of tokenizer output per text.
+
+    Texts that are not cached yet are tokenized together in one call. Each
+    entry holds the per-text lists of the tokenizer output (input_ids,
+    attention_mask, ...), exactly as the batched call returned them.
+    """
+
+    def __init__(self, tokenize, max_size=8192):
+        self.tokenize = tokenize
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def encode(self, texts):
+        """
+        Returns the tokenizer output of every text.
+
+        Args:
+            texts (list): Texts to tokenize
+
+        Returns:
+            list: One dict of token lists per text (shared with the cache, do not modify)
+        """
+        results = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            for i, text in enumerate(texts):
+                entry = self._entries.get(text)
+                if entry is None:
+                    missing.setdefault(text, []).append(i)
+                else:
+                    self._entries.move_to_end(text)
+                    results[i] = entry
+            self.hits += len(texts) - sum(len(positions) for positions in missing.values())
+            self.misses += len(missing)
+
+        if missing:
+            names = list(missing)
+            encoded = self.tokenize(names)
+            keys = list(encoded.keys())
+            with self._lock:
+                for j, text in enumerate(names):
+                    entry = {key: encoded[key][j] for key in keys}
+                    for i in missing[text]:
+                        results[i] = entry
+                    self._entries[text] = entry
+                    self._entries.move_to_end(text)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return results
+
+    def stats(self):
+        """Returns size and hit ratio"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+        }
+
+
+class PromptEncoder:
+    """
+    Builds the token ids of T5 prompts ("items: a, b, c") from cached pieces.
+
+    The T5 tokenizer splits its input on whitespace before segmenting it, so
+    the ids of a prompt are the ids of "items:", of "<name>," for every
+    ingredient but the last and of the last name, followed by the end of
+    sequence token. verify() checks this against the tokenizer. Names with
+    irregular whitespace fall back to tokenizing the whole prompt.
+    """
+
+    def __init__(self, tokenizer, build_prompt, max_size=8192):
+        self.tokenizer = tokenizer
+        self.build_prompt = build_prompt
+        self.cache = TokenCache(lambda texts: tokenizer(texts, add_special_tokens=False), max_size)
+        prefix = build_prompt([])
+        self.prefix_ids = tokenizer(prefix.strip(), add_special_tokens=False)["input_ids"]
+        self.eos_ids = [tokenizer.eos_token_id]
+        self.fallbacks = 0
+
+    def encode(self, ingredients):
+        """
+        Returns the token ids of build_prompt(ingredients), including the end of sequence token.
+        """
+        if not ingredients or any(not name or name != " ".join(name.split()) for name in ingredients):
+            self.fallbacks += 1
+            return self.tokenizer(self.build_prompt(ingredients))["input_ids"]
+
+        pieces = [name + "," for name in ingredients[:-1]] + [ingredients[-1]]
+        ids = list(self.prefix_ids)
+        for entry in self.cache.encode(pieces):
+            ids.extend(entry["input_ids"])
+        return ids + self.eos_ids
+
+    def verify(self, ingredient_lists):
+        """
+        Compares the cached encoding with the tokenizer for sample prompts.
+
+        Returns:
+            list: The ingredient lists whose ids differ (empty if all match)
+        """
+        return [
+            ingredients for ingredients in ingredient_lists
+            if self.encode(ingredients) != self.tokenizer(self.build_prompt(ingredients))["input_ids"]
+        ]
+
+    def stats(self):
+        """Returns the piece cache statistics and the number of whole-prompt fallbacks"""
+        return dict(self.cache.stats(), fallbacks=self.fallbacks)